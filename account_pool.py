@@ -0,0 +1,204 @@
+"""
+Account pool - spread target deliveries over several Telegram sessions
+Each target is owned by one account on a consistent-hash ring, so adding or removing a session
+only moves that session's share of the targets. While the owner is flood-limited for a target
+(or as a whole), the next account on the ring takes the target over; it returns to its owner once
+the FloodWait has passed. Every account has its own peers, rate limits and learned pacing
+"""
+
+import bisect
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+# Extra sessions (StringSessions, comma or newline separated) that share the target fan-out
+EXTRA_SESSIONS_ENV = 'TELEGRAM_EXTRA_SESSIONS'
+
+# Virtual nodes per account on the hash ring (evens out each account's share of the targets)
+DEFAULT_REPLICAS = 64
+
+# Messages re-fetched through a secondary account, kept for the other targets it serves
+MESSAGE_CACHE_SIZE = 256
+
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def account_path(path: str, name: str) -> str:
+    """Per-account variant of a state file path: pacing_state.json -> pacing_state.<name>.json"""
+    base, ext = os.path.splitext(path)
+    return f"{base}.{name}{ext}"
+
+
+def extra_sessions() -> list:
+    """StringSessions configured for the additional sending accounts"""
+    raw = os.getenv(EXTRA_SESSIONS_ENV, '')
+    return [session.strip() for session in raw.replace('\n', ',').split(',') if len(session.strip()) > 10]
+
+
+class SenderAccount:
+    """One logged-in session with its own peers, send budget and learned pacing"""
+
+    def __init__(self, name: str, client, peer_resolver, rate_limiter, pacer, forward_batcher, primary: bool = False):
+        self.name = name
+        self.client = client
+        self.peer_resolver = peer_resolver
+        self.rate_limiter = rate_limiter
+        self.pacer = pacer
+        self.forward_batcher = forward_batcher
+        self.primary = primary
+        self.sent = 0
+        self.floods = 0
+        self._messages = OrderedDict()
+
+    def __repr__(self):
+        return f"SenderAccount({self.name})"
+
+    async def fetch(self, message):
+        """The message (or album) as this account sees it; media and ids are per session"""
+        if self.primary:
+            return message
+        parts = message if isinstance(message, list) else [message]
+        key = (parts[0].chat_id, tuple(part.id for part in parts))
+        fetched = self._messages.get(key)
+        if fetched is None:
+            fetched = await self.client.get_messages(parts[0].chat_id, ids=list(key[1]))
+            if not fetched or any(part is None for part in fetched):
+                raise ValueError(f"Account {self.name} cannot see message {key[0]}_{key[1][0]}")
+            self._messages[key] = fetched
+            if len(self._messages) > MESSAGE_CACHE_SIZE:
+                self._messages.popitem(last=False)
+        else:
+            self._messages.move_to_end(key)
+        return list(fetched) if isinstance(message, list) else fetched[0]
+
+
+class AccountPool:
+    """Consistent-hash assignment of targets to accounts, skipping flood-limited ones"""
+
+    def __init__(self, accounts: Iterable[SenderAccount] = (), replicas: int = DEFAULT_REPLICAS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.replicas = replicas
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+        self._accounts = OrderedDict()
+        self._ring = []
+        self._ring_names = []
+        self._preferences = {}
+        # (account name, target) -> flood deadline; target None is the whole account
+        self._until = {}
+        self.takeovers = 0
+        for account in accounts:
+            self.add(account)
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def __iter__(self):
+        return iter(self._accounts.values())
+
+    @property
+    def primary(self) -> Optional[SenderAccount]:
+        return next((account for account in self._accounts.values() if account.primary), None)
+
+    def add(self, account: SenderAccount):
+        """Add an account; only the targets it now owns move to it"""
+        self._accounts[account.name] = account
+        if account.forward_batcher is not None:
+            # A refused batch marks the account once, not once per message in it
+            account.forward_batcher.on_flood = lambda target, seconds: self.mark_flooded(account, target, seconds)
+        self._rebuild()
+
+    def remove(self, name: str):
+        if self._accounts.pop(name, None) is not None:
+            self._rebuild()
+
+    def _rebuild(self):
+        points = sorted(
+            (_ring_hash(f"{name}#{replica}"), name)
+            for name in self._accounts for replica in range(self.replicas)
+        )
+        self._ring = [point for point, _ in points]
+        self._ring_names = [name for _, name in points]
+        self._preferences.clear()
+
+    def preference(self, target) -> tuple:
+        """Accounts in ring order starting at target's position: owner first, then its fallbacks"""
+        accounts = self._preferences.get(target)
+        if accounts is None:
+            names = []
+            start = bisect.bisect(self._ring, _ring_hash(str(target)))
+            for i in range(len(self._ring)):
+                name = self._ring_names[(start + i) % len(self._ring)]
+                if name not in names:
+                    names.append(name)
+                    if len(names) == len(self._accounts):
+                        break
+            accounts = self._preferences[target] = tuple(self._accounts[name] for name in names)
+        return accounts
+
+    def owner(self, target) -> SenderAccount:
+        return self.preference(target)[0]
+
+    def _dormant_for(self, account: SenderAccount, target, now: float) -> float:
+        until = max(self._until.get((account.name, target), 0.0), self._until.get((account.name, None), 0.0))
+        return max(0.0, until - now)
+
+    def account_for(self, target) -> Optional[SenderAccount]:
+        """First account on the ring that may send to target now; None if all are flood-limited"""
+        now = self.clock()
+        preference = self.preference(target)
+        for i, account in enumerate(preference):
+            if self._dormant_for(account, target, now) <= 0:
+                if i:
+                    self.takeovers += 1
+                return account
+        return None
+
+    def mark_flooded(self, account: SenderAccount, target, seconds: float, account_wide: bool = False):
+        """Record a FloodWait for account on target (or for everything it sends)"""
+        key = (account.name, None if account_wide else target)
+        self._until[key] = max(self._until.get(key, 0.0), self.clock() + seconds)
+        account.floods += 1
+        if len(self._accounts) > 1:
+            scope = "all targets" if account_wide else str(target)
+            self.logger.info(f"👥 Account {account.name} flood-limited for {round(seconds, 1)}s on {scope}; "
+                             f"other accounts take over")
+
+    def dormant_for(self, target) -> float:
+        """Seconds until some account may send to target again"""
+        now = self.clock()
+        return min((self._dormant_for(account, target, now) for account in self._accounts.values()), default=0.0)
+
+    def account_wide_wait(self) -> float:
+        """Seconds until some account is free of an account-wide FloodWait (0 if one already is)"""
+        now = self.clock()
+        return min((max(0.0, self._until.get((name, None), 0.0) - now) for name in self._accounts), default=0.0)
+
+    def get_state(self) -> dict:
+        """Sends, floods and account-wide dormancy per account, plus the takeover count"""
+        now = self.clock()
+        return {
+            'accounts': {
+                name: {
+                    'primary': account.primary,
+                    'sent': account.sent,
+                    'floods': account.floods,
+                    'dormant_for': round(max(0.0, self._until.get((name, None), 0.0) - now), 1),
+                }
+                for name, account in self._accounts.items()
+            },
+            'takeovers': self.takeovers,
+        }
+
+    def summary(self) -> str:
+        state = self.get_state()
+        accounts = ", ".join(
+            f"{name} {info['sent']} sent" + (f" (dormant {info['dormant_for']}s)" if info['dormant_for'] else "")
+            for name, info in state['accounts'].items()
+        )
+        return f"{len(state['accounts'])} accounts: {accounts}; {state['takeovers']} takeovers"
@@ -0,0 +1,63 @@
+"""
+Album collector - coalesce grouped media before forwarding
+Parts of an album arrive as separate NewMessage events; they are buffered per grouped_id
+and handed on together once no new part has arrived for a short window
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List
+
+# Telegram albums hold at most 10 items
+MAX_ALBUM_PARTS = 10
+
+
+class AlbumCollector:
+    """Buffers messages sharing (chat_id, grouped_id) and flushes each album once"""
+
+    def __init__(self, on_album: Callable[[List], Awaitable], window: float = 0.8):
+        self.on_album = on_album
+        self.window = window
+        self.logger = logging.getLogger(__name__)
+        self._pending = {}
+        self._timers = {}
+        self._tasks = set()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, message):
+        """Buffer an album part; the window restarts with every new part"""
+        key = (message.chat_id, message.grouped_id)
+        parts = self._pending.setdefault(key, [])
+        parts.append(message)
+
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        if len(parts) >= MAX_ALBUM_PARTS:
+            self._flush(key)
+        else:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        parts = self._pending.pop(key, None)
+        if not parts:
+            return
+
+        parts.sort(key=lambda message: message.id)
+        self.logger.info(f"🖼 Album {key[1]} from {key[0]} complete: {len(parts)} parts")
+        task = asyncio.get_running_loop().create_task(self.on_album(parts))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def cancel(self):
+        """Drop pending albums (shutdown)"""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._pending.clear()
@@ -0,0 +1,875 @@
+#!/usr/bin/env python3
+"""
+Benchmarks - قياس أداء مسار التوجيه
+Micro-benchmarks for the forwarding hot path (no Telegram connection needed)
+
+Usage: python benchmark.py [name ...]
+"""
+
+import asyncio
+import configparser
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from telethon.tl.types import InputPeerChannel
+
+from account_pool import AccountPool, SenderAccount
+from config_snapshot import ConfigSnapshot
+from content_dedup import ContentDedup
+from dedup_index import DedupIndex
+from fanout import TargetFanOut
+from flood_scheduler import FloodScheduler
+from forward_options import ForwardOptions
+from message_kind import MessageKind
+from near_dedup import NearDedup
+from outbox import Outbox
+from pacer import Pacer
+from stats_manager import StatsManager
+from target_rules import TargetRouter, parse_rule
+from text_cleaner import TextCleaner
+from text_matcher import KeywordMatcher, TextReplacer
+from userbot import TelegramForwarder
+from utils import ConfigManager
+from work_queue import WorkQueue
+
+ARABIC_LETTERS = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+ENGLISH_LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+NEWS_WORDS = (
+    'عاجل', 'الرئيس', 'الحكومة', 'اليوم', 'مصادر', 'محلية', 'الأمم', 'المتحدة', 'اجتماع', 'وزير',
+    'الخارجية', 'صنعاء', 'عدن', 'القاهرة', 'الرياض', 'تقرير', 'خاص', 'بيان', 'رسمي', 'مباشر',
+    'breaking', 'news', 'president', 'minister', 'meeting', 'report', 'sources', 'official',
+    'statement', 'live', 'update', 'video', 'photos', 'https://t.me/example', '#عاجل', '@channel',
+)
+
+
+def _timeit(func, iterations):
+    """Run func() iterations times and return seconds per call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+
+def _random_word(rng, letters, min_len=3, max_len=9):
+    return ''.join(rng.choice(letters) for _ in range(rng.randint(min_len, max_len)))
+
+
+def _sample_posts(rng, count, length):
+    """Channel-style posts of roughly `length` characters built from news vocabulary"""
+    posts = []
+    for _ in range(count):
+        words = []
+        size = 0
+        while size < length:
+            word = rng.choice(NEWS_WORDS)
+            words.append(word)
+            size += len(word) + 1
+            if rng.random() < 0.08:
+                words.append('\n')
+        posts.append(' '.join(words)[:length])
+    return posts
+
+
+def _sample_config_manager():
+    """ConfigManager populated with a realistic forwarding configuration"""
+    config_manager = ConfigManager.__new__(ConfigManager)
+    config_manager.config_path = '<benchmark>'
+    config_manager.store_path = None
+    config_manager.store = None
+    config_manager.revision = 0
+    config_manager.config = configparser.ConfigParser()
+    config_manager.config.read_dict({
+        'forwarding': {
+            'source_chat': '-1001000000001',
+            'target_chat': '-1001000000002, -1001000000003',
+            'forward_mode': 'copy',
+            'forward_delay': '0.5',
+            'blacklist_enabled': 'true',
+            'whitelist_enabled': 'true',
+            'blacklist_words': ', '.join(f'blocked{i}' for i in range(50)),
+            'whitelist_words': ', '.join(f'allowed{i}' for i in range(50)),
+            'clean_links': 'true',
+            'clean_empty_lines': 'true',
+            'clean_lines_with_words': 'true',
+            'clean_words_list': ', '.join(f'drop{i}' for i in range(20)),
+            'header_enabled': 'true',
+            'header_text': 'HEADER',
+            'footer_enabled': 'true',
+            'footer_text': 'FOOTER',
+            'buttons_enabled': 'true',
+            'button1_text': 'Channel',
+            'button1_url': 'https://t.me/example',
+        },
+        'text_replacer': {
+            'replacer_enabled': 'true',
+            'replacements': ', '.join(f'old{i}->new{i}' for i in range(20)),
+        },
+    })
+    return config_manager
+
+
+def bench_options(iterations=100000):
+    """Per-message option access: legacy dict + string parsing vs. ForwardOptions"""
+    config_manager = _sample_config_manager()
+    cm = config_manager
+
+    # Legacy representation: flat dict of raw strings/bools as built by the old _load_config
+    legacy = {
+        'forward_text': cm.getboolean('forwarding', 'forward_text', fallback=True),
+        'forward_mode': cm.get('forwarding', 'forward_mode', fallback='forward'),
+        'blacklist_enabled': cm.getboolean('forwarding', 'blacklist_enabled', fallback=False),
+        'whitelist_enabled': cm.getboolean('forwarding', 'whitelist_enabled', fallback=False),
+        'blacklist_words': cm.get('forwarding', 'blacklist_words', fallback=''),
+        'whitelist_words': cm.get('forwarding', 'whitelist_words', fallback=''),
+        'clean_links': cm.getboolean('forwarding', 'clean_links', fallback=False),
+        'clean_hashtags': cm.getboolean('forwarding', 'clean_hashtags', fallback=False),
+        'clean_formatting': cm.getboolean('forwarding', 'clean_formatting', fallback=False),
+        'clean_empty_lines': cm.getboolean('forwarding', 'clean_empty_lines', fallback=False),
+        'clean_lines_with_words': cm.getboolean('forwarding', 'clean_lines_with_words', fallback=False),
+        'clean_words_list': cm.get('forwarding', 'clean_words_list', fallback=''),
+        'header_enabled': cm.getboolean('forwarding', 'header_enabled', fallback=False),
+        'footer_enabled': cm.getboolean('forwarding', 'footer_enabled', fallback=False),
+        'header_text': cm.get('forwarding', 'header_text', fallback=''),
+        'footer_text': cm.get('forwarding', 'footer_text', fallback=''),
+        'buttons_enabled': cm.getboolean('forwarding', 'buttons_enabled', fallback=False),
+        'replacer_enabled': cm.getboolean('text_replacer', 'replacer_enabled', fallback=False),
+        'replacements': cm.get('text_replacer', 'replacements', fallback=''),
+    }
+    for i in range(1, 4):
+        legacy[f'button{i}_text'] = cm.get('forwarding', f'button{i}_text', fallback='')
+        legacy[f'button{i}_url'] = cm.get('forwarding', f'button{i}_url', fallback='')
+
+    options = ForwardOptions.from_config(config_manager)
+
+    def legacy_access():
+        o = legacy
+        o.get('forward_text', True), o.get('forward_mode', 'forward')
+        if o.get('blacklist_enabled', False):
+            [w.strip().lower() for w in o.get('blacklist_words', '').strip().split(',') if w.strip()]
+        if o.get('whitelist_enabled', False):
+            [w.strip().lower() for w in o.get('whitelist_words', '').strip().split(',') if w.strip()]
+        o.get('clean_links', False), o.get('clean_hashtags', False), o.get('clean_formatting', False)
+        o.get('clean_empty_lines', False), o.get('clean_lines_with_words', False)
+        [w.strip().lower() for w in o.get('clean_words_list', '').strip().split(',') if w.strip()]
+        if o.get('replacer_enabled', False):
+            pairs = []
+            for item in o.get('replacements', '').split(','):
+                if '->' in item:
+                    old, new = item.split('->', 1)
+                    if old.strip():
+                        pairs.append((old.strip(), new.strip()))
+        o.get('header_enabled', False), o.get('footer_enabled', False)
+        o.get('header_text', '').strip(), o.get('footer_text', '').strip()
+        if o.get('buttons_enabled', False):
+            for i in range(1, 4):
+                o.get(f'button{i}_text', '').strip(), o.get(f'button{i}_url', '').strip()
+
+    def typed_access():
+        o = options
+        o.forward_text, o.forward_mode
+        if o.blacklist_enabled:
+            o.blacklist_words
+        if o.whitelist_enabled:
+            o.whitelist_words
+        o.clean_links, o.clean_hashtags, o.clean_formatting
+        o.clean_empty_lines, o.clean_lines_with_words
+        o.clean_words_list
+        if o.replacer_enabled:
+            o.replacements
+        o.header_enabled, o.footer_enabled
+        o.header_text, o.footer_text
+        if o.buttons_enabled:
+            o.buttons
+
+    before = _timeit(legacy_access, iterations)
+    after = _timeit(typed_access, iterations)
+    print("Option access per message")
+    print(f"  dict + parsing : {before * 1e6:8.2f} µs")
+    print(f"  ForwardOptions : {after * 1e6:8.2f} µs  ({before / after:.1f}x faster)")
+
+
+def bench_keywords(term_count=10000, post_count=200, post_length=800):
+    """Blacklist scan: per-word substring loop vs. one Aho-Corasick pass"""
+    rng = random.Random(42)
+    terms = set()
+    while len(terms) < term_count:
+        letters = ARABIC_LETTERS if rng.random() < 0.6 else ENGLISH_LETTERS
+        terms.add(_random_word(rng, letters, 4, 10))
+    terms = list(terms)
+    posts = _sample_posts(rng, post_count, post_length)
+
+    start = time.perf_counter()
+    matcher = KeywordMatcher(terms)
+    build_time = time.perf_counter() - start
+
+    def naive():
+        for post in posts:
+            lower = post.lower()
+            for word in terms:
+                if word in lower:
+                    break
+
+    def automaton():
+        for post in posts:
+            matcher.search(post)
+
+    before = _timeit(naive, 1) / post_count
+    after = _timeit(automaton, 3) / post_count
+    print(f"Blacklist matching: {term_count} terms, {post_length}-char posts (build {build_time * 1000:.0f} ms)")
+    print(f"  substring loop : {before * 1e6:10.1f} µs/msg  ({1 / before:10.0f} msg/s)")
+    print(f"  Aho-Corasick   : {after * 1e6:10.1f} µs/msg  ({1 / after:10.0f} msg/s, {before / after:.1f}x faster)")
+
+
+def _legacy_clean(text, clean_words):
+    """The previous _clean_message_text: one uncompiled re.sub per rule plus two line passes"""
+    text = re.sub(r'https?://[^\s]+', '', text)
+    text = re.sub(r'[Tt]\.me/[\w\d_]+', '', text)
+    text = re.sub(r'www\.[^\s]+', '', text)
+    text = re.sub(r'[\w\d-]+\.(com|org|net|info|co|io|me|ly|tv|fm|cc|tk|ml|ga|cf|ye|sa|ae|eg|jo|iq|sy|lb|ma|dz|tn|ly|sd|kw|qa|bh|om|ps)\.[a-z]{2,3}[^\s]*', '', text)
+    text = re.sub(r'[\w\d-]+\.(com|org|net|info|co|io|me|ly|tv|fm|cc|tk|ml|ga|cf|ye|sa|ae|eg|jo|iq|sy|lb|ma|dz|tn|ly|sd|kw|qa|bh|om|ps)[^\s]*', '', text)
+    text = re.sub(r'@[\w\d_]+', '', text)
+    text = re.sub(r'#[\w\d_\u0600-\u06FF]+', '', text)
+    text = re.sub(r'[*_`]', '', text)
+    text = re.sub(r'<[^>]+>', '', text)
+    text = '\n'.join(line for line in text.split('\n') if not any(word in line.lower() for word in clean_words))
+    text = '\n'.join(line for line in text.split('\n') if line.strip())
+    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+    text = re.sub(r' +', ' ', text)
+    return text.strip()
+
+
+def bench_cleaning(post_count=200, post_length=4096):
+    """Text cleaning with every rule enabled on long posts"""
+    rng = random.Random(7)
+    posts = _sample_posts(rng, post_count, post_length)
+    clean_words = ('اشترك', 'للمزيد', 'subscribe')
+    cleaner = TextCleaner(clean_links=True, clean_hashtags=True, clean_formatting=True,
+                          clean_empty_lines=True, line_matcher=KeywordMatcher(clean_words))
+
+    mismatches = sum(1 for post in posts if cleaner.clean(post)[0] != _legacy_clean(post, clean_words))
+
+    before = _timeit(lambda: [_legacy_clean(post, clean_words) for post in posts], 3) / post_count
+    after = _timeit(lambda: [cleaner.clean(post) for post in posts], 3) / post_count
+    print(f"Text cleaning: {post_length}-char posts, all rules enabled ({mismatches} output mismatches)")
+    print(f"  sequential re.sub : {1 / before:8.0f} msg/s  ({before * 1e6:8.1f} µs/msg)")
+    print(f"  TextCleaner       : {1 / after:8.0f} msg/s  ({after * 1e6:8.1f} µs/msg, {before / after:.1f}x faster)")
+
+
+def bench_replacer(rule_count=20, post_count=200, post_length=4096):
+    """Text replacement incl. stats writes: str.replace + save per rule vs. one scan + one save"""
+    rng = random.Random(11)
+    posts = _sample_posts(rng, post_count, post_length)
+    pairs = [(word, word.upper() if word.isascii() else word[::-1]) for word in NEWS_WORDS[:rule_count]]
+    replacer = TextReplacer(pairs)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stats = StatsManager()
+        stats.stats_file = os.path.join(tmp, 'bot_stats.json')
+
+        def sequential():
+            for post in posts:
+                for old_text, new_text in pairs:
+                    if old_text in post:
+                        post = post.replace(old_text, new_text)
+                        stats.record_replacement_made()
+
+        def single_pass():
+            for post in posts:
+                post, count = replacer.replace(post)
+                if count:
+                    stats.record_replacement_made(count)
+
+        before = _timeit(sequential, 1) / post_count
+        after = _timeit(single_pass, 3) / post_count
+    print(f"Text replacement: {len(pairs)} rules, {post_length}-char posts, stats saved as in the bot")
+    print(f"  str.replace + save per rule : {before * 1e6:8.1f} µs/msg  ({1 / before:8.0f} msg/s)")
+    print(f"  TextReplacer + one save     : {after * 1e6:8.1f} µs/msg  ({1 / after:8.0f} msg/s, {before / after:.1f}x faster)")
+
+
+class _FakeClient:
+    """Stands in for TelegramClient: every send takes a fixed network round trip"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.sent = 0
+
+    async def send_message(self, entity, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+
+    async def forward_messages(self, entity, messages, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        return list(messages) if isinstance(messages, list) else messages
+
+
+def bench_fanout(target_counts=(1, 5, 10, 20), latency=0.02, delay=0.01):
+    """Latency until the last target has the message: sequential loop vs. TargetFanOut"""
+    client = _FakeClient(latency)
+
+    async def deliver(target):
+        # Same shape as _forward_message_to_target: one send, then the pacing delay
+        await client.send_message(target, 'text')
+        await asyncio.sleep(delay)
+        return True
+
+    async def sequential(targets):
+        return [(target, await deliver(target)) for target in targets]
+
+    async def measure(run, targets):
+        start = time.perf_counter()
+        results = await run(targets)
+        assert all(success for _, success in results)
+        return time.perf_counter() - start
+
+    async def main():
+        print(f"Fan-out latency: fake client, {latency * 1000:.0f} ms per send + {delay * 1000:.0f} ms delay")
+        for count in target_counts:
+            targets = [f'-100{i:010d}' for i in range(count)]
+            fanout = TargetFanOut(max_concurrent=10, per_target=1)
+            before = await measure(sequential, targets)
+            after = await measure(lambda targets: fanout.run(targets, deliver), targets)
+            print(f"  {count:3d} targets : sequential {before * 1000:7.1f} ms | concurrent (limit 10) {after * 1000:7.1f} ms")
+
+    asyncio.run(main())
+
+
+class _BenchMessage:
+    __slots__ = ('id', 'chat_id', 'media')
+
+    def __init__(self, message_id, chat_id):
+        self.id = message_id
+        self.chat_id = chat_id
+        self.media = None
+
+
+class _ForwarderClient(_FakeClient):
+    """_FakeClient with the lookups TelegramForwarder makes; remembers the size of every forward request"""
+
+    def __init__(self, latency):
+        super().__init__(latency)
+        self.batch_sizes = []
+
+    async def get_me(self):
+        return SimpleNamespace(id=1)
+
+    async def get_input_entity(self, peer):
+        return InputPeerChannel(abs(int(peer)) % 10 ** 10, 0)
+
+    async def forward_messages(self, entity, messages, **kwargs):
+        self.batch_sizes.append(len(messages) if isinstance(messages, list) else 1)
+        return await super().forward_messages(entity, messages, **kwargs)
+
+
+def _bench_post(message_id, chat_id, text):
+    """Plain text message with the attributes TelegramForwarder reads"""
+    return SimpleNamespace(id=message_id, chat_id=chat_id, sender_id=42, message=text, text=text, media=None,
+                           entities=None, grouped_id=None, edit_date=None)
+
+
+def _bench_forwarder(directory, client, sections):
+    """TelegramForwarder on a config.ini written to directory (state files land there too) with a fake client"""
+    parser = configparser.ConfigParser()
+    parser.read_dict({'telegram': {'api_id': '1', 'api_hash': 'benchmark'}, **sections})
+    config_path = os.path.join(directory, 'config.ini')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        parser.write(f)
+    forwarder = TelegramForwarder(config_path)
+    forwarder.client = client
+    forwarder.peer_resolver.client = client
+    forwarder.forward_batcher.client = client
+    forwarder.accounts.primary.client = client
+    forwarder.me_id = 1
+    return forwarder
+
+
+def bench_batching(burst_sizes=(1, 10, 50, 200), latency=0.02, window=0.1, workers=4):
+    """A burst from one source to one target through the work queue: one forward_messages per message vs. ForwardBatcher"""
+
+    async def measure(batch_window, size):
+        client = _ForwarderClient(latency)
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                forwarder = _bench_forwarder(tmp, client, {
+                    'forwarding': {
+                        'source_chat': '-1001', 'target_chat': '-1002', 'forward_mode': 'forward', 'forward_delay': '0',
+                        'forward_batch_window': str(batch_window), 'queue_workers': str(workers),
+                    },
+                    # Out of the way, so only the request count differs
+                    'rate_limits': {'account_per_second': '1000', 'account_burst': '1000',
+                                    'target_text_per_minute': '60000', 'target_text_burst': '1000'},
+                })
+                await forwarder.outbox.open()
+                forwarder.work_queue.start()
+                messages = [_bench_post(i + 1, -1001, f'news {i}') for i in range(size)]
+                start = time.perf_counter()
+                # Telethon runs the update handler as one task per update
+                await asyncio.gather(*(forwarder._enqueue_message(message) for message in messages))
+                while any(forwarder.outbox.is_pending(message) for message in messages):
+                    await asyncio.sleep(0.001)
+                elapsed = time.perf_counter() - start
+                await forwarder.work_queue.stop()
+                await forwarder.fanout.cancel()
+                await forwarder.outbox.close()
+                forwarder.pacer.close()
+            finally:
+                os.chdir(cwd)
+        return elapsed, client.sent, max(client.batch_sizes)
+
+    async def main():
+        print(f"Forward batching: enqueue -> {workers} workers -> fake client, {latency * 1000:.0f} ms per request, "
+              f"{window * 1000:.0f} ms window")
+        for size in burst_sizes:
+            before, before_rpcs, _ = await measure(0, size)
+            after, after_rpcs, largest = await measure(window, size)
+            print(f"  burst {size:3d} : per-message {before * 1000:7.1f} ms / {before_rpcs:3d} RPCs | "
+                  f"batched {after * 1000:7.1f} ms / {after_rpcs:3d} RPCs (largest batch {largest})")
+
+    asyncio.run(main())
+
+
+def bench_queue(burst=50, slow_every=10, slow=0.5, fast=0.01):
+    """Update-handler time for a burst with occasional slow sends: inline processing vs. WorkQueue"""
+
+    async def process(message):
+        # Every slow_every-th message hits a long wait (FloodWait, retry backoff)
+        await asyncio.sleep(slow if message.id % slow_every == 0 else fast)
+
+    async def measure(handle):
+        start = time.perf_counter()
+        for i in range(burst):
+            await handle(_BenchMessage(i + 1, -1001))
+        return time.perf_counter() - start
+
+    async def main():
+        print(f"Work queue: burst of {burst}, every {slow_every}th message takes {slow * 1000:.0f} ms, others {fast * 1000:.0f} ms")
+        inline = await measure(process)
+        queue = WorkQueue(process, maxsize=1000, workers=4)
+        queue.start()
+        enqueued = await measure(queue.put)
+        while len(queue) or queue.get_state()['busy_workers']:
+            await asyncio.sleep(0.01)
+        state = queue.get_state()
+        await queue.stop()
+        print(f"  handler busy : inline {inline * 1000:7.1f} ms | enqueue only {enqueued * 1000:7.1f} ms")
+        print(f"  queue wait   : avg {state['avg_wait'] * 1000:.1f} ms, max {state['max_wait'] * 1000:.1f} ms with 4 workers")
+
+    asyncio.run(main())
+
+
+def bench_outbox(message_count=1000, targets=('-1002', '-1003')):
+    """Durable outbox writes: one commit per message vs. group commit of concurrent writers"""
+
+    async def measure(commit_interval, concurrent):
+        with tempfile.TemporaryDirectory() as tmp:
+            outbox = Outbox(os.path.join(tmp, 'outbox.db'), commit_interval=commit_interval)
+            await outbox.open()
+            messages = [_BenchMessage(i + 1, -1001) for i in range(message_count)]
+            start = time.perf_counter()
+            if concurrent:
+                await asyncio.gather(*(outbox.record(message, targets) for message in messages))
+            else:
+                for message in messages:
+                    await outbox.record(message, targets)
+            elapsed = time.perf_counter() - start
+            commits = outbox.commits
+            await outbox.close()
+            return elapsed, commits
+
+    async def main():
+        print(f"Outbox: record {message_count} messages x {len(targets)} targets (SQLite, synchronous=FULL)")
+        before, before_commits = await measure(0, concurrent=False)
+        after, after_commits = await measure(0.01, concurrent=True)
+        print(f"  commit per message : {message_count / before:8.0f} msg/s ({before_commits} commits)")
+        print(f"  group commit       : {message_count / after:8.0f} msg/s ({after_commits} commits)")
+
+    asyncio.run(main())
+
+
+def bench_flood(message_count=20, targets=5, flood_wait=1.0, latency=0.01, workers=4):
+    """Time until healthy targets have every message while one target is under a FloodWait"""
+
+    async def run(park):
+        scheduler = FloodScheduler()
+        delivered = {target: 0 for target in range(targets)}
+        healthy_done = asyncio.Event()
+        # Every send to target 0 is refused until this deadline
+        deadline = time.monotonic() + flood_wait
+
+        async def send(message, target, resumed=False):
+            if park and target == 0 and not resumed and scheduler.should_park(target):
+                scheduler.park(target, lambda: send(message, target, resumed=True))
+                return
+            if target == 0 and time.monotonic() < deadline:
+                remaining = deadline - time.monotonic()
+                if park:
+                    scheduler.mark_dormant(target, remaining)
+                    scheduler.park(target, lambda: send(message, target, resumed=True), front=resumed)
+                    return
+                # Old behaviour: sleep inside the send coroutine, holding the worker
+                await asyncio.sleep(remaining)
+            await asyncio.sleep(latency)
+            delivered[target] += 1
+            if all(delivered[t] == message_count for t in range(1, targets)):
+                healthy_done.set()
+
+        async def process(message):
+            await asyncio.gather(*(send(message, target) for target in range(targets)))
+
+        queue = WorkQueue(process, workers=workers)
+        queue.start()
+        start = time.perf_counter()
+        for i in range(message_count):
+            await queue.put(_BenchMessage(i + 1, -1001))
+        await healthy_done.wait()
+        elapsed = time.perf_counter() - start
+        await queue.stop()
+        scheduler.cancel()
+        return elapsed
+
+    async def main():
+        print(f"FloodWait: {message_count} messages to {targets} targets, one target gets a {flood_wait:.0f}s FloodWait")
+        before = await run(park=False)
+        after = await run(park=True)
+        print(f"  healthy targets done : sleep in send {before * 1000:7.1f} ms | dormant + parked {after * 1000:7.1f} ms")
+
+    asyncio.run(main())
+
+
+def bench_slow_target(message_count=20, workers=2, slow=0.3, fast=0.01):
+    """One paced target and one fast target, more messages than workers: wait for every ack vs. submit"""
+
+    async def run(background):
+        fanout = TargetFanOut(max_concurrent=10, per_target=1)
+        delivered = {'slow': 0, 'fast': 0}
+        fast_done = asyncio.Event()
+
+        async def deliver(target):
+            # The paced chat waits out its send delay, the other one is just network latency
+            await asyncio.sleep(slow if target == 'slow' else fast)
+            delivered[target] += 1
+            if delivered['fast'] == message_count:
+                fast_done.set()
+            return True
+
+        async def process(message):
+            if background:
+                await fanout.submit(['slow', 'fast'], deliver, lambda results: None)
+            else:
+                # Old behaviour: the worker holds the message until both targets acked
+                await fanout.run(['slow', 'fast'], deliver)
+
+        queue = WorkQueue(process, workers=workers)
+        queue.start()
+        start = time.perf_counter()
+        for i in range(message_count):
+            await queue.put(_BenchMessage(i + 1, -1001))
+        await fast_done.wait()
+        elapsed = time.perf_counter() - start
+        await queue.stop()
+        await fanout.cancel()
+        return elapsed
+
+    async def main():
+        print(f"Slow target: {message_count} messages, {workers} workers, one target takes {slow * 1000:.0f} ms "
+              f"per send, the other {fast * 1000:.0f} ms")
+        before = await run(background=False)
+        after = await run(background=True)
+        print(f"  fast target done : worker waits for every ack {before * 1000:7.1f} ms | "
+              f"background fan-out {after * 1000:7.1f} ms")
+
+    asyncio.run(main())
+
+
+def bench_pacing(duration=3600.0, ceiling=0.4, flood_wait=5.0, forward_delay=0.5):
+    """Simulated hour against a hidden flood ceiling: fixed "smart delay" vs. the AIMD pacer"""
+
+    def simulate(next_delay, on_success, on_flood):
+        now, last_send, sent, floods = 0.0, float('-inf'), 0, 0
+        while now < duration:
+            now += next_delay(now)
+            if now - last_send < ceiling:
+                # Telegram refuses and imposes a wait
+                floods += 1
+                now += flood_wait
+                on_flood()
+            else:
+                sent += 1
+                last_send = now
+                on_success()
+        return sent, floods
+
+    def fixed(factor):
+        return simulate(lambda now: forward_delay * factor, lambda: None, lambda: None)
+
+    def aimd():
+        clock = [0.0]
+        with tempfile.TemporaryDirectory() as tmp:
+            pacer = Pacer(forward_delay, state_path=os.path.join(tmp, 'pacing.json'), clock=lambda: clock[0])
+
+            def next_delay(now):
+                clock[0] = now
+                return pacer.reserve('-1002')
+
+            result = simulate(next_delay, lambda: pacer.on_success('-1002'), lambda: pacer.on_flood('-1002'))
+            return result + (pacer.delay_for('-1002'),)
+
+    print(f"Pacing: simulated {duration / 60:.0f} min, hidden ceiling {ceiling}s between sends, FloodWait {flood_wait:.0f}s")
+    for label, factor in (("fixed text delay (x0.3)", 0.3), ("fixed media delay (x1.5)", 1.5)):
+        sent, floods = fixed(factor)
+        print(f"  {label:26s}: {sent / (duration / 60):6.1f} msg/min, {floods:5d} FloodWaits")
+    sent, floods, learned = aimd()
+    print(f"  {'AIMD pacer':26s}: {sent / (duration / 60):6.1f} msg/min, {floods:5d} FloodWaits (settled at ~{learned:.2f}s)")
+
+
+def bench_dedup(message_count=500000, chat_count=20, reorder=5):
+    """Duplicate tracking: the old set of "chat_id" + "_" + "id" strings vs. DedupIndex"""
+    rng = random.Random(7)
+    messages = []
+    for i in range(message_count):
+        chat_id = -1000000000000 - i % chat_count
+        # Ids mostly increase, with small out-of-order jitter
+        messages.append((chat_id, i // chat_count + rng.randint(0, reorder)))
+
+    def run_set():
+        processed = set()
+        for chat_id, message_id in messages:
+            key = f"{chat_id}_{message_id}"
+            if key not in processed:
+                processed.add(key)
+        return processed
+
+    def run_index():
+        index = DedupIndex(path=os.devnull)
+        for chat_id, message_id in messages:
+            if not index.seen(chat_id, message_id):
+                index.add(chat_id, message_id)
+        return index
+
+    print(f"Dedup: {message_count} messages from {chat_count} chats (ids jittered by up to {reorder})")
+    for label, run in (("set of strings", run_set), ("DedupIndex", run_index)):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        kept = run()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        print(f"  {label:15s}: {message_count / elapsed / 1e6:5.2f} M msg/s, {size / 1024:9.1f} KiB retained")
+
+
+def bench_content_dedup(post_count=50000, source_count=5, cross_post_rate=0.3):
+    """Cross-posted news: sends with per-message dedup only vs. with the content-hash filter"""
+    rng = random.Random(11)
+    stream = []
+    for i in range(post_count):
+        text = ' '.join(rng.choice(NEWS_WORDS) for _ in range(20)) + f' {i}'
+        sources = rng.sample(range(source_count), 2 if rng.random() < cross_post_rate else 1)
+        for source in sources:
+            # Channels re-post with their own spacing and capitalisation
+            variant = text.upper() if source % 2 else text.replace(' ', '  ')
+            stream.append(SimpleNamespace(chat_id=-1000000000000 - source, id=i, message=variant,
+                                          photo=None, document=None))
+
+    def run():
+        dedup = ContentDedup(path=os.devnull)
+        sent = sum(1 for message in stream if not dedup.is_duplicate(message, [(message.chat_id, message.id)]))
+        return dedup, sent
+
+    start = time.perf_counter()
+    _, sent = run()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    kept = run()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+
+    print(f"Content dedup: {post_count} posts from {source_count} sources, {cross_post_rate:.0%} cross-posted")
+    print(f"  {'per-message only':20s}: {len(stream)} sends")
+    print(f"  {'content filter':20s}: {sent} sends ({len(stream) - sent} duplicates dropped), "
+          f"{elapsed / len(stream) * 1e6:5.1f} us/msg, {size / 1024 / 1024:5.1f} MiB retained")
+
+
+def bench_near_dedup(window_size=100000, probes=5000, words=40):
+    """Near-duplicate lookups in a full 100k-signature window: edited reposts vs. unrelated posts"""
+    rng = random.Random(13)
+    vocabulary = [_random_word(rng, rng.choice((ARABIC_LETTERS, ENGLISH_LETTERS))) for _ in range(20000)]
+    posts = [' '.join(rng.choice(vocabulary) for _ in range(words)) for _ in range(window_size)]
+    edits = (
+        lambda post: f"🔥 {post}",
+        lambda post: f"{post}\n\nhttps://t.me/example",
+        lambda post: f"{post}\n— تابعونا @channel",
+        lambda post: post.replace(' ', '  ', 3) + ' ✅',
+    )
+
+    index = NearDedup(window=86400, capacity=window_size, path=os.devnull)
+    start = time.perf_counter()
+    for i, post in enumerate(posts):
+        index.is_duplicate(post, [(1, i)])
+    fill = (time.perf_counter() - start) / window_size
+
+    reposts = [(rng.choice(edits)(rng.choice(posts)), [(2, i)]) for i in range(probes)]
+    unrelated = [(' '.join(rng.choice(vocabulary) for _ in range(words)), [(3, i)]) for i in range(probes)]
+    print(f"Near dedup: {window_size} signatures in the window, threshold {index.threshold} "
+          f"(Hamming <= {index.max_distance})")
+    print(f"  {'fill':15s}: {fill * 1e6:6.1f} us/msg")
+    for label, cases in (("edited reposts", reposts), ("unrelated posts", unrelated)):
+        before = index.duplicates
+        start = time.perf_counter()
+        for text, keys in cases:
+            index.is_duplicate(text, keys)
+        elapsed = (time.perf_counter() - start) / len(cases)
+        print(f"  {label:15s}: {elapsed * 1e6:6.1f} us/lookup, {index.duplicates - before}/{len(cases)} flagged")
+
+
+def bench_routing(route_count=50, sources_per_route=4, lookups=1000000):
+    """Routing table: compile time for many routes and per-message dispatch cost"""
+    config_manager = _sample_config_manager()
+    for r in range(route_count):
+        config_manager.config.read_dict({f'route:r{r}': {
+            'source_chat': ', '.join(f'-100200{r:04d}{s:03d}' for s in range(sources_per_route)),
+            'target_chat': f'-1003000{r:06d}',
+            'blacklist_words': ', '.join(f'route{r}word{i}' for i in range(50)),
+            'header_text': f'ROUTE {r}',
+        }})
+
+    start = time.perf_counter()
+    snapshot = ConfigSnapshot.from_config(config_manager)
+    compile_time = time.perf_counter() - start
+    routes = {int(chat): route for route in snapshot.routes for chat in route.source_chats}
+    chat_ids = list(routes)
+    sample = random.Random(17).choices(chat_ids, k=lookups)
+
+    start = time.perf_counter()
+    for chat_id in sample:
+        routes.get(chat_id)
+    dispatch = (time.perf_counter() - start) / lookups
+
+    print(f"Routing: {len(snapshot.routes)} routes, {len(chat_ids)} sources")
+    print(f"  compile : {compile_time * 1000:7.1f} ms per config load")
+    print(f"  dispatch: {dispatch * 1e9:7.1f} ns per message")
+
+
+def bench_target_rules(rule_counts=(10, 100, 500), terms_per_rule=5, message_count=2000):
+    """Content routing: one rule at a time vs. all rules in one automaton pass + kind bitmask"""
+    rng = random.Random(19)
+    posts = _sample_posts(rng, message_count, 600)
+    kinds = [rng.choice((MessageKind.TEXT, MessageKind.PHOTO, MessageKind.VIDEO)) for _ in posts]
+    print(f"Target rules: {message_count} posts of 600 chars, {terms_per_rule} terms per rule")
+    for rule_count in rule_counts:
+        targets = [f'-100400{i:07d}' for i in range(rule_count + 1)]
+        rules = []
+        for i in range(rule_count):
+            words = [_random_word(rng, ENGLISH_LETTERS, 5, 9) for _ in range(terms_per_rule - 1)] + [rng.choice(NEWS_WORDS)]
+            spec = f"words: {', '.join(words)}" + ("; kinds: photo" if i % 4 == 0 else "")
+            rules.append((targets[i], spec))
+
+        parsed = [(target, parse_rule(spec)) for target, spec in rules]
+
+        def per_rule():
+            for post, kind in zip(posts, kinds):
+                lowered = post.lower()
+                [target for target, rule in parsed
+                 if any(word in lowered for word in rule['words'])
+                 and (not rule['kinds'] or kind.name.lower() in rule['kinds'])]
+
+        router = TargetRouter(targets, rules, fallback=[targets[-1]])
+
+        def compiled():
+            for post, kind in zip(posts, kinds):
+                router.select(post, (kind,))
+
+        naive = _timeit(per_rule, 3) / message_count
+        fast = _timeit(compiled, 3) / message_count
+        print(f"  {rule_count:4d} rules: per-rule {naive * 1e6:8.1f} us/msg, compiled {fast * 1e6:6.1f} us/msg")
+
+
+def bench_accounts(account_counts=(1, 2, 4), message_count=300, targets=20, arrival_gap=0.5,
+                   burst=30, refill=5.0, flood_wait=30.0, latency=0.1):
+    """Simulated fan-out backlog: throughput and FloodWaits with 1, 2 and 4 sending accounts"""
+
+    def simulate(account_count):
+        clock = [0.0]
+        accounts = [SenderAccount(f'acc{i}', None, None, None, None, None, primary=not i) for i in range(account_count)]
+        pool = AccountPool(accounts, clock=lambda: clock[0])
+        # Hidden per-account budget: a token bucket that Telegram answers with a FloodWait when empty
+        tokens = {account.name: float(burst) for account in accounts}
+        refilled_at = {account.name: 0.0 for account in accounts}
+        busy_until = {account.name: 0.0 for account in accounts}
+        pending = [(i * arrival_gap, f'-100500{t:07d}') for i in range(message_count) for t in range(targets)]
+        done_at = 0.0
+        for ready, target in pending:
+            while True:
+                clock[0] = ready
+                account = pool.account_for(target)
+                if account is None:
+                    ready += pool.dormant_for(target)
+                    continue
+                name = account.name
+                start = max(ready, busy_until[name])
+                tokens[name] = min(burst, tokens[name] + (start - refilled_at[name]) * refill)
+                refilled_at[name] = start
+                clock[0] = start
+                if tokens[name] < 1:
+                    pool.mark_flooded(account, target, flood_wait, account_wide=True)
+                    continue
+                tokens[name] -= 1
+                busy_until[name] = start + latency
+                account.sent += 1
+                done_at = max(done_at, busy_until[name])
+                break
+        return done_at, sum(account.floods for account in accounts), pool.takeovers
+
+    deliveries = message_count * targets
+    print(f"Accounts: {deliveries} deliveries ({message_count} messages x {targets} targets, one every {arrival_gap}s), "
+          f"per-account budget {burst} burst + {refill:.0f}/s, FloodWait {flood_wait:.0f}s")
+    for account_count in account_counts:
+        elapsed, floods, takeovers = simulate(account_count)
+        print(f"  {account_count} account(s): {deliveries / elapsed * 60:7.1f} deliveries/min, {floods:4d} FloodWaits, "
+              f"{takeovers:5d} takeovers, backlog drained after {elapsed / 60:5.1f} min")
+
+
+BENCHMARKS = {
+    'options': bench_options,
+    'keywords': bench_keywords,
+    'cleaning': bench_cleaning,
+    'replacer': bench_replacer,
+    'fanout': bench_fanout,
+    'batching': bench_batching,
+    'queue': bench_queue,
+    'outbox': bench_outbox,
+    'flood': bench_flood,
+    'slow_target': bench_slow_target,
+    'pacing': bench_pacing,
+    'dedup': bench_dedup,
+    'content_dedup': bench_content_dedup,
+    'near_dedup': bench_near_dedup,
+    'routing': bench_routing,
+    'target_rules': bench_target_rules,
+    'accounts': bench_accounts,
+}
+
+
+def main(argv):
+    names = argv or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            return 1
+        BENCHMARKS[name]()
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
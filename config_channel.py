@@ -0,0 +1,136 @@
+"""
+Config channel - push configuration deltas from the control bot to the running forwarder
+Local IPC over a Unix socket owned by the forwarder; config.ini stays the durable copy
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Callable, Iterable, Optional
+
+# Socket path shared by the forwarder (server) and the control bot (client)
+DEFAULT_SOCKET_PATH = os.getenv('USERBOT_CONFIG_SOCKET', 'userbot_config.sock')
+
+# Largest accepted request line (bytes)
+MAX_REQUEST_SIZE = 64 * 1024
+
+
+class ConfigDelta:
+    """A single typed configuration change"""
+
+    __slots__ = ('section', 'key', 'value')
+
+    def __init__(self, section: str, key: str, value):
+        if not section or not key:
+            raise ValueError("Config delta requires a section and a key")
+        if not isinstance(value, (str, bool, int, float)):
+            raise TypeError(f"Unsupported value type for {section}.{key}: {type(value).__name__}")
+        self.section = section
+        self.key = key
+        self.value = value
+
+    def __repr__(self):
+        return f"ConfigDelta({self.section}.{self.key}={self.value!r})"
+
+    def ini_value(self) -> str:
+        """Value as it is stored in config.ini"""
+        if isinstance(self.value, bool):
+            return 'true' if self.value else 'false'
+        return str(self.value)
+
+    def to_dict(self) -> dict:
+        return {'section': self.section, 'key': self.key, 'value': self.value}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ConfigDelta':
+        return cls(data.get('section'), data.get('key'), data.get('value'))
+
+
+class ConfigChannelServer:
+    """Unix socket server that applies pushed config deltas in the forwarder process"""
+
+    def __init__(self, on_deltas: Callable[[list], int], socket_path: str = DEFAULT_SOCKET_PATH):
+        self.on_deltas = on_deltas
+        self.socket_path = socket_path
+        self.logger = logging.getLogger(__name__)
+        self._server = None
+
+    async def start(self) -> bool:
+        """Start listening; returns False if Unix sockets are unavailable"""
+        if not hasattr(asyncio, 'start_unix_server'):
+            self.logger.warning("Config channel disabled: Unix sockets are not supported on this platform")
+            return False
+
+        # Remove a stale socket left behind by a previous run
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        self._server = await asyncio.start_unix_server(
+            self._handle_client, path=self.socket_path, limit=MAX_REQUEST_SIZE
+        )
+        os.chmod(self.socket_path, 0o600)
+        self.logger.info(f"📡 Config channel listening on {self.socket_path}")
+        return True
+
+    async def stop(self):
+        """Stop listening and remove the socket file"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def _handle_client(self, reader, writer):
+        # One request per connection: read a JSON line, apply it, reply
+        try:
+            line = await reader.readline()
+            if line:
+                response = self._handle_request(line)
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        except Exception as e:
+            self.logger.error(f"Config channel client error: {e}")
+        finally:
+            writer.close()
+
+    def _handle_request(self, line: bytes) -> dict:
+        try:
+            request = json.loads(line)
+            deltas = [ConfigDelta.from_dict(item) for item in request.get('updates', [])]
+            if not deltas:
+                return {'ok': False, 'error': 'no updates'}
+            version = self.on_deltas(deltas)
+            return {'ok': True, 'version': version}
+        except Exception as e:
+            self.logger.warning(f"Rejected config delta: {e}")
+            return {'ok': False, 'error': str(e)}
+
+
+async def push_config_deltas(deltas: Iterable[ConfigDelta], socket_path: str = DEFAULT_SOCKET_PATH,
+                             timeout: float = 2.0) -> Optional[int]:
+    """Push deltas to a running forwarder; returns the new config version or None if not applied"""
+    if not hasattr(asyncio, 'open_unix_connection') or not os.path.exists(socket_path):
+        return None
+
+    logger = logging.getLogger(__name__)
+    payload = json.dumps({'updates': [d.to_dict() for d in deltas]}, ensure_ascii=False)
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(socket_path), timeout)
+        writer.write(payload.encode('utf-8') + b'\n')
+        await writer.drain()
+        response = json.loads(await asyncio.wait_for(reader.readline(), timeout))
+    except (OSError, asyncio.TimeoutError, ValueError) as e:
+        # Forwarder not running or not responding - config.ini still carries the change
+        logger.debug(f"Config push skipped: {e}")
+        return None
+    finally:
+        if writer:
+            writer.close()
+
+    if not response.get('ok'):
+        logger.warning(f"Forwarder rejected config update: {response.get('error')}")
+        return None
+    return response.get('version')
@@ -0,0 +1,248 @@
+"""
+Configuration snapshots for the forwarding hot path
+Immutable, pre-parsed views of config.ini that are swapped atomically on change.
+Each [route:NAME] section becomes its own route snapshot with its sources, targets and
+compiled filter/transform options; the top-level snapshot spans all of them
+"""
+
+import asyncio
+import itertools
+import logging
+from typing import Callable, Optional
+
+from forward_options import ForwardOptions
+from target_rules import TargetRouter
+from utils import ConfigManager
+
+# Monotonic version counter shared by all snapshots in this process
+_snapshot_versions = itertools.count(1)
+
+# Config sections named [route:NAME] each define one source -> targets route
+ROUTE_PREFIX = 'route:'
+
+# Sections whose keys a route section may override; queue, rate limit and pacing settings are process-wide
+ROUTE_OVERRIDE_SECTIONS = ('forwarding', 'text_replacer')
+
+# [forwarding] keys that configure shared machinery (pacer, batcher, album collector, dedup
+# indexes, fan-out, queue) and so cannot differ per route
+PROCESS_WIDE_KEYS = (
+    'forward_delay', 'album_window', 'forward_batch_window', 'content_dedup_window',
+    'near_dedup_threshold', 'near_dedup_window', 'max_concurrent_targets', 'per_target_concurrency',
+    'queue_size', 'queue_workers', 'queue_policy', 'config_reload_interval',
+)
+
+# Name of the route built from [forwarding] source_chat / target_chat
+DEFAULT_ROUTE = 'default'
+
+
+def parse_chat_list(raw: str) -> tuple:
+    """Parse a comma-separated chat list into a tuple of identifiers"""
+    return tuple(chat.strip() for chat in (raw or '').split(',') if chat.strip())
+
+
+def config_values(config_manager: ConfigManager) -> dict:
+    """Every raw value by section, for telling a real change from a rewrite of the same config"""
+    parser = config_manager.config
+    return {section: dict(parser.items(section, raw=True)) for section in parser.sections()}
+
+
+def _unique(chats) -> tuple:
+    return tuple(dict.fromkeys(chats))
+
+
+class RouteConfig:
+    """ConfigManager view where a route section overrides forwarding and text_replacer keys"""
+
+    def __init__(self, config_manager: ConfigManager, section: str):
+        self.config_manager = config_manager
+        self.section = section
+
+    def _section(self, section: str, key: str) -> str:
+        if section in ROUTE_OVERRIDE_SECTIONS and self.config_manager.get_raw(self.section, key) is not None:
+            return self.section
+        return section
+
+    def get(self, section: str, key: str, fallback=None):
+        return self.config_manager.get(self._section(section, key), key, fallback=fallback)
+
+    def getint(self, section: str, key: str, fallback=None):
+        return self.config_manager.getint(self._section(section, key), key, fallback=fallback)
+
+    def getfloat(self, section: str, key: str, fallback=None):
+        return self.config_manager.getfloat(self._section(section, key), key, fallback=fallback)
+
+    def getboolean(self, section: str, key: str, fallback=None):
+        return self.config_manager.getboolean(self._section(section, key), key, fallback=fallback)
+
+
+class ConfigSnapshot:
+    """Immutable, pre-parsed configuration read by reference from the hot path"""
+
+    __slots__ = ('version', 'source_chats', 'target_chats', 'forward_options', 'name', 'target_router', '_routes')
+
+    def __init__(self, version: int, source_chats: tuple, target_chats: tuple, forward_options: ForwardOptions,
+                 routes: tuple = (), name: str = DEFAULT_ROUTE, target_router: Optional[TargetRouter] = None):
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'source_chats', tuple(source_chats))
+        object.__setattr__(self, 'target_chats', tuple(target_chats))
+        object.__setattr__(self, 'forward_options', forward_options)
+        object.__setattr__(self, 'name', name)
+        # Content rules choosing among target_chats per message; None sends everything everywhere
+        object.__setattr__(self, 'target_router', target_router)
+        object.__setattr__(self, '_routes', tuple(routes))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigSnapshot is immutable")
+
+    def __repr__(self):
+        return (f"ConfigSnapshot(version={self.version}, sources={len(self.source_chats)}, "
+                f"targets={len(self.target_chats)}, routes={len(self.routes)})")
+
+    @property
+    def routes(self) -> tuple:
+        """Route snapshots (a snapshot without [route:*] sections is its own single route)"""
+        return self._routes or (self,)
+
+    @property
+    def source_chat(self) -> str:
+        """First source chat (backward compatibility)"""
+        return self.source_chats[0] if self.source_chats else ''
+
+    @property
+    def target_chat(self) -> str:
+        """First target chat (backward compatibility)"""
+        return self.target_chats[0] if self.target_chats else ''
+
+    @classmethod
+    def from_config(cls, config_manager: ConfigManager, version: Optional[int] = None) -> 'ConfigSnapshot':
+        """Build a snapshot from a loaded ConfigManager, compiling every route's options once"""
+        version = version if version is not None else next(_snapshot_versions)
+        source_chats = parse_chat_list(config_manager.get('forwarding', 'source_chat', fallback=''))
+        target_chats = parse_chat_list(config_manager.get('forwarding', 'target_chat', fallback=''))
+        forward_options = ForwardOptions.from_config(config_manager)
+
+        def router(targets, options):
+            return TargetRouter.from_config(config_manager, targets, whole_words=options.match_whole_words)
+
+        route_sections = [section for section in config_manager.config.sections() if section.startswith(ROUTE_PREFIX)]
+        if not route_sections:
+            if not source_chats or not target_chats:
+                raise ValueError("Please configure source_chat and target_chat in config.ini")
+            cls._check_rule_targets(config_manager, target_chats)
+            return cls(version, source_chats, target_chats, forward_options,
+                       target_router=router(target_chats, forward_options))
+
+        routes = []
+        if source_chats and target_chats:
+            routes.append(cls(version, source_chats, target_chats, forward_options,
+                              target_router=router(target_chats, forward_options)))
+        routed = {chat: DEFAULT_ROUTE for chat in source_chats}
+        for section in route_sections:
+            name = section[len(ROUTE_PREFIX):].strip()
+            route_sources = parse_chat_list(config_manager.get(section, 'source_chat', fallback=''))
+            route_targets = parse_chat_list(config_manager.get(section, 'target_chat', fallback=''))
+            if not route_sources or not route_targets:
+                raise ValueError(f"Route '{name}' needs source_chat and target_chat")
+            shared = [key for key in PROCESS_WIDE_KEYS if config_manager.get_raw(section, key) is not None]
+            if shared:
+                raise ValueError(f"Route '{name}': {', '.join(shared)} can only be set in [forwarding] (process-wide)")
+            for chat in route_sources:
+                if chat in routed:
+                    raise ValueError(f"Source {chat} is in routes '{routed[chat]}' and '{name}'")
+                routed[chat] = name
+            try:
+                route_options = ForwardOptions.from_config(RouteConfig(config_manager, section))
+            except ValueError as e:
+                raise ValueError(f"Route '{name}': {e}") from e
+            routes.append(cls(version, route_sources, route_targets, route_options, name=name,
+                              target_router=router(route_targets, route_options)))
+
+        all_targets = _unique(chat for route in routes for chat in route.target_chats)
+        cls._check_rule_targets(config_manager, all_targets)
+        return cls(
+            version,
+            _unique(chat for route in routes for chat in route.source_chats),
+            all_targets,
+            forward_options,
+            routes=routes
+        )
+
+    @staticmethod
+    def _check_rule_targets(config_manager: ConfigManager, targets: tuple):
+        unknown = TargetRouter.unknown_targets(config_manager, targets)
+        if unknown:
+            raise ValueError(f"[target_rules] names chats that are not targets: {', '.join(unknown)}")
+
+    @classmethod
+    def from_file(cls, config_path: str) -> 'ConfigSnapshot':
+        """Parse config_path and build a snapshot from it"""
+        return cls.from_config(ConfigManager(config_path))
+
+
+class ConfigWatcher:
+    """Watch config.ini (or the config store revision) and swap in a fresh snapshot only on change"""
+
+    def __init__(self, config_path: str, on_reload: Callable[[ConfigSnapshot, ConfigManager], None],
+                 interval: float = 1.0, store_path: Optional[str] = None):
+        self.config_path = config_path
+        self.store_path = store_path
+        self.on_reload = on_reload
+        self.interval = interval
+        self.logger = logging.getLogger(__name__)
+        self._signature = self._source_signature()
+        # Values of the config currently applied; None until the first reload or mark_applied
+        self._applied = None
+        self._task = None
+
+    def _source_signature(self):
+        """Store revision or config file (mtime, size); None if unavailable"""
+        return ConfigManager.source_signature(self.config_path, self.store_path)
+
+    def mark_applied(self, config_manager: ConfigManager):
+        """Record a config applied without the watcher (pushed deltas), so polling does not rebuild it"""
+        self._signature = self._source_signature()
+        self._applied = config_values(config_manager)
+
+    def check(self) -> bool:
+        """Reload the snapshot if the config changed; returns True on swap"""
+        signature = self._source_signature()
+        if signature is None or signature == self._signature:
+            return False
+
+        self._signature = signature
+        try:
+            config_manager = ConfigManager(self.config_path, store_path=self.store_path)
+            values = config_values(config_manager)
+            if values == self._applied:
+                # Rewritten with the values already in effect (e.g. a change that was also pushed)
+                return False
+            snapshot = ConfigSnapshot.from_config(config_manager)
+        except Exception as e:
+            # Keep serving the previous snapshot if the new file is invalid or half-written
+            self.logger.error(f"Config reload failed, keeping previous snapshot: {e}")
+            return False
+
+        self._applied = values
+        self.on_reload(snapshot, config_manager)
+        return True
+
+    async def run(self):
+        """Poll the config file until cancelled"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.error(f"Config watcher error: {e}")
+
+    def start(self):
+        """Start polling in the background on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run())
+        return self._task
+
+    def stop(self):
+        """Stop polling"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
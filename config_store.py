@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Config store - transactional SQLite (WAL) backend for ConfigManager
+Per-key upserts with a monotonically increasing revision counter
+
+Usage: python config_store.py import config.ini config.db
+       python config_store.py export config.db config.ini
+"""
+
+import configparser
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from typing import Iterable, Optional, Tuple
+
+# Environment variable that enables the SQLite backend (path to the database)
+STORE_ENV_VAR = 'CONFIG_STORE'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS config (
+    section  TEXT NOT NULL,
+    key      TEXT NOT NULL,
+    value    TEXT,
+    revision INTEGER NOT NULL,
+    PRIMARY KEY (section, key)
+);
+CREATE INDEX IF NOT EXISTS config_revision ON config (revision);
+CREATE TABLE IF NOT EXISTS meta (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (name, value) VALUES ('revision', 0);
+"""
+
+
+class SQLiteConfigStore:
+    """Key/value config store on SQLite in WAL mode; readers never block the writer"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def revision(self) -> int:
+        """Current revision; bumps by one for every committed write"""
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'revision'").fetchone()
+        return row[0] if row else 0
+
+    def has_changed_since(self, revision: int) -> bool:
+        """Cheap check whether anything was written after the given revision"""
+        return self.revision() > revision
+
+    def changes_since(self, revision: int) -> list:
+        """(section, key, value, revision) rows written after revision; value None means deleted"""
+        return self._conn.execute(
+            "SELECT section, key, value, revision FROM config WHERE revision > ? ORDER BY revision",
+            (revision,)
+        ).fetchall()
+
+    def is_empty(self) -> bool:
+        return self._conn.execute("SELECT 1 FROM config LIMIT 1").fetchone() is None
+
+    def get(self, section: str, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value FROM config WHERE section = ? AND key = ?", (section, key)
+        ).fetchone()
+        return row[0] if row else None
+
+    def load_all(self) -> dict:
+        """All live values as {section: {key: value}}"""
+        data = {}
+        for section, key, value in self._conn.execute(
+            "SELECT section, key, value FROM config WHERE value IS NOT NULL ORDER BY section, key"
+        ):
+            data.setdefault(section, {})[key] = value
+        return data
+
+    def set(self, section: str, key: str, value: Optional[str]) -> int:
+        """Upsert one key (None deletes it); returns the new revision"""
+        return self.set_many([(section, key, value)])
+
+    def set_many(self, items: Iterable[Tuple[str, str, Optional[str]]]) -> int:
+        """Upsert several keys in one transaction under a single new revision"""
+        items = list(items)
+        with self._lock:
+            cur = self._conn.cursor()
+            try:
+                cur.execute('BEGIN IMMEDIATE')
+                cur.execute("UPDATE meta SET value = value + 1 WHERE name = 'revision'")
+                revision = cur.execute("SELECT value FROM meta WHERE name = 'revision'").fetchone()[0]
+                cur.executemany(
+                    "INSERT INTO config (section, key, value, revision) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (section, key) DO UPDATE SET value = excluded.value, revision = excluded.revision",
+                    [(section, key, value, revision) for section, key, value in items]
+                )
+                cur.execute('COMMIT')
+            except Exception:
+                cur.execute('ROLLBACK')
+                raise
+        return revision
+
+    def import_ini(self, ini_path: str) -> int:
+        """Load every key from an INI file in one transaction"""
+        parser = configparser.ConfigParser()
+        if not parser.read(ini_path, encoding='utf-8'):
+            raise FileNotFoundError(f"Config file not found: {ini_path}")
+        items = [
+            (section, key, parser.get(section, key, raw=True))
+            for section in parser.sections()
+            for key in parser.options(section)
+        ]
+        revision = self.set_many(items)
+        self.logger.info(f"Imported {len(items)} settings from {ini_path} (rev {revision})")
+        return revision
+
+    def export_ini(self, ini_path: str):
+        """Write all values to an INI file atomically"""
+        parser = configparser.ConfigParser()
+        parser.read_dict(self.load_all())
+        write_ini_atomic(parser, ini_path)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(db_path: str) -> SQLiteConfigStore:
+    """Shared store instance per database path (one connection per process)"""
+    key = os.path.abspath(db_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SQLiteConfigStore(db_path)
+        return store
+
+
+def write_ini_atomic(parser: configparser.ConfigParser, ini_path: str):
+    """Write an INI file via temp file + rename so readers never see a half-written file"""
+    directory = os.path.dirname(os.path.abspath(ini_path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.config-', suffix='.ini', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as configfile:
+            parser.write(configfile)
+        if os.path.exists(ini_path):
+            # Keep the original file's permissions
+            os.chmod(tmp_path, os.stat(ini_path).st_mode & 0o777)
+        os.replace(tmp_path, ini_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def main(argv):
+    if len(argv) != 3 or argv[0] not in ('import', 'export'):
+        print(__doc__.strip().split('\n\n', 1)[1])
+        return 1
+
+    logging.basicConfig(level=logging.INFO)
+    command, source, destination = argv
+    if command == 'import':
+        SQLiteConfigStore(destination).import_ini(source)
+    else:
+        SQLiteConfigStore(source).export_ini(destination)
+    print(f"✅ {command}: {source} -> {destination}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
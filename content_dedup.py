@@ -0,0 +1,227 @@
+"""
+Content dedup - drop the same post arriving from several sources
+A fingerprint of the normalized text plus media ids is checked against a time-windowed Bloom
+filter (two rotating generations). Bloom hits are confirmed against an exact store that also
+remembers which message first carried the fingerprint, so a replay of that same message is
+never mistaken for a cross-post
+"""
+
+import base64
+import hashlib
+import logging
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+from utils import JsonState
+
+DEFAULT_CONTENT_DEDUP_PATH = os.getenv('USERBOT_CONTENT_DEDUP_STATE', 'content_dedup.json')
+
+# Fingerprints expected per Bloom generation, and the tolerated false-positive rate
+BLOOM_CAPACITY = 100000
+BLOOM_ERROR_RATE = 0.001
+
+# Exact fingerprints kept for confirming Bloom hits (oldest dropped first)
+EXACT_LIMIT = 50000
+
+# State is written at most this often (and on shutdown)
+SAVE_INTERVAL = 60.0
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def content_fingerprint(messages, scope: str = '') -> Optional[bytes]:
+    """16-byte digest of the normalized text and media ids; None for messages with neither
+
+    A non-empty scope (route name) keeps the same content in different scopes apart.
+    """
+    if not isinstance(messages, list):
+        messages = [messages]
+    digest = hashlib.blake2b(digest_size=16)
+    if scope:
+        digest.update(scope.encode('utf-8') + b'\x02')
+    has_content = False
+    for message in messages:
+        text = message.message or ''
+        if text:
+            text = _WHITESPACE_RE.sub(' ', unicodedata.normalize('NFKC', text).casefold()).strip()
+        media_ids = [str(media.id) for media in (getattr(message, 'photo', None), getattr(message, 'document', None))
+                     if getattr(media, 'id', None) is not None]
+        if text or media_ids:
+            has_content = True
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\x00' + ','.join(media_ids).encode('ascii') + b'\x01')
+    return digest.digest() if has_content else None
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 16-byte digests (double hashing)"""
+
+    __slots__ = ('size', 'hashes', 'bits', 'count')
+
+    def __init__(self, capacity: int = BLOOM_CAPACITY, error_rate: float = BLOOM_ERROR_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest: bytes):
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def __contains__(self, digest: bytes) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+    def add(self, digest: bytes):
+        bits = self.bits
+        for position in self._positions(digest):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+
+class ContentDedup:
+    """Time-windowed Bloom filter plus exact confirmation store for cross-source duplicates"""
+
+    def __init__(self, window: float = 86400.0, path: str = DEFAULT_CONTENT_DEDUP_PATH,
+                 capacity: int = BLOOM_CAPACITY, clock: Callable[[], float] = time.time):
+        self.window = window
+        self.capacity = capacity
+        self.clock = clock
+        self.state = JsonState(path, 'content dedup state', SAVE_INTERVAL, clock=clock)
+        self.logger = logging.getLogger(__name__)
+        now = clock()
+        # Two generations each covering half the window: entries live between window/2 and window
+        self.current = BloomFilter(capacity)
+        self.previous = BloomFilter(capacity)
+        self.rotated_at = now
+        # digest -> (chat_id, message_id, first seen)
+        self._exact = OrderedDict()
+        self.duplicates = 0
+        self.checked = 0
+        # When the exact store last dropped a live entry for size; until then a Bloom hit
+        # without an exact entry is a false positive
+        self._overflowed_at = None
+
+    def _rotate(self, now: float):
+        if now - self.rotated_at >= self.window / 2:
+            self.previous = self.current if now - self.rotated_at < self.window else BloomFilter(self.capacity)
+            self.current = BloomFilter(self.capacity)
+            self.rotated_at = now
+        cutoff = now - self.window
+        exact = self._exact
+        while exact:
+            digest, (_, _, seen_at) = next(iter(exact.items()))
+            if seen_at >= cutoff:
+                if len(exact) <= EXACT_LIMIT:
+                    break
+                self._overflowed_at = now
+            exact.popitem(last=False)
+
+    def is_duplicate(self, messages, keys: Iterable[tuple], scope: str = '') -> bool:
+        """True if the same content was already forwarded from a different message in the window
+
+        keys are the (chat_id, message_id) pairs of the message (or album parts) being checked;
+        only content seen in the same scope (route) counts.
+        """
+        digest = content_fingerprint(messages, scope)
+        if digest is None:
+            return False
+        now = self.clock()
+        self._rotate(now)
+        self.checked += 1
+        keys = set(keys)
+
+        if digest in self.current or digest in self.previous:
+            first = self._exact.get(digest)
+            if first is not None:
+                if (first[0], first[1]) in keys:
+                    # Same message again (replay after restart): not a cross-post
+                    return False
+                self.duplicates += 1
+                return True
+            if self._overflowed_at is not None and now - self._overflowed_at < self.window:
+                # The confirmation entry may have been dropped for size; trust the filter
+                self.duplicates += 1
+                return True
+            # Otherwise this hit is a Bloom false positive
+
+        self.current.add(digest)
+        chat_id, message_id = min(keys)
+        self._exact[digest] = (chat_id, message_id, now)
+        if self.state.changed():
+            self.save()
+        return False
+
+    def forget(self, messages, keys: Iterable[tuple], scope: str = ''):
+        """Drop the fingerprint recorded for this message (none of its deliveries went out)
+
+        The Bloom bits stay set; without the exact entry a later hit counts as a false positive.
+        """
+        digest = content_fingerprint(messages, scope)
+        first = self._exact.get(digest) if digest is not None else None
+        if first is not None and (first[0], first[1]) in set(keys):
+            del self._exact[digest]
+            if self.state.changed():
+                self.save()
+
+    def load(self):
+        """Restore filters and confirmation entries saved by an earlier run"""
+        data = self.state.load()
+        if data is None:
+            return
+        try:
+            for name in ('current', 'previous'):
+                bloom = BloomFilter(self.capacity)
+                bits = base64.b64decode(data[name])
+                if len(bits) != len(bloom.bits):
+                    # Sized for another capacity: start that generation empty
+                    continue
+                bloom.bits[:] = bits
+                setattr(self, name, bloom)
+            self.rotated_at = float(data['rotated_at'])
+            self._overflowed_at = data.get('overflowed_at')
+            for digest, chat_id, message_id, seen_at in data.get('exact', []):
+                self._exact[bytes.fromhex(digest)] = (chat_id, message_id, seen_at)
+        except (KeyError, TypeError, ValueError) as e:
+            self.logger.warning(f"Ignoring invalid content dedup state: {e}")
+            self.current, self.previous = BloomFilter(self.capacity), BloomFilter(self.capacity)
+            self.rotated_at = self.clock()
+            self._exact.clear()
+            return
+        self._rotate(self.clock())
+        self.logger.info(f"🧬 Restored content dedup state ({len(self._exact)} recent fingerprints)")
+
+    def save(self):
+        """Persist both generations and the confirmation store atomically"""
+        data = {
+            'rotated_at': self.rotated_at,
+            'overflowed_at': self._overflowed_at,
+            'current': base64.b64encode(self.current.bits).decode('ascii'),
+            'previous': base64.b64encode(self.previous.bits).decode('ascii'),
+            'exact': [[digest.hex(), chat_id, message_id, seen_at]
+                      for digest, (chat_id, message_id, seen_at) in self._exact.items()],
+        }
+        self.state.save(data)
+
+    def close(self):
+        if self.state.dirty:
+            self.save()
+
+    def get_stats(self) -> dict:
+        return {
+            'checked': self.checked,
+            'duplicates': self.duplicates,
+            'fingerprints': len(self._exact),
+            'window': self.window,
+        }
+
+    def summary(self) -> str:
+        stats = self.get_stats()
+        return f"{stats['duplicates']}/{stats['checked']} cross-posts dropped, {stats['fingerprints']} recent fingerprints"
@@ -0,0 +1,125 @@
+"""
+Dedup index - bounded record of which source messages were already handled
+Per chat it keeps the highest message id seen plus a bitmap of the ids just below it, so
+out-of-order arrivals are still recognised; ids older than the window count as seen.
+Memory is capped by the number of chats tracked, and the index survives restarts
+"""
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from utils import JsonState
+
+DEFAULT_DEDUP_PATH = os.getenv('USERBOT_DEDUP_STATE', 'dedup_state.json')
+
+# Message ids tracked below the high-water mark, per chat
+DEFAULT_WINDOW = 1024
+
+# Chats tracked at once; the least recently active chat is evicted beyond this
+DEFAULT_MAX_CHATS = 4096
+
+# The index is written at most this often (and on shutdown)
+SAVE_INTERVAL = 30.0
+
+
+class DedupIndex:
+    """High-water mark + sliding bitmap per chat, with integer keys and a chat cap"""
+
+    def __init__(self, window: int = DEFAULT_WINDOW, max_chats: int = DEFAULT_MAX_CHATS,
+                 path: str = DEFAULT_DEDUP_PATH, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.max_chats = max_chats
+        self.clock = clock
+        self.state = JsonState(path, 'dedup state', SAVE_INTERVAL, clock=clock)
+        self.logger = logging.getLogger(__name__)
+        self._full = (1 << window) - 1
+        # chat_id -> [high-water mark, bitmap]; bit k set means message (mark - k) was seen
+        self._chats = OrderedDict()
+        self.duplicates = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._chats)
+
+    def seen(self, chat_id: int, message_id: int) -> bool:
+        entry = self._chats.get(chat_id)
+        if entry is None:
+            return False
+        mark, bitmap = entry
+        if message_id > mark:
+            return False
+        offset = mark - message_id
+        # Older than the window: handled long ago
+        if offset >= self.window or bitmap >> offset & 1:
+            self.duplicates += 1
+            return True
+        return False
+
+    def add(self, chat_id: int, message_id: int) -> bool:
+        """Mark a message handled; returns False if it already was"""
+        entry = self._chats.get(chat_id)
+        if entry is None:
+            self._chats[chat_id] = [message_id, 1]
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._chats.move_to_end(chat_id)
+            mark, bitmap = entry
+            if message_id > mark:
+                entry[0] = message_id
+                entry[1] = (bitmap << (message_id - mark) | 1) & self._full
+            else:
+                offset = mark - message_id
+                if offset >= self.window or bitmap >> offset & 1:
+                    self.duplicates += 1
+                    return False
+                entry[1] = bitmap | 1 << offset
+
+        if self.state.changed():
+            self.save()
+        return True
+
+    def load(self):
+        """Restore the index saved by an earlier run"""
+        data = self.state.load()
+        if data is None:
+            return
+        try:
+            for chat_id, (mark, bitmap) in data.get('chats', {}).items():
+                # Bits are anchored at the mark, so a smaller window just drops the oldest ones
+                self._chats[int(chat_id)] = [int(mark), int(bitmap, 16) & self._full]
+        except (TypeError, ValueError) as e:
+            self.logger.warning(f"Ignoring invalid dedup state: {e}")
+            self._chats.clear()
+            return
+        while len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
+        self.logger.info(f"🧮 Restored dedup index for {len(self._chats)} chats")
+
+    def save(self):
+        """Persist the index atomically"""
+        data = {
+            'window': self.window,
+            'chats': {str(chat_id): [mark, format(bitmap, 'x')] for chat_id, (mark, bitmap) in self._chats.items()},
+        }
+        self.state.save(data)
+
+    def close(self):
+        if self.state.dirty:
+            self.save()
+
+    def get_stats(self) -> dict:
+        return {
+            'chats': len(self._chats),
+            'window': self.window,
+            'duplicates': self.duplicates,
+            'evicted': self.evicted,
+        }
+
+    def summary(self) -> str:
+        stats = self.get_stats()
+        return f"{stats['chats']} chats (window {stats['window']}), {stats['duplicates']} duplicates skipped"
@@ -0,0 +1,108 @@
+"""
+Target fan-out - deliver one message to many targets concurrently
+A global limit bounds in-flight deliveries; a per-target limit keeps each chat's sends in order.
+Submitted messages are delivered in the background, so a slow target only holds back its own
+deliveries, never the workers handing out the next message
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Iterable, List, Tuple
+
+
+class TargetFanOut:
+    """Runs one delivery per target concurrently under global and per-target semaphores"""
+
+    def __init__(self, max_concurrent: int = 10, per_target: int = 1, max_pending: int = 1000):
+        self.logger = logging.getLogger(__name__)
+        self._tasks = set()
+        self.in_flight = 0
+        self.configure(max_concurrent, per_target, max_pending)
+
+    def __repr__(self):
+        return f"TargetFanOut(max_concurrent={self.max_concurrent}, per_target={self.per_target})"
+
+    def limits(self) -> tuple:
+        return self.max_concurrent, self.per_target, self.max_pending
+
+    def configure(self, max_concurrent: int, per_target: int, max_pending: int):
+        """Apply new limits; deliveries already holding a slot finish under the old ones"""
+        self.max_concurrent = max_concurrent
+        self.per_target = per_target
+        self.max_pending = max_pending
+        self._global = asyncio.Semaphore(max_concurrent)
+        self._targets = {}
+        # Messages still being delivered; submit() waits while this many are
+        self._pending = asyncio.Semaphore(max_pending)
+
+    def _target_semaphore(self, target) -> asyncio.Semaphore:
+        semaphore = self._targets.get(target)
+        if semaphore is None:
+            semaphore = self._targets[target] = asyncio.Semaphore(self.per_target)
+        return semaphore
+
+    @asynccontextmanager
+    async def slot(self, target):
+        """Hold one global and one per-target slot (for requests sent outside run(), e.g. batched forwards)"""
+        # Take the target slot first so a busy chat never holds a global slot while it waits
+        async with self._target_semaphore(target):
+            async with self._global:
+                yield
+
+    async def _deliver_one(self, target, deliver: Callable[[str], Awaitable[bool]]) -> bool:
+        async with self.slot(target):
+            return await self._deliver_unlimited(target, deliver)
+
+    async def _deliver_unlimited(self, target, deliver: Callable[[str], Awaitable[bool]]) -> bool:
+        try:
+            # None is passed through: the delivery was deferred, not failed
+            return await deliver(target)
+        except Exception as e:
+            self.logger.error(f"Delivery to {target} failed: {e}")
+            return False
+
+    async def run(self, targets: Iterable[str], deliver: Callable[[str], Awaitable[bool]],
+                  limited: bool = True) -> List[Tuple[str, bool]]:
+        """Deliver to every target concurrently; returns [(target, success), ...] in target order
+
+        success is True, False, or None when the delivery was deferred (parked until a FloodWait ends).
+
+        limited=False skips both semaphores, for deliveries that take a slot() per request themselves
+        (batched forwards: waiting per message would keep a batch from filling).
+        """
+        targets = list(targets)
+        deliver_one = self._deliver_one if limited else self._deliver_unlimited
+        if len(targets) == 1:
+            return [(targets[0], await deliver_one(targets[0], deliver))]
+        results = await asyncio.gather(*(deliver_one(target, deliver) for target in targets))
+        return list(zip(targets, results))
+
+    async def submit(self, targets: Iterable[str], deliver: Callable[[str], Awaitable[bool]],
+                     on_done: Callable[[List[Tuple[str, bool]]], None], limited: bool = True):
+        """Start delivering to every target in the background; on_done(results) runs once all settled
+
+        Returns as soon as the deliveries are started, waiting only while max_pending messages are
+        still being delivered (backpressure towards the work queue).
+        """
+        pending = self._pending
+        await pending.acquire()
+        self.in_flight += 1
+        task = asyncio.get_running_loop().create_task(self._run_and_report(list(targets), deliver, on_done, limited, pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_and_report(self, targets, deliver, on_done, limited, pending):
+        try:
+            on_done(await self.run(targets, deliver, limited))
+        except Exception as e:
+            self.logger.error(f"Recording deliveries to {len(targets)} targets failed: {e}")
+        finally:
+            self.in_flight -= 1
+            pending.release()
+
+    async def cancel(self):
+        """Stop background deliveries (shutdown); unacknowledged ones stay in the outbox"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
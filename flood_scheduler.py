@@ -0,0 +1,156 @@
+"""
+Flood scheduler - park deliveries to targets Telegram told us to leave alone
+A FloodWait makes the target (or the whole account) dormant until the deadline Telegram gave.
+Deliveries to a dormant target are parked instead of sleeping inside the send, so workers keep
+serving other targets; parked work resumes in arrival order once the deadline has passed
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+# Dormancy key for account-wide floods (e.g. while resolving peers)
+ACCOUNT = '*account*'
+
+
+class _TargetState:
+    __slots__ = ('until', 'parked', 'timer', 'resuming', 'floods', 'last_wait')
+
+    def __init__(self):
+        self.until = 0.0
+        self.parked = deque()
+        self.timer = None
+        self.resuming = None
+        self.floods = 0
+        self.last_wait = 0
+
+
+class FloodScheduler:
+    """Dormancy deadlines per target and for the account, with FIFO queues of parked deliveries"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+        self._states = {}
+        self.floods = 0
+        self.resumed = 0
+
+    def _state(self, target) -> _TargetState:
+        state = self._states.get(target)
+        if state is None:
+            state = self._states[target] = _TargetState()
+        return state
+
+    def dormant_for(self, target) -> float:
+        """Seconds until target (and the account) may be sent to again"""
+        now = self.clock()
+        until = max(self._state(target).until, self._state(ACCOUNT).until)
+        return max(0.0, until - now)
+
+    def should_park(self, target) -> bool:
+        """True while target is dormant or still has parked work ahead of new deliveries"""
+        state = self._states.get(target)
+        if state is not None and (state.parked or state.resuming is not None):
+            return True
+        return self.dormant_for(target) > 0
+
+    def mark_dormant(self, target, seconds: float, account: bool = False):
+        """Record a FloodWait: nothing goes to target (or anywhere, for account) before the deadline"""
+        key = ACCOUNT if account else target
+        state = self._state(key)
+        state.until = max(state.until, self.clock() + seconds)
+        state.floods += 1
+        state.last_wait = seconds
+        self.floods += 1
+        scope = "account" if account else str(target)
+        self.logger.warning(f"🛑 FloodWait {round(seconds, 1)}s: {scope} dormant, other targets continue")
+        if account:
+            for other in list(self._states):
+                if other != ACCOUNT and self._states[other].parked:
+                    self._schedule(other)
+        self._schedule(target)
+
+    def park(self, target, job: Callable[[], Awaitable], front: bool = False):
+        """Queue a delivery until target wakes; front=True puts a re-throttled resumed job back first"""
+        state = self._state(target)
+        if front:
+            state.parked.appendleft(job)
+        else:
+            state.parked.append(job)
+        if state.resuming is None:
+            self._schedule(target)
+
+    def _schedule(self, target):
+        state = self._state(target)
+        if state.timer is not None:
+            state.timer.cancel()
+        state.timer = asyncio.get_running_loop().call_later(self.dormant_for(target), self._wake, target)
+
+    def _wake(self, target):
+        state = self._state(target)
+        state.timer = None
+        if state.resuming is None and state.parked:
+            state.resuming = asyncio.get_running_loop().create_task(self._resume(target))
+
+    async def _resume(self, target):
+        state = self._state(target)
+        try:
+            if state.parked:
+                self.logger.info(f"▶️ Resuming {len(state.parked)} parked deliveries to {target}")
+            while state.parked:
+                if self.dormant_for(target) > 0:
+                    # Throttled again while draining; the new deadline re-arms the timer
+                    break
+                job = state.parked.popleft()
+                self.resumed += 1
+                try:
+                    await job()
+                except Exception as e:
+                    self.logger.error(f"Parked delivery to {target} failed: {e}")
+        finally:
+            state.resuming = None
+        if state.parked:
+            self._schedule(target)
+
+    def cancel(self):
+        """Drop timers and parked work (shutdown); unacknowledged deliveries stay in the outbox"""
+        for state in self._states.values():
+            if state.timer is not None:
+                state.timer.cancel()
+                state.timer = None
+            if state.resuming is not None:
+                state.resuming.cancel()
+            state.parked.clear()
+
+    def get_state(self) -> dict:
+        """Remaining dormancy, parked deliveries and FloodWait counts per target and for the account"""
+        account = self._state(ACCOUNT)
+        now = self.clock()
+        return {
+            'account': {
+                'dormant_for': round(max(0.0, account.until - now), 1),
+                'floods': account.floods,
+            },
+            'targets': {
+                str(target): {
+                    'dormant_for': round(self.dormant_for(target), 1),
+                    'parked': len(state.parked),
+                    'floods': state.floods,
+                    'last_wait': state.last_wait,
+                }
+                for target, state in self._states.items()
+                if target != ACCOUNT
+            },
+            'floods': self.floods,
+            'parked': sum(len(state.parked) for state in self._states.values()),
+            'resumed': self.resumed,
+        }
+
+    def summary(self) -> str:
+        state = self.get_state()
+        dormant = [target for target, info in state['targets'].items() if info['dormant_for'] > 0]
+        account = f"account dormant {state['account']['dormant_for']}s, " if state['account']['dormant_for'] else ""
+        return (f"{account}{len(dormant)} dormant targets, {state['parked']} parked; "
+                f"{state['floods']} floods, {state['resumed']} resumed")
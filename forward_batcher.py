@@ -0,0 +1,119 @@
+"""
+Forward batcher - micro-batch forward_messages per (source, target)
+Forwards arriving within a short latency budget share one RPC (up to 100 message ids);
+each caller still gets its own per-message result
+"""
+
+import asyncio
+import logging
+from contextlib import nullcontext
+from typing import Callable, Optional
+
+from telethon.errors import FloodWaitError
+
+# Telegram's forwardMessages accepts at most 100 ids per request
+MAX_FORWARD_BATCH = 100
+
+
+class ForwardBatcher:
+    """Coalesces forward_messages calls with the same (source chat, target) into one request"""
+
+    def __init__(self, client, rate_limiter=None, pacer=None, window: float = 0.1, max_batch: int = MAX_FORWARD_BATCH,
+                 on_flood: Optional[Callable] = None, slot: Optional[Callable] = None):
+        self.client = client
+        self.rate_limiter = rate_limiter
+        self.pacer = pacer
+        self.window = window
+        self.max_batch = max_batch
+        # Called as on_flood(target, seconds) once per refused request
+        self.on_flood = on_flood
+        # slot(target) -> async context manager held for each request (the fan-out limits)
+        self.slot = slot
+        self.logger = logging.getLogger(__name__)
+        self._pending = {}
+        self._timers = {}
+        self._locks = {}
+        self._tasks = set()
+        self.batches = 0
+        self.forwarded = 0
+
+    async def forward(self, message, target_chat, target_peer) -> bool:
+        """Queue message for target; resolves to True once Telegram forwarded it"""
+        loop = asyncio.get_running_loop()
+        key = (message.chat_id, target_chat)
+        future = loop.create_future()
+
+        batch = self._pending.get(key)
+        if batch is None:
+            # The window starts with the first message, so no message waits longer than it
+            batch = self._pending[key] = []
+            self._timers[key] = loop.call_later(self.window, self._flush, key, target_peer)
+        batch.append((message, future))
+
+        if len(batch) >= self.max_batch:
+            self._flush(key, target_peer)
+        return await future
+
+    def _flush(self, key, target_peer):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._send(key, target_peer, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, key, target_peer, batch):
+        # One request in flight per (source, target) keeps batches in order
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+
+        async with lock:
+            batch.sort(key=lambda item: item[0].id)
+            messages = [message for message, _ in batch]
+            try:
+                # A request counts as one delivery against the fan-out limits, however many messages it carries
+                async with self.slot(key[1]) if self.slot is not None else nullcontext():
+                    if self.rate_limiter is not None:
+                        # One token per request, not per message
+                        await self.rate_limiter.acquire(key[1], any(message.media for message in messages))
+                    if self.pacer is not None:
+                        await self.pacer.wait(key[1])
+                    results = await self.client.forward_messages(entity=target_peer, messages=messages)
+            except FloodWaitError as e:
+                # One backoff per request, however many messages it carried; callers only reroute
+                if self.pacer is not None:
+                    self.pacer.on_flood(key[1])
+                if self.on_flood is not None:
+                    self.on_flood(key[1], e.seconds)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            if self.pacer is not None:
+                self.pacer.on_success(key[1])
+            if not isinstance(results, list):
+                results = [results]
+            self.batches += 1
+            self.forwarded += sum(1 for result in results if result is not None)
+            if len(batch) > 1:
+                self.logger.info(f"📦 Forwarded batch of {len(batch)} messages from {key[0]} to {key[1]}")
+
+            for index, (_, future) in enumerate(batch):
+                if not future.done():
+                    future.set_result(index < len(results) and results[index] is not None)
+
+    def get_stats(self) -> dict:
+        return {
+            'batches': self.batches,
+            'forwarded': self.forwarded,
+            'avg_batch': round(self.forwarded / self.batches, 1) if self.batches else 0.0,
+        }
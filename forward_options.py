@@ -0,0 +1,229 @@
+"""
+Forward options - typed, pre-parsed forwarding settings
+List-valued settings are parsed once at load time instead of on every message
+"""
+
+from message_kind import build_allow_table
+from near_dedup import MIN_THRESHOLD
+from pacer import PACING_KEYS, PacingLimits
+from rate_limiter import RATE_LIMIT_KEYS, RateLimits
+from text_cleaner import TextCleaner
+from text_matcher import KeywordMatcher, TextReplacer
+from utils import ConfigManager
+from work_queue import QUEUE_POLICIES
+
+FORWARD_MODES = ('forward', 'copy')
+
+# (attribute, config key, default) for every media/content type filter
+MEDIA_FILTERS = (
+    ('forward_text', 'forward_text', True),
+    ('forward_photos', 'forward_photos', True),
+    ('forward_videos', 'forward_videos', True),
+    ('forward_music', 'forward_music', True),
+    ('forward_audio', 'forward_audio', True),
+    ('forward_voice', 'forward_voice', True),
+    ('forward_video_messages', 'forward_video_messages', True),
+    ('forward_files', 'forward_files', True),
+    ('forward_links', 'forward_links', True),
+    ('forward_gif', 'forward_gif', True),
+    ('forward_gifs', 'forward_gifs', True),
+    ('forward_contacts', 'forward_contacts', True),
+    ('forward_locations', 'forward_locations', True),
+    ('forward_polls', 'forward_polls', True),
+    ('forward_stickers', 'forward_stickers', True),
+    ('forward_round', 'forward_round', True),
+    ('forward_games', 'forward_games', True),
+)
+
+# (attribute, section, config key, default) for plain on/off switches
+SWITCHES = (
+    ('header_enabled', 'forwarding', 'header_enabled', False),
+    ('footer_enabled', 'forwarding', 'footer_enabled', False),
+    ('blacklist_enabled', 'forwarding', 'blacklist_enabled', False),
+    ('whitelist_enabled', 'forwarding', 'whitelist_enabled', False),
+    ('clean_links', 'forwarding', 'clean_links', False),
+    ('clean_buttons', 'forwarding', 'clean_buttons', False),
+    ('clean_hashtags', 'forwarding', 'clean_hashtags', False),
+    ('clean_formatting', 'forwarding', 'clean_formatting', False),
+    ('clean_empty_lines', 'forwarding', 'clean_empty_lines', False),
+    ('clean_lines_with_words', 'forwarding', 'clean_lines_with_words', False),
+    ('buttons_enabled', 'forwarding', 'buttons_enabled', False),
+    ('replacer_enabled', 'text_replacer', 'replacer_enabled', False),
+    ('multi_mode_enabled', 'forwarding', 'multi_mode_enabled', False),
+    ('match_whole_words', 'forwarding', 'match_whole_words', False),
+    ('entity_cleaning', 'forwarding', 'entity_cleaning', False),
+    ('content_dedup', 'forwarding', 'content_dedup', False),
+    ('near_dedup', 'forwarding', 'near_dedup', False),
+)
+
+
+def split_words(raw: str) -> tuple:
+    """Split a comma-separated word list into lowercased, de-duplicated terms"""
+    words = []
+    seen = set()
+    for word in (raw or '').split(','):
+        word = word.strip().lower()
+        if word and word not in seen:
+            seen.add(word)
+            words.append(word)
+    return tuple(words)
+
+
+def parse_replacements(raw: str) -> tuple:
+    """Parse 'old1->new1,old2->new2,old3->' into (old, new) pairs"""
+    pairs = []
+    for replacement in (raw or '').split(','):
+        if '->' in replacement:
+            old_text, new_text = replacement.split('->', 1)
+            old_text = old_text.strip()
+            if old_text:  # Only add if old_text is not empty
+                pairs.append((old_text, new_text.strip()))
+    return tuple(pairs)
+
+
+class ForwardOptions:
+    """Typed, immutable forwarding options parsed once per config revision"""
+
+    __slots__ = (
+        tuple(name for name, _, _ in MEDIA_FILTERS)
+        + tuple(name for name, _, _, _ in SWITCHES)
+        + (
+            'delay', 'max_retries', 'forward_mode', 'config_reload_interval',
+            'max_concurrent_targets', 'per_target_concurrency', 'rate_limits', 'pacing', 'album_window',
+            'forward_batch_window', 'queue_size', 'queue_workers', 'queue_policy', 'content_dedup_window',
+            'near_dedup_threshold', 'near_dedup_window',
+            'header_text', 'footer_text',
+            'blacklist_words', 'whitelist_words', 'clean_words_list',
+            'blacklist_matcher', 'whitelist_matcher',
+            'replacements', 'text_replacer', 'buttons', 'allow_table', 'text_cleaner',
+        )
+    )
+
+    def __init__(self, **values):
+        missing = [name for name in self.__slots__ if name not in values]
+        if missing:
+            raise TypeError(f"Missing forward options: {', '.join(missing)}")
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ForwardOptions is immutable")
+
+    def __repr__(self):
+        return f"ForwardOptions(mode={self.forward_mode}, delay={self.delay}, retries={self.max_retries})"
+
+    @classmethod
+    def from_config(cls, config_manager: ConfigManager) -> 'ForwardOptions':
+        """Read and validate all forwarding options; raises ValueError on invalid settings"""
+        cm = config_manager
+        values = {}
+
+        for name, key, default in MEDIA_FILTERS:
+            values[name] = cm.getboolean('forwarding', key, fallback=default)
+        for name, section, key, default in SWITCHES:
+            values[name] = cm.getboolean(section, key, fallback=default)
+
+        values['delay'] = cm.getfloat('forwarding', 'forward_delay', fallback=1.0)
+        values['max_retries'] = cm.getint('forwarding', 'max_retries', fallback=3)
+        values['forward_mode'] = cm.get('forwarding', 'forward_mode', fallback='forward').strip().lower()
+        values['config_reload_interval'] = cm.getfloat('forwarding', 'config_reload_interval', fallback=1.0)
+        values['max_concurrent_targets'] = cm.getint('forwarding', 'max_concurrent_targets', fallback=10)
+        values['per_target_concurrency'] = cm.getint('forwarding', 'per_target_concurrency', fallback=1)
+        values['album_window'] = cm.getfloat('forwarding', 'album_window', fallback=0.8)
+        values['forward_batch_window'] = cm.getfloat('forwarding', 'forward_batch_window', fallback=0.1)
+        values['content_dedup_window'] = cm.getfloat('forwarding', 'content_dedup_window', fallback=86400.0)
+        values['near_dedup_threshold'] = cm.getfloat('forwarding', 'near_dedup_threshold', fallback=0.9)
+        values['near_dedup_window'] = cm.getfloat('forwarding', 'near_dedup_window', fallback=86400.0)
+        values['queue_size'] = cm.getint('forwarding', 'queue_size', fallback=1000)
+        values['queue_workers'] = cm.getint('forwarding', 'queue_workers', fallback=4)
+        values['queue_policy'] = cm.get('forwarding', 'queue_policy', fallback='block').strip().lower()
+        
+        # Rates are floats, bursts are whole token counts
+        values['rate_limits'] = RateLimits(*(
+            cm.getfloat('rate_limits', key, fallback=default) if isinstance(default, float)
+            else cm.getint('rate_limits', key, fallback=default)
+            for _, key, default in RATE_LIMIT_KEYS
+        ))
+        values['pacing'] = PacingLimits(*(
+            cm.getfloat('pacing', key, fallback=default) for _, key, default in PACING_KEYS
+        ))
+
+        values['header_text'] = cm.get('forwarding', 'header_text', fallback='').strip()
+        values['footer_text'] = cm.get('forwarding', 'footer_text', fallback='').strip()
+
+        # Parse list-valued settings once
+        values['blacklist_words'] = split_words(cm.get('forwarding', 'blacklist_words', fallback=''))
+        values['whitelist_words'] = split_words(cm.get('forwarding', 'whitelist_words', fallback=''))
+        values['clean_words_list'] = split_words(cm.get('forwarding', 'clean_words_list', fallback=''))
+        values['replacements'] = parse_replacements(cm.get('text_replacer', 'replacements', fallback=''))
+
+        # Compile word lists into single-pass matchers
+        whole_words = values['match_whole_words']
+        values['blacklist_matcher'] = KeywordMatcher(values['blacklist_words'], whole_words=whole_words)
+        values['whitelist_matcher'] = KeywordMatcher(values['whitelist_words'], whole_words=whole_words)
+        values['text_replacer'] = TextReplacer(values['replacements'])
+
+        # Cleaning rules fused into one engine per config revision
+        values['text_cleaner'] = TextCleaner(
+            clean_links=values['clean_links'],
+            clean_hashtags=values['clean_hashtags'],
+            clean_formatting=values['clean_formatting'],
+            clean_empty_lines=values['clean_empty_lines'],
+            line_matcher=KeywordMatcher(values['clean_words_list']) if values['clean_lines_with_words'] else None
+        )
+
+        buttons = []
+        for i in range(1, 4):
+            button_text = cm.get('forwarding', f'button{i}_text', fallback='').strip()
+            button_url = cm.get('forwarding', f'button{i}_url', fallback='').strip()
+            if button_text and button_url:
+                buttons.append((button_text, button_url))
+        values['buttons'] = tuple(buttons)
+
+        # Content type filters as a tuple indexed by MessageKind
+        values['allow_table'] = build_allow_table(values)
+
+        cls._validate(values)
+        return cls(**values)
+
+    @staticmethod
+    def _validate(values: dict):
+        """Report invalid settings at load time rather than mid-forward"""
+        errors = []
+        if values['delay'] < 0:
+            errors.append(f"forward_delay must be >= 0 (got {values['delay']})")
+        if values['max_retries'] < 1:
+            errors.append(f"max_retries must be >= 1 (got {values['max_retries']})")
+        if values['forward_mode'] not in FORWARD_MODES:
+            errors.append(f"forward_mode must be one of {', '.join(FORWARD_MODES)} (got '{values['forward_mode']}')")
+        for name in ('album_window', 'forward_batch_window'):
+            if values[name] < 0:
+                errors.append(f"{name} must be >= 0 (got {values[name]})")
+        for name in ('content_dedup_window', 'near_dedup_window'):
+            if values[name] <= 0:
+                errors.append(f"{name} must be > 0 (got {values[name]})")
+        if not MIN_THRESHOLD <= values['near_dedup_threshold'] <= 1:
+            errors.append(f"near_dedup_threshold must be between {MIN_THRESHOLD} and 1 (got {values['near_dedup_threshold']})")
+        if values['config_reload_interval'] <= 0:
+            errors.append(f"config_reload_interval must be > 0 (got {values['config_reload_interval']})")
+        if values['queue_policy'] not in QUEUE_POLICIES:
+            errors.append(f"queue_policy must be one of {', '.join(QUEUE_POLICIES)} (got '{values['queue_policy']}')")
+        for name in ('max_concurrent_targets', 'per_target_concurrency', 'queue_size', 'queue_workers'):
+            if values[name] < 1:
+                errors.append(f"{name} must be >= 1 (got {values[name]})")
+        for (_, key, _), value in zip(RATE_LIMIT_KEYS, values['rate_limits']):
+            if value <= 0:
+                errors.append(f"rate_limits.{key} must be > 0 (got {value})")
+        pacing = values['pacing']
+        if pacing.min_delay < 0 or pacing.decrease_step < 0:
+            errors.append("pacing.min_delay and pacing.decrease_step must be >= 0")
+        if pacing.max_delay < pacing.min_delay:
+            errors.append(f"pacing.max_delay must be >= pacing.min_delay (got {pacing.max_delay} < {pacing.min_delay})")
+        if pacing.backoff_factor <= 1:
+            errors.append(f"pacing.backoff_factor must be > 1 (got {pacing.backoff_factor})")
+        for button_text, button_url in values['buttons']:
+            if not button_url.startswith(('http://', 'https://', 'tg://')):
+                errors.append(f"button '{button_text}' has an invalid URL: {button_url}")
+
+        if errors:
+            raise ValueError("Invalid forwarding options: " + "; ".join(errors))
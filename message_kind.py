@@ -0,0 +1,142 @@
+"""
+Message kind - classify a message once and reuse the result everywhere
+Filtering, copy mode, stats and logging all read the same MessageKind value
+"""
+
+from enum import IntEnum
+
+from telethon.tl.types import (
+    Document,
+    DocumentAttributeAnimated,
+    DocumentAttributeAudio,
+    DocumentAttributeSticker,
+    DocumentAttributeVideo,
+    MessageMediaContact,
+    MessageMediaDocument,
+    MessageMediaGame,
+    MessageMediaGeo,
+    MessageMediaGeoLive,
+    MessageMediaPhoto,
+    MessageMediaPoll,
+    MessageMediaVenue,
+    MessageMediaWebPage
+)
+
+LINK_MARKERS = ('http://', 'https://', 'www.', 't.me/')
+
+
+class MessageKind(IntEnum):
+    """Compact message type used as an index into the allow-table"""
+    EMPTY = 0
+    TEXT = 1
+    LINK = 2
+    PHOTO = 3
+    VIDEO = 4
+    GIF = 5
+    STICKER = 6
+    VOICE = 7
+    ROUND = 8
+    MUSIC = 9
+    AUDIO = 10
+    VIDEO_MESSAGE = 11
+    FILE = 12
+    CONTACT = 13
+    LOCATION = 14
+    POLL = 15
+    GAME = 16
+    OTHER = 17
+
+    @property
+    def has_media(self) -> bool:
+        """True if the message carries media that copy mode re-sends with send_file"""
+        return self not in (MessageKind.EMPTY, MessageKind.TEXT, MessageKind.LINK)
+
+
+# Which forward_* option(s) allow each kind; kinds not listed are always allowed
+KIND_FILTERS = {
+    MessageKind.TEXT: ('forward_text',),
+    MessageKind.LINK: ('forward_links',),
+    MessageKind.PHOTO: ('forward_photos',),
+    MessageKind.VIDEO: ('forward_videos',),
+    MessageKind.GIF: ('forward_gif', 'forward_gifs'),
+    MessageKind.STICKER: ('forward_stickers',),
+    MessageKind.VOICE: ('forward_voice',),
+    MessageKind.ROUND: ('forward_round',),
+    MessageKind.MUSIC: ('forward_music',),
+    MessageKind.AUDIO: ('forward_audio',),
+    MessageKind.VIDEO_MESSAGE: ('forward_video_messages',),
+    MessageKind.FILE: ('forward_files',),
+    MessageKind.CONTACT: ('forward_contacts',),
+    MessageKind.LOCATION: ('forward_locations',),
+    MessageKind.POLL: ('forward_polls',),
+    MessageKind.GAME: ('forward_games',),
+}
+
+
+def build_allow_table(values: dict) -> tuple:
+    """Precompute a tuple indexed by MessageKind -> allowed?"""
+    return tuple(
+        any(values[option] for option in KIND_FILTERS[kind]) if kind in KIND_FILTERS else True
+        for kind in MessageKind
+    )
+
+
+def has_link(text: str) -> bool:
+    lowered = text.lower()
+    return any(marker in lowered for marker in LINK_MARKERS)
+
+
+def _classify_document(document) -> MessageKind:
+    """Single pass over the document attributes"""
+    sticker = animated = False
+    video = audio = None
+    for attr in document.attributes:
+        if isinstance(attr, DocumentAttributeSticker):
+            sticker = True
+        elif isinstance(attr, DocumentAttributeAnimated):
+            animated = True
+        elif isinstance(attr, DocumentAttributeVideo):
+            video = attr
+        elif isinstance(attr, DocumentAttributeAudio):
+            audio = attr
+
+    if sticker:
+        return MessageKind.STICKER
+    if animated:
+        return MessageKind.GIF
+    if video is not None:
+        return MessageKind.ROUND if video.round_message else MessageKind.VIDEO
+    if audio is not None:
+        if audio.voice:
+            return MessageKind.VOICE
+        return MessageKind.MUSIC if (audio.title or audio.performer) else MessageKind.AUDIO
+    if (document.mime_type or '').startswith('video/'):
+        return MessageKind.VIDEO_MESSAGE
+    return MessageKind.FILE
+
+
+def classify_message(message) -> MessageKind:
+    """Compute the MessageKind of a Telethon message"""
+    media = message.media
+    text = message.message or ''
+
+    if media is None:
+        return MessageKind.TEXT if text else MessageKind.EMPTY
+    if isinstance(media, MessageMediaWebPage):
+        # Text with a link preview
+        return MessageKind.LINK
+    if isinstance(media, MessageMediaPhoto):
+        return MessageKind.PHOTO
+    if isinstance(media, MessageMediaDocument) and isinstance(media.document, Document):
+        return _classify_document(media.document)
+    if isinstance(media, MessageMediaContact):
+        return MessageKind.CONTACT
+    if isinstance(media, (MessageMediaGeo, MessageMediaGeoLive, MessageMediaVenue)):
+        return MessageKind.LOCATION
+    if isinstance(media, MessageMediaPoll):
+        return MessageKind.POLL
+    if isinstance(media, MessageMediaGame):
+        return MessageKind.GAME
+    if text and has_link(text):
+        return MessageKind.LINK
+    return MessageKind.OTHER
@@ -0,0 +1,77 @@
+"""
+Message transform cache - clean once, send to every target
+Copy-mode output (text, entities, buttons) is computed once per (message, config revision)
+"""
+
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class RenderedMessage:
+    """Immutable copy-mode payload shared by every target of one message"""
+
+    __slots__ = ('text', 'formatting_entities', 'buttons')
+
+    def __init__(self, text: str, formatting_entities: Optional[list] = None, buttons: Optional[list] = None):
+        object.__setattr__(self, 'text', text)
+        object.__setattr__(self, 'formatting_entities', formatting_entities)
+        object.__setattr__(self, 'buttons', buttons)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RenderedMessage is immutable")
+
+    def __repr__(self):
+        return (f"RenderedMessage(length={len(self.text)}, "
+                f"entities={len(self.formatting_entities or ())}, buttons={len(self.buttons or ())})")
+
+
+def transform_key(message, config_version: int) -> tuple:
+    """Cache key: the same message (and edit) under the same config revision renders identically"""
+    edit_date = getattr(message, 'edit_date', None)
+    return (
+        getattr(message, 'chat_id', None),
+        message.id,
+        edit_date.timestamp() if hasattr(edit_date, 'timestamp') else edit_date,
+        config_version,
+    )
+
+
+class TransformCache:
+    """Small LRU of RenderedMessage keyed by transform_key()"""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_render(self, message, config_version: int, render: Callable[[], RenderedMessage]) -> RenderedMessage:
+        """Return the cached payload, or call render() once and remember the result"""
+        key = transform_key(message, config_version)
+        rendered = self._entries.get(key)
+        if rendered is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return rendered
+
+        self.misses += 1
+        rendered = render()
+        self._entries[key] = rendered
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return rendered
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total * 100, 1) if total else 0.0,
+        }
@@ -14,6 +14,9 @@ import time
 from datetime import datetime
 from telethon import TelegramClient, events, Button
 from telethon.tl.types import User
+from config_channel import ConfigDelta, push_config_deltas
+from config_snapshot import ConfigSnapshot
+from utils import ConfigManager
 
 # استيراد نظام الإحصائيات
 try:
@@ -42,7 +45,8 @@ except ImportError:
                 'memory_usage': 0,
                 'memory_available': "غير متاح",
                 'recent_errors': [],
-                'error_count': 0
+                'error_count': 0,
+                'rate_limits': {}
             }
     
     stats_manager = SimpleStatsManager()
@@ -503,6 +507,12 @@ class ModernControlBot:
                 f"🧹 **روابط محذوفة:** {stats['links_cleaned']}\n"
                 f"🎬 **وسائط:** {stats['media_forwarded']} | 📝 **نصوص:** {stats['text_forwarded']}\n\n"
                 
+                f"{self._format_state_age(stats.get('state_age'), stats.get('state_stale'))}"
+                f"{self._format_rate_limits(stats.get('rate_limits') or {})}"
+                f"{self._format_queue(stats.get('queue') or {})}"
+                f"{self._format_floods(stats.get('floods') or {})}"
+                f"{self._format_pacing(stats.get('pacing') or {})}"
+                
                 f"⏰ **التحديث:** {datetime.now().strftime('%H:%M:%S')}"
             )
             
@@ -521,6 +531,75 @@ class ModernControlBot:
         except Exception as e:
             await event.edit(f"❌ خطأ في عرض الحالة: {e}")
             
+    def _format_state_age(self, age, stale):
+        """How old the limiter/queue/flood/pacing sections below are (the userbot saves them periodically)"""
+        if age is None:
+            return ""
+        if stale:
+            return f"⚠️ **بيانات الحالة قديمة:** آخر تحديث من اليوزربوت قبل {int(age)} ث (قد يكون متوقفاً)\n\n"
+        return f"🕒 **عمر بيانات الحالة:** {int(age)} ث\n\n"
+    
+    def _format_rate_limits(self, state):
+        """Rate limiter section of the status screen (empty if the userbot has not reported yet)"""
+        account = state.get('account')
+        if not account:
+            return ""
+        
+        lines = [
+            "🚦 **حدود الإرسال:**",
+            f"👤 **الحساب:** {account['tokens']}/{account['burst']} رصيد | {account['sent_last_minute']} رسالة/دقيقة",
+        ]
+        for target, budget in list(state.get('targets', {}).items())[:5]:
+            lines.append(
+                f"📤 `{target}`: 📝 {budget['text_tokens']} | 🎬 {budget['media_tokens']} | {budget['sent_last_minute']}/دقيقة"
+            )
+        lines.append(f"⏳ **مرات التأخير:** {state.get('throttled', 0)} ({state.get('waited_seconds', 0)} ث)")
+        return "\n".join(lines) + "\n\n"
+    
+    def _format_floods(self, state):
+        """FloodWait scheduler section of the status screen (empty if the userbot has not reported yet)"""
+        if 'targets' not in state:
+            return ""
+        
+        account = state.get('account', {})
+        lines = ["🛑 **انتظار الفيضان (FloodWait):**"]
+        if account.get('dormant_for'):
+            lines.append(f"👤 **الحساب متوقف:** {account['dormant_for']} ث")
+        for target, info in state['targets'].items():
+            if info['dormant_for'] > 0 or info['parked']:
+                lines.append(f"📤 `{target}`: ⏳ {info['dormant_for']} ث | 📦 مؤجلة {info['parked']} | آخر انتظار {info['last_wait']} ث")
+        lines.append(f"📊 **مرات الفيضان:** {state.get('floods', 0)} | ▶️ **استؤنفت:** {state.get('resumed', 0)}")
+        return "\n".join(lines) + "\n\n"
+    
+    def _format_pacing(self, state):
+        """Learned send delays section of the status screen (empty if the userbot has not reported yet)"""
+        if 'account_delay' not in state:
+            return ""
+        
+        min_delay, max_delay = state.get('bounds', [0, 0])
+        lines = [
+            "🐢 **سرعة الإرسال المتكيفة:**",
+            f"👤 **الحساب:** {state['account_delay']} ث بين الرسائل (الحدود {min_delay}-{max_delay} ث)",
+        ]
+        for target, delay in list(state.get('targets', {}).items())[:5]:
+            lines.append(f"📤 `{target}`: {delay} ث")
+        lines.append(f"📈 **مرات الإبطاء:** {state.get('backoffs', 0)}")
+        return "\n".join(lines) + "\n\n"
+    
+    def _format_queue(self, state):
+        """Work queue section of the status screen (empty if the userbot has not reported yet)"""
+        if 'depth' not in state:
+            return ""
+        
+        lines = [
+            "📬 **طابور العمل:**",
+            f"📥 **في الانتظار:** {state['depth']}/{state['maxsize']} (الأقصى {state['max_depth']}) | 💾 على القرص: {state['spill_backlog']}",
+            f"👷 **العمال:** {state['busy_workers']}/{state['workers']} مشغول | السياسة: `{state['policy']}`",
+            f"⏱️ **زمن الانتظار:** متوسط {state['avg_wait']} ث | أقصى {state['max_wait']} ث",
+            f"🗑 **محذوفة:** {state['dropped']} | 💾 **مُفرغة للقرص:** {state['spilled']} | ⏸ **انتظار المنتج:** {state['blocked']}",
+        ]
+        return "\n".join(lines) + "\n\n"
+    
     async def show_stats_dashboard(self, event):
         """Show comprehensive statistics dashboard"""
         try:
@@ -727,16 +806,11 @@ class ModernControlBot:
     async def update_config_section(self, section, key, value):
         """Update configuration in a specific section"""
         try:
-            config = configparser.ConfigParser()
-            config.read('config.ini')
-            
-            if not config.has_section(section):
-                config.add_section(section)
+            # Single-key write: one row in the config store, or an atomic INI replace
+            self._checked_config_manager([(section, key, value)]).persist(section, key, value)
             
-            config.set(section, key, value)
-            
-            with open('config.ini', 'w') as configfile:
-                config.write(configfile)
+            # Push the change to the running forwarder so it applies immediately
+            await push_config_deltas([ConfigDelta(section, key, value)])
                 
             self.logger.info(f"✅ تم تحديث الإعداد: {key} = {value} في قسم {section}")
             
@@ -1133,11 +1207,8 @@ class ModernControlBot:
     async def get_current_config(self):
         """Get current configuration with all media filters"""
         try:
-            config = configparser.ConfigParser()
-            config.read('config.ini')
-            
             # Return the full config object for easier access
-            return config
+            return ConfigManager('config.ini').config
         except Exception:
             # Return empty config if file doesn't exist
             empty_config = configparser.ConfigParser()
@@ -1478,34 +1549,44 @@ class ModernControlBot:
         except Exception as e:
             await event.answer(f"❌ خطأ في تحديث الفلتر: {str(e)}", alert=True)
 
-    async def update_config(self, key, value):
-        """Update configuration file"""
-        config = configparser.ConfigParser()
-        config.read('config.ini')
-        
-        # Ensure both sections exist
-        if not config.has_section('forwarding'):
-            config.add_section('forwarding')
-        if not config.has_section('text_replacer'):
-            config.add_section('text_replacer')
-        
-        # Update in text_replacer section (primary location)
-        config.set('text_replacer', key, value)
+    def _checked_config_manager(self, items):
+        """ConfigManager to persist items with; raises ValueError (nothing written) if they break a valid config
         
-        # Also update in forwarding section for compatibility
-        config.set('forwarding', key, value)
+        The userbot rejects such a push anyway, but the value would already be saved and
+        break its next restart. A config that is not valid yet (first setup) is not checked.
+        """
+        config_manager = ConfigManager('config.ini')
+        try:
+            ConfigSnapshot.from_config(config_manager)
+        except ValueError:
+            return config_manager
         
-        with open('config.ini', 'w') as configfile:
-            config.write(configfile)
+        for section, key, value in items:
+            config_manager.set(section, key, value)
+        try:
+            ConfigSnapshot.from_config(config_manager)
+        except ValueError as e:
+            self.logger.warning(f"⛔ رُفض تغيير الإعدادات ({', '.join(f'{s}.{k}' for s, k, _ in items)}): {e}")
+            raise ValueError(f"لم يُحفظ التغيير لأنه يجعل الإعدادات غير صالحة: {e}") from e
+        return config_manager
+    
+    async def update_config(self, key, value):
+        """Update configuration (config store or config.ini)"""
+        # Update in text_replacer section (primary location) and in forwarding
+        # section for compatibility, in a single transaction
+        items = [('text_replacer', key, value), ('forwarding', key, value)]
+        revision = self._checked_config_manager(items).persist_many(items)
+        
+        # Push the change to the running forwarder so it applies immediately
+        version = await push_config_deltas([
+            ConfigDelta('text_replacer', key, value),
+            ConfigDelta('forwarding', key, value)
+        ])
+        if version is not None:
+            self.logger.info(f"📡 الإعداد {key} طُبق فوراً على البوت (rev {version})")
         
         # Log the update for verification
-        print(f"✅ تم تحديث الإعداد: {key} = {value}")
-        
-        # Verify the setting was saved in text_replacer section
-        verification_config = configparser.ConfigParser()
-        verification_config.read('config.ini')
-        saved_value = verification_config.get('text_replacer', key, fallback='NOT_FOUND')
-        print(f"🔍 التحقق من الحفظ: {key} = {saved_value}")
+        print(f"✅ تم تحديث الإعداد: {key} = {value} (rev {revision})")
     
     # === القائمة السوداء والبيضاء ===
     
@@ -0,0 +1,279 @@
+"""
+Near dedup - skip reposts of the same text with small edits (an emoji, a link, a signature)
+A 64-bit SimHash over the word pairs of the cleaned text is looked up in a banded LSH
+index: four 16-bit bands, each probed with every bucket within the per-band share of the allowed
+Hamming distance, so any earlier post above the similarity threshold is found without a scan.
+Signatures live in a fixed-size ring over a sliding time window, so memory is bounded
+"""
+
+import base64
+import hashlib
+import itertools
+import logging
+import os
+import re
+import time
+from array import array
+from typing import Callable, Iterable, Optional
+
+from utils import JsonState
+
+DEFAULT_NEAR_DEDUP_PATH = os.getenv('USERBOT_NEAR_DEDUP_STATE', 'near_dedup.json')
+
+# Signatures kept at most (the oldest is dropped first)
+DEFAULT_CAPACITY = 100000
+
+# Texts with fewer words are too short for a meaningful similarity
+MIN_WORDS = 6
+
+# Lowest accepted similarity threshold (keeps the number of probed buckets small)
+MIN_THRESHOLD = 0.8
+
+# Scope of forgotten entries: never equal to a route's scope_hash, so lookups skip them
+_FORGOTTEN = -2 ** 63
+
+# State is written at most this often (and on shutdown)
+SAVE_INTERVAL = 60.0
+
+_BITS = 64
+_BANDS = 4
+_BAND_BITS = _BITS // _BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+# Feature hashes are concatenated into one big integer; bit i of every hash is counted at once
+# by masking with bit i repeated every 64 bits. Longer texts only use their first word pairs
+_MAX_FEATURES = 1024
+_BIT_MASKS = [int.from_bytes((1 << bit).to_bytes(8, 'little') * _MAX_FEATURES, 'little') for bit in range(_BITS)]
+
+_URL_RE = re.compile(r'(?:https?://|www\.|t\.me/)\S+|@\w+', re.IGNORECASE)
+_WORD_RE = re.compile(r'\w+')
+
+
+def text_features(text: str) -> list:
+    """Adjacent word pairs, lower-cased, without links, mentions, emoji and punctuation"""
+    words = _WORD_RE.findall(_URL_RE.sub(' ', text).casefold())
+    if len(words) < MIN_WORDS:
+        return []
+    return [f"{a} {b}" for a, b in zip(words[:_MAX_FEATURES], words[1:_MAX_FEATURES + 1])]
+
+
+def simhash(features: list) -> int:
+    """64-bit SimHash: bit i is set when most feature hashes have bit i set"""
+    blake2b = hashlib.blake2b
+    hashes = int.from_bytes(b''.join([blake2b(feature.encode('utf-8'), digest_size=8).digest()
+                                      for feature in features[:_MAX_FEATURES]]), 'little')
+    majority = min(len(features), _MAX_FEATURES)
+    signature = 0
+    for bit, mask in enumerate(_BIT_MASKS):
+        if (hashes & mask).bit_count() * 2 > majority:
+            signature |= 1 << bit
+    return signature
+
+
+def scope_hash(scope: str) -> int:
+    """Stable signed 64-bit id of a scope (route name); 0 for the unscoped index"""
+    if not scope:
+        return 0
+    return int.from_bytes(hashlib.blake2b(scope.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def _probe_masks(radius: int) -> list:
+    """All 16-bit masks with at most radius bits set"""
+    masks = [0]
+    for flipped in range(1, radius + 1):
+        for bits in itertools.combinations(range(_BAND_BITS), flipped):
+            masks.append(sum(1 << bit for bit in bits))
+    return masks
+
+
+class NearDedup:
+    """Time-windowed SimHash index with banded multi-probe lookups"""
+
+    def __init__(self, threshold: float = 0.9, window: float = 86400.0, capacity: int = DEFAULT_CAPACITY,
+                 path: str = DEFAULT_NEAR_DEDUP_PATH, clock: Callable[[], float] = time.time):
+        self.window = window
+        self.capacity = capacity
+        self.clock = clock
+        self.state = JsonState(path, 'near dedup state', SAVE_INTERVAL, clock=clock)
+        self.logger = logging.getLogger(__name__)
+        # Ring of live entries: sequence numbers _oldest.._next-1 are stored at seq % capacity
+        self._signatures = array('Q', bytes(8 * capacity))
+        self._times = array('d', bytes(8 * capacity))
+        self._keys = array('q', bytes(8 * capacity))
+        self._scopes = array('q', bytes(8 * capacity))
+        self._oldest = 0
+        self._next = 0
+        # One dict per band: band value -> sequence numbers (ascending; stale ones pruned lazily)
+        self._buckets = [{} for _ in range(_BANDS)]
+        self.duplicates = 0
+        self.checked = 0
+        self.configure(threshold, window)
+
+    def configure(self, threshold: float, window: float):
+        """Apply a new threshold/window; indexed signatures are kept"""
+        self.threshold = threshold
+        self.window = window
+        self.max_distance = int((1 - threshold) * _BITS + 1e-9)
+        # Pigeonhole: within max_distance, some band differs in at most max_distance // _BANDS bits
+        self._masks = _probe_masks(self.max_distance // _BANDS)
+
+    def __len__(self):
+        return self._next - self._oldest
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        times = self._times
+        while self._oldest < self._next and times[self._oldest % self.capacity] < cutoff:
+            self._oldest += 1
+
+    def find(self, signature: int, key_hash: Optional[int] = None, scope: int = 0) -> Optional[int]:
+        """Sequence number of an earlier live entry of scope within max_distance, ignoring entries of key_hash"""
+        oldest = self._oldest
+        capacity = self.capacity
+        signatures = self._signatures
+        keys = self._keys
+        scopes = self._scopes
+        max_distance = self.max_distance
+        seen = set()
+        for band, buckets in enumerate(self._buckets):
+            value = signature >> (band * _BAND_BITS) & _BAND_MASK
+            for mask in self._masks:
+                bucket = buckets.get(value ^ mask)
+                if not bucket:
+                    continue
+                for seq in reversed(bucket):
+                    if seq < oldest:
+                        break
+                    if seq in seen:
+                        continue
+                    seen.add(seq)
+                    slot = seq % capacity
+                    if ((signatures[slot] ^ signature).bit_count() <= max_distance and keys[slot] != key_hash
+                            and scopes[slot] == scope):
+                        return seq
+        return None
+
+    def _add(self, signature: int, key_hash: int, now: float, scope: int = 0):
+        if self._next - self._oldest >= self.capacity:
+            self._oldest += 1
+        seq = self._next
+        self._next += 1
+        slot = seq % self.capacity
+        self._signatures[slot] = signature
+        self._times[slot] = now
+        self._keys[slot] = key_hash
+        self._scopes[slot] = scope
+        oldest = self._oldest
+        for band, buckets in enumerate(self._buckets):
+            value = signature >> (band * _BAND_BITS) & _BAND_MASK
+            bucket = buckets.get(value)
+            if bucket is None:
+                buckets[value] = [seq]
+                continue
+            if bucket[0] < oldest:
+                del bucket[:next((i for i, s in enumerate(bucket) if s >= oldest), len(bucket))]
+            bucket.append(seq)
+        if seq % self.capacity == 0 and seq:
+            self._compact()
+
+    def _compact(self):
+        """Drop stale sequence numbers from buckets that are no longer being appended to"""
+        oldest = self._oldest
+        for buckets in self._buckets:
+            for value in list(buckets):
+                live = [seq for seq in buckets[value] if seq >= oldest]
+                if live:
+                    buckets[value] = live
+                else:
+                    del buckets[value]
+
+    def is_duplicate(self, text: str, keys: Iterable[tuple], scope: str = '') -> bool:
+        """True if a near-identical text from a different message was seen within the window
+
+        keys are the (chat_id, message_id) pairs of the message (or album parts) being checked;
+        only texts seen in the same scope (route) count.
+        """
+        features = text_features(text or '')
+        if not features:
+            return False
+        signature = simhash(features)
+        key_hash = hash(min(keys))
+        scope = scope_hash(scope)
+        now = self.clock()
+        self._expire(now)
+        self.checked += 1
+        if self.find(signature, key_hash, scope) is not None:
+            self.duplicates += 1
+            return True
+        self._add(signature, key_hash, now, scope)
+        if self.state.changed():
+            self.save()
+        return False
+
+    def forget(self, keys: Iterable[tuple], scope: str = ''):
+        """Retire the signature recorded for this message (none of its deliveries went out)"""
+        key_hash = hash(min(keys))
+        scope = scope_hash(scope)
+        # Recorded moments ago, so the newest entries are searched first
+        for seq in range(self._next - 1, self._oldest - 1, -1):
+            slot = seq % self.capacity
+            if self._keys[slot] == key_hash and self._scopes[slot] == scope:
+                self._scopes[slot] = _FORGOTTEN
+                if self.state.changed():
+                    self.save()
+                return
+
+    def _live(self, column: array) -> array:
+        return array(column.typecode, (column[seq % self.capacity] for seq in range(self._oldest, self._next)))
+
+    def load(self):
+        """Restore signatures saved by an earlier run"""
+        data = self.state.load()
+        if data is None:
+            return
+        try:
+            columns = []
+            for name, typecode in (('signatures', 'Q'), ('times', 'd'), ('keys', 'q')):
+                column = array(typecode)
+                column.frombytes(base64.b64decode(data[name]))
+                columns.append(column)
+            # State saved before routes had their own scope is unscoped
+            scopes = array('q')
+            scopes.frombytes(base64.b64decode(data['scopes']) if 'scopes' in data else bytes(8 * len(columns[0])))
+            columns.append(scopes)
+            if len(set(map(len, columns))) != 1:
+                raise ValueError("column lengths differ")
+        except (KeyError, TypeError, ValueError) as e:
+            self.logger.warning(f"Ignoring invalid near dedup state: {e}")
+            return
+        for signature, seen_at, key_hash, scope in zip(*columns):
+            self._add(signature, key_hash, seen_at, scope)
+        self._expire(self.clock())
+        self.logger.info(f"🪞 Restored near dedup index ({len(self)} recent signatures)")
+
+    def save(self):
+        """Persist the live signatures atomically"""
+        data = {
+            name: base64.b64encode(self._live(column).tobytes()).decode('ascii')
+            for name, column in (('signatures', self._signatures), ('times', self._times), ('keys', self._keys),
+                                 ('scopes', self._scopes))
+        }
+        self.state.save(data)
+
+    def close(self):
+        if self.state.dirty:
+            self.save()
+
+    def get_stats(self) -> dict:
+        return {
+            'checked': self.checked,
+            'duplicates': self.duplicates,
+            'signatures': len(self),
+            'threshold': self.threshold,
+            'max_distance': self.max_distance,
+        }
+
+    def summary(self) -> str:
+        stats = self.get_stats()
+        return (f"{stats['duplicates']}/{stats['checked']} near-duplicates skipped, "
+                f"{stats['signatures']} recent signatures (≥{stats['threshold']:.0%} similar)")
@@ -0,0 +1,232 @@
+"""
+Outbox - durable record of every message that still has to reach a target
+Messages are committed (one row per target) before anything is sent and acknowledged per
+target afterwards, so a restart replays exactly the unacknowledged deliveries (at-least-once).
+Writes from concurrent callers share one SQLite transaction (group commit), so the fsync
+per commit does not cap throughput
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
+
+DEFAULT_OUTBOX_PATH = os.getenv('USERBOT_OUTBOX', 'outbox.db')
+
+# Acknowledged rows are kept this long so a late duplicate is still recognised
+RETENTION_SECONDS = 3 * 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deliveries (
+    chat_id    INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    target     TEXT    NOT NULL,
+    status     TEXT    NOT NULL DEFAULT 'pending',
+    created    REAL    NOT NULL,
+    updated    REAL    NOT NULL,
+    PRIMARY KEY (chat_id, message_id, target)
+);
+CREATE INDEX IF NOT EXISTS deliveries_status ON deliveries (status);
+CREATE TABLE IF NOT EXISTS sources (
+    chat_id INTEGER PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+"""
+
+
+class Outbox:
+    """SQLite-backed per-target delivery log with group commit"""
+
+    def __init__(self, path: str = DEFAULT_OUTBOX_PATH, commit_interval: float = 0.01, max_batch: int = 500):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self.logger = logging.getLogger(__name__)
+        # One thread owns the connection; commits never block the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='outbox')
+        self._db = None
+        self._ops = []
+        self._wakeup = None
+        self._flusher = None
+        self._pending = {}
+        self.last_seen = {}
+        self.commits = 0
+        self.writes = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    # --- database thread -------------------------------------------------
+
+    def _open(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=FULL")
+        db.executescript(_SCHEMA)
+        db.execute("DELETE FROM deliveries WHERE status != 'pending' AND updated < ?",
+                   (time.time() - RETENTION_SECONDS,))
+        db.commit()
+        pending = {}
+        for chat_id, message_id, target in db.execute(
+                "SELECT chat_id, message_id, target FROM deliveries WHERE status = 'pending' ORDER BY chat_id, message_id"):
+            pending.setdefault((chat_id, message_id), set()).add(target)
+        last_seen = dict(db.execute("SELECT chat_id, last_id FROM sources"))
+        self._db = db
+        return pending, last_seen
+
+    def _commit(self, ops) -> list:
+        results = []
+        now = time.time()
+        with self._db:
+            for op, args in ops:
+                if op == 'record':
+                    chat_id, message_id, targets = args
+                    known = self._db.execute(
+                        "SELECT 1 FROM deliveries WHERE chat_id = ? AND message_id = ? LIMIT 1",
+                        (chat_id, message_id)).fetchone()
+                    if not known:
+                        self._db.executemany(
+                            "INSERT OR IGNORE INTO deliveries (chat_id, message_id, target, created, updated) VALUES (?, ?, ?, ?, ?)",
+                            [(chat_id, message_id, target, now, now) for target in targets])
+                        self._db.execute(
+                            "INSERT INTO sources (chat_id, last_id) VALUES (?, ?) "
+                            "ON CONFLICT(chat_id) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)",
+                            (chat_id, message_id))
+                    results.append(not known)
+                else:
+                    chat_id, message_id, target, status = args
+                    self._db.execute(
+                        "UPDATE deliveries SET status = ?, updated = ? WHERE chat_id = ? AND message_id = ? AND target = ?",
+                        (status, now, chat_id, message_id, target))
+                    results.append(None)
+        return results
+
+    # --- event loop ------------------------------------------------------
+
+    async def open(self):
+        """Open the database and load unacknowledged deliveries; returns them as {(chat_id, message_id): targets}"""
+        loop = asyncio.get_running_loop()
+        self._pending, self.last_seen = await loop.run_in_executor(self._executor, self._open)
+        self._wakeup = asyncio.Event()
+        self._flusher = loop.create_task(self._flush_loop())
+        if self._pending:
+            self.logger.info(f"📮 Outbox has {len(self._pending)} messages awaiting delivery")
+        return {key: set(targets) for key, targets in self._pending.items()}
+
+    def _submit(self, op, args, future=None):
+        self._ops.append((op, args, future))
+        self._wakeup.set()
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            # Let concurrent writers join this transaction
+            if self.commit_interval > 0 and len(self._ops) < self.max_batch:
+                await asyncio.sleep(self.commit_interval)
+            self._wakeup.clear()
+            ops, self._ops = self._ops[:self.max_batch], self._ops[self.max_batch:]
+            if self._ops:
+                self._wakeup.set()
+            if not ops:
+                continue
+
+            try:
+                results = await loop.run_in_executor(self._executor, self._commit, [(op, args) for op, args, _ in ops])
+            except Exception as e:
+                self.logger.error(f"Outbox commit of {len(ops)} writes failed: {e}")
+                for _, _, future in ops:
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.commits += 1
+            self.writes += len(ops)
+            for (_, _, future), result in zip(ops, results):
+                if future is not None and not future.done():
+                    future.set_result(result)
+
+    async def record(self, message, targets: Iterable[str]) -> bool:
+        """Durably record a message for every target before it is sent
+
+        Returns False if the message was recorded before (a duplicate, e.g. after a restart).
+        """
+        targets = tuple(targets)
+        future = asyncio.get_running_loop().create_future()
+        self._submit('record', (message.chat_id, message.id, targets), future)
+        if not await future:
+            return False
+        self._pending[(message.chat_id, message.id)] = set(targets)
+        self.last_seen[message.chat_id] = max(message.id, self.last_seen.get(message.chat_id, 0))
+        return True
+
+    def ack(self, message, target: str, status: str = 'done'):
+        """Mark one target delivered (or given up on); written with the next group commit"""
+        key = (message.chat_id, message.id)
+        targets = self._pending.get(key)
+        if targets is None or target not in targets:
+            return
+        targets.discard(target)
+        if not targets:
+            del self._pending[key]
+        self._submit('ack', (key[0], key[1], target, status))
+
+    def complete(self, message, status: str = 'skipped'):
+        """Acknowledge every remaining target of a message (filtered out, own message, ...)"""
+        self.discard(message.chat_id, message.id, status)
+
+    def discard(self, chat_id: int, message_id: int, status: str):
+        """Acknowledge every remaining target by message key (e.g. the message no longer exists)"""
+        for target in self._pending.pop((chat_id, message_id), ()):
+            self._submit('ack', (chat_id, message_id, target, status))
+
+    def is_pending(self, message) -> bool:
+        """True while some target of the message is unacknowledged"""
+        return (message.chat_id, message.id) in self._pending
+
+    def pending_targets(self, message, targets: Iterable[str]) -> list:
+        """The configured targets this message still has to reach
+
+        Targets that were recorded but are no longer configured are given up on. A message
+        without an entry was fully acknowledged already (e.g. a second copy after a replay).
+        """
+        pending = self._pending.get((message.chat_id, message.id))
+        if pending is None:
+            return []
+        targets = list(targets)
+        for target in pending - set(targets):
+            self.ack(message, target, 'dropped')
+        return [target for target in targets if target in pending]
+
+    async def close(self):
+        """Commit outstanding acknowledgements and close the database"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        loop = asyncio.get_running_loop()
+        if self._ops and self._db is not None:
+            ops, self._ops = self._ops, []
+            try:
+                await loop.run_in_executor(self._executor, self._commit, [(op, args) for op, args, _ in ops])
+            except Exception as e:
+                self.logger.error(f"Outbox final commit failed: {e}")
+        if self._db is not None:
+            await loop.run_in_executor(self._executor, self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=False)
+
+    def get_stats(self) -> dict:
+        return {
+            'pending': len(self._pending),
+            'commits': self.commits,
+            'writes': self.writes,
+            'avg_group': round(self.writes / self.commits, 1) if self.commits else 0.0,
+        }
+
+    def summary(self) -> str:
+        stats = self.get_stats()
+        return f"{stats['pending']} pending, {stats['commits']} commits (avg {stats['avg_group']} writes each)"
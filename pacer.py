@@ -0,0 +1,172 @@
+"""
+Pacer - adaptive send spacing per target and for the account (AIMD)
+Every successful send shortens the delay by a fixed step; a FloodWait multiplies it, all within
+the configured bounds. The delay that tripped a FloodWait (plus a margin) becomes a floor that
+only decays slowly, so pacing settles just under Telegram's real flood ceiling instead of
+repeatedly probing into it. Learned delays are persisted so a restart does not start from scratch
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import namedtuple
+from typing import Callable, Optional
+
+from utils import JsonState
+
+DEFAULT_PACING_PATH = os.getenv('USERBOT_PACING_STATE', 'pacing_state.json')
+
+# Bounds and steps as configured in the [pacing] section
+PacingLimits = namedtuple('PacingLimits', 'min_delay max_delay decrease_step backoff_factor')
+
+# (field, config key, default)
+PACING_KEYS = (
+    ('min_delay', 'min_delay', 0.05),
+    ('max_delay', 'max_delay', 30.0),
+    ('decrease_step', 'decrease_step', 0.02),
+    ('backoff_factor', 'backoff_factor', 2.0),
+)
+
+DEFAULT_PACING = PacingLimits(*(default for _, _, default in PACING_KEYS))
+
+# Safety margin above the delay that last tripped a FloodWait
+FLOOR_MARGIN = 0.1
+
+# Per successful send, the floor shrinks by this fraction so a raised ceiling is found again
+FLOOR_DECAY = 0.0002
+
+# Learned delays are written at most this often (and on shutdown)
+SAVE_INTERVAL = 30.0
+
+
+class _Pace:
+    __slots__ = ('delay', 'floor', 'next_send')
+
+    def __init__(self, delay: float, floor: float = 0.0):
+        self.delay = delay
+        self.floor = floor
+        self.next_send = 0.0
+
+
+class Pacer:
+    """AIMD-controlled minimum spacing between sends, per target and for the whole account"""
+
+    def __init__(self, initial_delay: float = 1.0, limits: PacingLimits = DEFAULT_PACING,
+                 state_path: str = DEFAULT_PACING_PATH, clock: Callable[[], float] = time.monotonic):
+        self.limits = limits
+        self.initial_delay = self._clamp(initial_delay)
+        self.clock = clock
+        self.state = JsonState(state_path, 'pacing state', SAVE_INTERVAL, indent=2, clock=clock)
+        self.account_id = None
+        self.logger = logging.getLogger(__name__)
+        # The account starts unthrottled; it only slows down after an account-wide FloodWait
+        self.account = _Pace(limits.min_delay)
+        self.targets = {}
+        self.backoffs = 0
+
+    def _clamp(self, delay: float) -> float:
+        return min(self.limits.max_delay, max(self.limits.min_delay, delay))
+
+    def configure(self, initial_delay: float, limits: PacingLimits):
+        """Apply new bounds; learned delays are kept, clamped into them"""
+        self.limits = limits
+        self.initial_delay = self._clamp(initial_delay)
+        for pace in (self.account, *self.targets.values()):
+            pace.delay = self._clamp(pace.delay)
+
+    def _pace(self, target) -> _Pace:
+        pace = self.targets.get(target)
+        if pace is None:
+            pace = self.targets[target] = _Pace(self.initial_delay)
+        return pace
+
+    def reserve(self, target) -> float:
+        """Claim the next send slot for target; returns the seconds to wait (never blocks)"""
+        now = self.clock()
+        pace = self._pace(target)
+        # The account spaces reservations, not target slots, so a backed-up target never delays the others
+        account_slot = max(now, self.account.next_send)
+        slot = max(account_slot, pace.next_send)
+        pace.next_send = slot + pace.delay
+        self.account.next_send = account_slot + self.account.delay
+        return slot - now
+
+    async def wait(self, target) -> float:
+        """Wait for target's (and the account's) next send slot"""
+        wait = self.reserve(target)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def on_success(self, target):
+        """Additive decrease: a send went through, probe a little faster (but not below the floor)"""
+        step = self.limits.decrease_step
+        for pace in (self._pace(target), self.account):
+            pace.floor *= 1 - FLOOR_DECAY
+            pace.delay = max(self.limits.min_delay, pace.floor, pace.delay - step)
+        if self.state.changed():
+            self.save()
+
+    def on_flood(self, target, account: bool = False):
+        """Multiplicative increase: Telegram pushed back on target (or the whole account)"""
+        pace = self.account if account else self._pace(target)
+        before = pace.delay
+        pace.floor = self._clamp(before * (1 + FLOOR_MARGIN))
+        pace.delay = self._clamp(pace.delay * self.limits.backoff_factor)
+        self.backoffs += 1
+        self.logger.info(f"🐢 Pacing for {'account' if account else target}: {before:.2f}s -> {pace.delay:.2f}s")
+        self.save()
+
+    def delay_for(self, target) -> float:
+        return max(self._pace(target).delay, self.account.delay)
+
+    def load(self, account_id: Optional[int] = None):
+        """Restore learned delays; state saved by another account is ignored"""
+        self.account_id = account_id
+        data = self.state.load()
+        if data is None:
+            return
+        if account_id is not None and data.get('account_id') != account_id:
+            return
+        try:
+            for pace, saved in [(self.account, data.get('account'))] + [
+                    (self._pace(target), saved) for target, saved in data.get('targets', {}).items()]:
+                if saved is not None:
+                    pace.delay = self._clamp(float(saved['delay']))
+                    pace.floor = float(saved.get('floor', 0.0))
+        except (KeyError, TypeError, ValueError) as e:
+            self.logger.warning(f"Ignoring invalid pacing state: {e}")
+            return
+        self.logger.info(f"🐢 Restored pacing for {len(self.targets)} targets (account {self.account.delay:.2f}s)")
+
+    def save(self):
+        """Persist learned delays atomically"""
+        data = {
+            'account_id': self.account_id,
+            'account': self._dump(self.account),
+            'targets': {str(target): self._dump(pace) for target, pace in self.targets.items()},
+        }
+        self.state.save(data)
+
+    @staticmethod
+    def _dump(pace: _Pace) -> dict:
+        return {'delay': round(pace.delay, 3), 'floor': round(pace.floor, 3)}
+
+    def close(self):
+        if self.state.dirty:
+            self.save()
+
+    def get_state(self) -> dict:
+        """Learned delay for the account and each target, with the bounds and backoff count"""
+        return {
+            'account_delay': round(self.account.delay, 3),
+            'targets': {str(target): round(pace.delay, 3) for target, pace in self.targets.items()},
+            'bounds': [self.limits.min_delay, self.limits.max_delay],
+            'backoffs': self.backoffs,
+        }
+
+    def summary(self) -> str:
+        state = self.get_state()
+        targets = ", ".join(f"{target} {delay}s" for target, delay in list(state['targets'].items())[:5])
+        return f"account {state['account_delay']}s; {targets or 'no targets yet'}; {state['backoffs']} backoffs"
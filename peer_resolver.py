@@ -0,0 +1,121 @@
+"""
+Peer resolver - configured chat strings resolved to InputPeers once
+Kept in memory and persisted across restarts; refreshed only when Telegram rejects a peer
+"""
+
+import logging
+import os
+from typing import Iterable, Optional
+
+from telethon import utils as telethon_utils
+from telethon.tl.types import InputPeerChannel, InputPeerChat, InputPeerSelf, InputPeerUser
+
+from utils import JsonState
+
+DEFAULT_CACHE_PATH = os.getenv('USERBOT_PEER_CACHE', 'peer_cache.json')
+
+_PEER_TYPES = {cls.__name__: cls for cls in (InputPeerChannel, InputPeerChat, InputPeerUser, InputPeerSelf)}
+
+
+def peer_from_dict(data: dict):
+    fields = dict(data)
+    cls = _PEER_TYPES[fields.pop('_')]
+    return cls(**fields)
+
+
+def chat_candidates(chat: str) -> list:
+    """Ways a configured chat string may identify a peer: marked id, bare id, username/link"""
+    candidates = []
+    try:
+        candidates.append(int(chat))
+        if chat.startswith('-100'):
+            candidates.append(int(chat[4:]))
+    except ValueError:
+        pass
+    candidates.append(chat)
+    return candidates
+
+
+class PeerResolver:
+    """Resolve chat strings to InputPeers once, keep them in memory and in a JSON cache file"""
+
+    def __init__(self, client, cache_path: str = DEFAULT_CACHE_PATH):
+        self.client = client
+        self.state = JsonState(cache_path, 'peer cache', indent=2)
+        self.account_id = None
+        self.logger = logging.getLogger(__name__)
+        self._peers = {}
+        self.resolved = 0
+        self.refreshed = 0
+
+    def __len__(self):
+        return len(self._peers)
+
+    def load(self, account_id: Optional[int] = None):
+        """Load the persisted cache; entries saved by another account are discarded (access hashes differ)"""
+        self.account_id = account_id
+        data = self.state.load()
+        if data is None:
+            return
+        if account_id is not None and data.get('account_id') != account_id:
+            self.logger.info("Peer cache belongs to another account, starting fresh")
+            return
+        for chat, peer in data.get('peers', {}).items():
+            try:
+                self._peers[chat] = peer_from_dict(peer)
+            except (KeyError, TypeError):
+                continue
+        self.logger.info(f"📇 Loaded {len(self._peers)} cached peers")
+
+    def save(self):
+        """Persist the cache atomically"""
+        data = {
+            'account_id': self.account_id,
+            'peers': {chat: peer.to_dict() for chat, peer in self._peers.items()},
+        }
+        self.state.save(data)
+
+    async def resolve(self, chat: str, refresh: bool = False):
+        """InputPeer for a configured chat string; only talks to Telegram on a cache miss or refresh"""
+        chat = str(chat).strip()
+        if not refresh:
+            peer = self._peers.get(chat)
+            if peer is not None:
+                return peer
+
+        last_error = None
+        for candidate in chat_candidates(chat):
+            try:
+                peer = await self.client.get_input_entity(candidate)
+            except (ValueError, TypeError) as e:
+                last_error = e
+                continue
+            self._peers[chat] = peer
+            self.resolved += 1
+            self.save()
+            self.logger.info(f"📇 Resolved {chat} -> {type(peer).__name__}")
+            return peer
+
+        raise ValueError(f"Could not resolve chat {chat}: {last_error}")
+
+    async def resolve_all(self, chats: Iterable[str], refresh: bool = False) -> dict:
+        """Resolve every chat (startup / config change); failures are logged, not raised"""
+        peers = {}
+        for chat in chats:
+            try:
+                peers[chat] = await self.resolve(chat, refresh=refresh)
+            except Exception as e:
+                self.logger.warning(f"Could not resolve {chat}: {e}")
+        return peers
+
+    def peer_id(self, chat: str) -> Optional[int]:
+        """Marked chat id (as in message.chat_id) of a resolved chat, or None if not resolved yet"""
+        peer = self._peers.get(str(chat).strip())
+        return telethon_utils.get_peer_id(peer) if peer is not None else None
+
+    def invalidate(self, chat: str):
+        """Forget a peer Telegram rejected, so the next send resolves it again"""
+        if self._peers.pop(str(chat), None) is not None:
+            self.refreshed += 1
+            self.save()
+            self.logger.info(f"📇 Peer for {chat} invalidated, will re-resolve")
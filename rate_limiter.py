@@ -0,0 +1,174 @@
+"""
+Rate limiter - token buckets per account and per target chat
+Text and media have separate per-target budgets; each send reserves its tokens up front,
+so a throttled target only delays its own delivery, never the update handler or other targets
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque, namedtuple
+from typing import Callable
+
+# Limits as configured in the [rate_limits] section
+RateLimits = namedtuple(
+    'RateLimits',
+    'account_per_second account_burst text_per_minute text_burst media_per_minute media_burst'
+)
+
+# (field, config key, default)
+RATE_LIMIT_KEYS = (
+    ('account_per_second', 'account_per_second', 5.0),
+    ('account_burst', 'account_burst', 20),
+    ('text_per_minute', 'target_text_per_minute', 30.0),
+    ('text_burst', 'target_text_burst', 10),
+    ('media_per_minute', 'target_media_per_minute', 15.0),
+    ('media_burst', 'target_media_burst', 5),
+)
+
+DEFAULT_RATE_LIMITS = RateLimits(*(default for _, _, default in RATE_LIMIT_KEYS))
+
+# Sliding window used for "sent in the last minute" accounting
+ACCOUNTING_WINDOW = 60.0
+
+
+class TokenBucket:
+    """Classic token bucket; reserve() may go negative so concurrent callers queue in order"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """Take one token; return how many seconds the caller must wait before using it"""
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def available(self, now: float) -> float:
+        self._refill(now)
+        return self.tokens
+
+    def configure(self, rate: float, capacity: float, now: float):
+        self._refill(now)
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = min(self.tokens, capacity)
+
+
+class SlidingWindowCounter:
+    """Number of events in the last `window` seconds"""
+
+    __slots__ = ('window', '_events')
+
+    def __init__(self, window: float = ACCOUNTING_WINDOW):
+        self.window = window
+        self._events = deque()
+
+    def add(self, now: float):
+        self._events.append(now)
+
+    def count(self, now: float) -> int:
+        events = self._events
+        cutoff = now - self.window
+        while events and events[0] <= cutoff:
+            events.popleft()
+        return len(events)
+
+
+class _TargetBudget:
+    __slots__ = ('text', 'media', 'sent')
+
+    def __init__(self, limits: RateLimits, now: float):
+        self.text = TokenBucket(limits.text_per_minute / 60.0, limits.text_burst, now)
+        self.media = TokenBucket(limits.media_per_minute / 60.0, limits.media_burst, now)
+        self.sent = SlidingWindowCounter()
+
+
+class TargetRateLimiter:
+    """Per-account and per-target (text/media) token buckets with sliding-window accounting"""
+
+    def __init__(self, limits: RateLimits = DEFAULT_RATE_LIMITS, clock: Callable[[], float] = time.monotonic):
+        self.logger = logging.getLogger(__name__)
+        self.clock = clock
+        self.limits = limits
+        now = clock()
+        self.account = TokenBucket(limits.account_per_second, limits.account_burst, now)
+        self.account_sent = SlidingWindowCounter()
+        self.targets = {}
+        self.throttled = 0
+        self.waited_seconds = 0.0
+
+    def configure(self, limits: RateLimits):
+        """Apply new limits to every bucket, keeping the tokens already spent"""
+        if limits == self.limits:
+            return
+        now = self.clock()
+        self.limits = limits
+        self.account.configure(limits.account_per_second, limits.account_burst, now)
+        for budget in self.targets.values():
+            budget.text.configure(limits.text_per_minute / 60.0, limits.text_burst, now)
+            budget.media.configure(limits.media_per_minute / 60.0, limits.media_burst, now)
+        self.logger.info(f"🚦 Rate limits updated: {limits}")
+
+    def _budget(self, target, now: float) -> _TargetBudget:
+        budget = self.targets.get(target)
+        if budget is None:
+            budget = self.targets[target] = _TargetBudget(self.limits, now)
+        return budget
+
+    def reserve(self, target, media: bool = False) -> float:
+        """Reserve one send to target; returns the seconds to wait (never blocks)"""
+        now = self.clock()
+        budget = self._budget(target, now)
+        bucket = budget.media if media else budget.text
+        return max(self.account.reserve(now), bucket.reserve(now))
+
+    async def acquire(self, target, media: bool = False) -> float:
+        """Wait for this target's (and the account's) budget, then count the send"""
+        wait = self.reserve(target, media)
+        if wait > 0:
+            self.throttled += 1
+            self.waited_seconds += wait
+            self.logger.info(f"🚦 Throttling {'media' if media else 'text'} to {target} for {wait:.2f}s")
+            await asyncio.sleep(wait)
+        now = self.clock()
+        self.account_sent.add(now)
+        self._budget(target, now).sent.add(now)
+        return wait
+
+    def get_state(self) -> dict:
+        """Tokens left and sends in the last minute, for the account and each target"""
+        now = self.clock()
+        return {
+            'account': {
+                'tokens': round(self.account.available(now), 1),
+                'burst': self.limits.account_burst,
+                'sent_last_minute': self.account_sent.count(now),
+            },
+            'targets': {
+                str(target): {
+                    'text_tokens': round(budget.text.available(now), 1),
+                    'media_tokens': round(budget.media.available(now), 1),
+                    'sent_last_minute': budget.sent.count(now),
+                }
+                for target, budget in self.targets.items()
+            },
+            'throttled': self.throttled,
+            'waited_seconds': round(self.waited_seconds, 1),
+        }
+
+    def summary(self) -> str:
+        state = self.get_state()
+        account = state['account']
+        return (f"account {account['tokens']}/{account['burst']} tokens, {account['sent_last_minute']} sent/min; "
+                f"throttled {state['throttled']}x ({state['waited_seconds']}s)")
@@ -12,6 +12,12 @@ from collections import defaultdict, deque
 import psutil
 import asyncio
 
+# How often the userbot writes its live state, so the control bot's view is never older than this
+SNAPSHOT_INTERVAL = 15.0
+
+# Saved state older than this means the userbot has stopped reporting
+STALE_AFTER = 3 * SNAPSHOT_INTERVAL
+
 class StatsManager:
     """Manager for bot statistics and performance monitoring"""
     
@@ -36,6 +42,24 @@ class StatsManager:
         self.media_forwarded = 0
         self.text_forwarded = 0
         
+        # نسخة الإعدادات النشطة
+        self.config_version = 0
+        
+        # محدد معدل الإرسال (يُربط من عملية اليوزربوت)
+        self.rate_limiter = None
+        
+        # طابور العمل (يُربط من عملية اليوزربوت)
+        self.work_queue = None
+        
+        # مجدول انتظار الفيضان (يُربط من عملية اليوزربوت)
+        self.flood_scheduler = None
+        
+        # منظم سرعة الإرسال (يُربط من عملية اليوزربوت)
+        self.pacer = None
+        
+        # حفظ دوري للحالة الحية
+        self._snapshot_task = None
+        
         # تحميل الإحصائيات المحفوظة
         self._load_stats()
         
@@ -70,14 +94,40 @@ class StatsManager:
                 'media_forwarded': self.media_forwarded,
                 'text_forwarded': self.text_forwarded,
                 'last_date': datetime.now().strftime('%Y-%m-%d'),
-                'last_updated': datetime.now().isoformat()
+                'last_updated': datetime.now().isoformat(),
+                'saved_at': time.time()
             }
+            if self.rate_limiter is not None:
+                data['rate_limits'] = self.rate_limiter.get_state()
+            if self.work_queue is not None:
+                data['queue'] = self.work_queue.get_state()
+            if self.flood_scheduler is not None:
+                data['floods'] = self.flood_scheduler.get_state()
+            if self.pacer is not None:
+                data['pacing'] = self.pacer.get_state()
             
             with open(self.stats_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
         except Exception as e:
             print(f"Error saving stats: {e}")
     
+    def start_snapshots(self, interval=SNAPSHOT_INTERVAL):
+        """Save the live state every interval seconds, also while no messages arrive (userbot only)"""
+        if self._snapshot_task is None or self._snapshot_task.done():
+            self._snapshot_task = asyncio.ensure_future(self._snapshot_loop(interval))
+    
+    def stop_snapshots(self):
+        """Stop the periodic saves after a final one"""
+        if self._snapshot_task and not self._snapshot_task.done():
+            self._snapshot_task.cancel()
+        self._snapshot_task = None
+        self._save_stats()
+    
+    async def _snapshot_loop(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            self._save_stats()
+    
     def record_message_processed(self, success=True, message_type='text', has_media=False):
         """Record a processed message"""
         if success:
@@ -99,14 +149,14 @@ class StatsManager:
             
         self._save_stats()
     
-    def record_replacement_made(self):
-        """Record a text replacement"""
-        self.replacements_made += 1
+    def record_replacement_made(self, count=1):
+        """Record text replacements (one save per message)"""
+        self.replacements_made += count
         self._save_stats()
     
-    def record_link_cleaned(self):
-        """Record a link cleaned"""
-        self.links_cleaned += 1
+    def record_link_cleaned(self, count=1):
+        """Record cleaned links (one save per message)"""
+        self.links_cleaned += count
         self._save_stats()
     
     def record_response_time(self, response_time):
@@ -146,6 +196,46 @@ class StatsManager:
                 'memory_available': "غير متاح"
             }
     
+    def get_rate_limit_state(self):
+        """Live limiter state in the userbot process, last saved state elsewhere (control bot)"""
+        if self.rate_limiter is not None:
+            return self.rate_limiter.get_state()
+        return self._saved_state('rate_limits')
+    
+    def get_queue_state(self):
+        """Live work queue metrics in the userbot process, last saved metrics elsewhere"""
+        if self.work_queue is not None:
+            return self.work_queue.get_state()
+        return self._saved_state('queue')
+    
+    def get_flood_state(self):
+        """Live FloodWait scheduler state in the userbot process, last saved state elsewhere"""
+        if self.flood_scheduler is not None:
+            return self.flood_scheduler.get_state()
+        return self._saved_state('floods')
+    
+    def get_pacing_state(self):
+        """Live learned send delays in the userbot process, last saved ones elsewhere"""
+        if self.pacer is not None:
+            return self.pacer.get_state()
+        return self._saved_state('pacing')
+    
+    def get_state_age(self):
+        """Seconds since the state above was taken: 0 when live, None if the userbot never saved it"""
+        if self.rate_limiter is not None:
+            return 0.0
+        saved_at = self._saved_state('saved_at')
+        if not isinstance(saved_at, (int, float)):
+            return None
+        return max(0.0, time.time() - saved_at)
+    
+    def _saved_state(self, key):
+        try:
+            with open(self.stats_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get(key, {})
+        except (OSError, ValueError):
+            return {}
+    
     def get_average_response_time(self):
         """Get average response time"""
         if not self.response_times:
@@ -182,6 +272,7 @@ class StatsManager:
     def get_comprehensive_stats(self):
         """Get comprehensive statistics"""
         system_stats = self.get_system_stats()
+        state_age = self.get_state_age()
         
         return {
             # إحصائيات الرسائل
@@ -195,6 +286,13 @@ class StatsManager:
             'links_cleaned': self.links_cleaned,
             'media_forwarded': self.media_forwarded,
             'text_forwarded': self.text_forwarded,
+            'config_version': self.config_version,
+            'rate_limits': self.get_rate_limit_state(),
+            'queue': self.get_queue_state(),
+            'floods': self.get_flood_state(),
+            'pacing': self.get_pacing_state(),
+            'state_age': state_age,
+            'state_stale': state_age is not None and state_age > STALE_AFTER,
             
             # إحصائيات الأداء
             'uptime': self.get_uptime(),
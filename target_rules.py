@@ -0,0 +1,174 @@
+"""
+Target rules - pick which targets receive a message from its words, hashtags and media kind
+Every rule's terms are compiled into one keyword automaton and every rule's kinds into a
+per-kind bitmask, so a message is matched against all rules in a single text pass no matter
+how many rules there are. Targets without a rule receive everything; fallback targets receive
+only what no rule matched
+"""
+
+from typing import Iterable, Optional
+
+from message_kind import MessageKind
+from text_matcher import KeywordMatcher
+
+# Config section holding one 'target = predicate' line per rule, plus 'fallback = targets'
+RULES_SECTION = 'target_rules'
+FALLBACK_KEY = 'fallback'
+
+# Predicate fields, e.g. "words: goal, match; hashtags: sport; kinds: photo, video"
+RULE_FIELDS = ('words', 'hashtags', 'kinds')
+
+# 'media' in a kinds list stands for every kind that carries media
+MEDIA_KINDS = tuple(kind for kind in MessageKind if kind.has_media)
+
+
+def parse_rule(spec: str) -> dict:
+    """Parse a rule predicate into {'words': [...], 'hashtags': [...], 'kinds': [...]}"""
+    rule = {field: [] for field in RULE_FIELDS}
+    for part in spec.split(';'):
+        if not part.strip():
+            continue
+        field, sep, values = part.partition(':')
+        field = field.strip().lower()
+        if not sep or field not in RULE_FIELDS:
+            raise ValueError(f"expected '{': ...; '.join(RULE_FIELDS)}: ...', got '{part.strip()}'")
+        rule[field].extend(value.strip().lower() for value in values.split(',') if value.strip())
+    return rule
+
+
+def _kind_bits(names: Iterable[str]) -> int:
+    bits = 0
+    for name in names:
+        if name == 'media':
+            kinds = MEDIA_KINDS
+        else:
+            try:
+                kinds = (MessageKind[name.upper()],)
+            except KeyError:
+                raise ValueError(f"unknown kind '{name}' (use media or {', '.join(k.name.lower() for k in MessageKind)})")
+        for kind in kinds:
+            bits |= 1 << kind
+    return bits
+
+
+class TargetRouter:
+    """Compiled target rules for one route's target list"""
+
+    __slots__ = ('targets', 'rules', 'matcher', '_term_rules', '_always_rules', '_kind_rules',
+                 '_rule_targets', '_open_targets', '_fallback_targets', '_selections')
+
+    def __init__(self, targets: Iterable[str], rules: Iterable[tuple], fallback: Iterable[str] = (),
+                 whole_words: bool = False):
+        """rules are (target, spec) pairs; targets and fallback must be among targets"""
+        self.targets = tuple(targets)
+        index = {target.lower(): i for i, target in enumerate(self.targets)}
+
+        def target_index(target: str) -> int:
+            i = index.get(target.strip().lower())
+            if i is None:
+                raise ValueError(f"{target} is not one of the targets ({', '.join(self.targets)})")
+            return i
+
+        self.rules = []
+        term_rules = {}
+        self._always_rules = 0
+        self._rule_targets = []
+        kind_masks = []
+        ruled_targets = 0
+        for number, (target, spec) in enumerate(rules):
+            try:
+                rule = parse_rule(spec)
+                kinds = _kind_bits(rule['kinds'])
+            except ValueError as e:
+                raise ValueError(f"Target rule for {target}: {e}") from e
+            terms = rule['words'] + [tag if tag.startswith('#') else f"#{tag}" for tag in rule['hashtags']]
+            bit = 1 << number
+            for term in terms:
+                term_rules[term] = term_rules.get(term, 0) | bit
+            if not terms:
+                self._always_rules |= bit
+            kind_masks.append(kinds or -1)
+            i = target_index(target)
+            self._rule_targets.append(1 << i)
+            ruled_targets |= 1 << i
+            self.rules.append((self.targets[i], rule))
+
+        # Rules accepting each kind: one AND against the rules whose terms matched
+        self._kind_rules = tuple(
+            sum(1 << number for number, mask in enumerate(kind_masks) if mask >> kind & 1)
+            for kind in MessageKind
+        )
+        self.matcher = KeywordMatcher(term_rules, whole_words=whole_words)
+        self._term_rules = term_rules
+        self._fallback_targets = 0
+        for target in fallback:
+            self._fallback_targets |= 1 << target_index(target)
+        self._open_targets = ((1 << len(self.targets)) - 1) & ~ruled_targets & ~self._fallback_targets
+        # Matched rule set -> selected targets (few distinct combinations occur in practice)
+        self._selections = {}
+
+    def __repr__(self):
+        return f"TargetRouter({len(self.rules)} rules, {len(self.matcher)} terms)"
+
+    def match(self, text: str, kinds: Iterable[MessageKind]) -> int:
+        """Bitmask of the rules a text with the given kind(s) satisfies"""
+        kind_rules = 0
+        for kind in kinds:
+            kind_rules |= self._kind_rules[kind]
+        rules = self._always_rules
+        if text and self.matcher:
+            term_rules = self._term_rules
+            for match in self.matcher.finditer(text):
+                rules |= term_rules[match.term]
+        return rules & kind_rules
+
+    def select(self, text: str, kinds: Iterable[MessageKind]) -> tuple:
+        """Targets for a message (or album): open targets, plus matched rules' targets or the fallback"""
+        rules = self.match(text, kinds)
+        selected = self._selections.get(rules)
+        if selected is None:
+            bits = self._open_targets
+            if rules:
+                for number, target_bit in enumerate(self._rule_targets):
+                    if rules >> number & 1:
+                        bits |= target_bit
+            else:
+                bits |= self._fallback_targets
+            selected = self._selections[rules] = tuple(
+                target for i, target in enumerate(self.targets) if bits >> i & 1
+            )
+        return selected
+
+    @staticmethod
+    def unknown_targets(config_manager, targets: Iterable[str]) -> list:
+        """Rule keys in [target_rules] that name no configured target (typos)"""
+        parser = config_manager.config
+        if not parser.has_section(RULES_SECTION):
+            return []
+        known = {target.lower() for target in targets}
+        named = []
+        for key, value in parser.items(RULES_SECTION, raw=True):
+            if key == FALLBACK_KEY:
+                named.extend(chat.strip() for chat in value.split(','))
+            else:
+                named.append(key)
+        return [chat for chat in named if chat and chat.lower() not in known]
+
+    @classmethod
+    def from_config(cls, config_manager, targets: Iterable[str], whole_words: bool = False) -> Optional['TargetRouter']:
+        """Rules from the [target_rules] section that concern targets; None if there are none"""
+        parser = config_manager.config
+        if not parser.has_section(RULES_SECTION):
+            return None
+        targets = tuple(targets)
+        known = {target.lower() for target in targets}
+        rules = []
+        fallback = ()
+        for key, value in parser.items(RULES_SECTION, raw=True):
+            if key == FALLBACK_KEY:
+                fallback = tuple(chat.strip() for chat in value.split(',') if chat.strip() and chat.strip().lower() in known)
+            elif key in known:
+                rules.append((key, value))
+        if not rules and not fallback:
+            return None
+        return cls(targets, rules, fallback, whole_words=whole_words)
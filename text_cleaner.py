@@ -0,0 +1,317 @@
+"""
+Text cleaner - precompiled, fused message cleaning rules
+Built once per config revision; returns the cleaned text and per-rule hit counts
+"""
+
+import copy
+import re
+from bisect import bisect_left, bisect_right
+from typing import Iterable, List, Optional, Tuple
+
+from telethon.extensions import markdown
+from telethon.tl.types import (
+    InputMessageEntityMentionName,
+    MessageEntityBlockquote,
+    MessageEntityBold,
+    MessageEntityCode,
+    MessageEntityHashtag,
+    MessageEntityItalic,
+    MessageEntityMention,
+    MessageEntityMentionName,
+    MessageEntityPre,
+    MessageEntitySpoiler,
+    MessageEntityStrike,
+    MessageEntityTextUrl,
+    MessageEntityUnderline,
+    MessageEntityUrl
+)
+
+from text_matcher import KeywordMatcher
+
+# Country/generic extensions recognised in bare domains (example.com, site.com.ye)
+DOMAIN_EXTENSIONS = (
+    'com|org|net|info|co|io|me|ly|tv|fm|cc|tk|ml|ga|cf|ye|sa|ae|eg|jo|iq|sy|lb|ma|dz|tn|sd|kw|qa|bh|om|ps'
+)
+
+# Removal rules that start with a known character, in priority order: (first chars, pattern).
+# Each becomes a named group of one fused pattern guarded by a first-character lookahead,
+# so the regex engine only tries the alternation at candidate positions.
+_RULE_PATTERNS = {
+    'links': ('hwTt', r'(?:https?://|www\.)[^\s]+|[Tt]\.me/[\w\d_]+'),  # http(s), www and telegram links
+    'mentions': ('@', r'@[\w\d_]+'),
+    'hashtags': ('#', r'#[\w\d_\u0600-\u06FF]+'),
+    'formatting': ('*_`<', r'[*_`]|<[^>]+>'),                          # markdown markers and HTML tags
+}
+
+# Bare domains (example.com, site.com.ye) can start with any word character, so they get their own
+# pass that only runs when the text contains a dot
+_DOMAIN_RE = re.compile(r'(?<![\w-])[\w-]+\.(?:' + DOMAIN_EXTENSIONS + r')[^\s]*')
+
+# Final whitespace normalisation: excessive blank lines and repeated spaces
+_WHITESPACE_RE = re.compile(r'(?P<newlines>\n\s*\n\s*\n+)|(?P<spaces> {2,})')
+
+
+# Entity-based rules: rule -> ((entity type, remove its text?), ...)
+# Hidden links and mention-names keep their visible text; only the link itself is dropped.
+_ENTITY_RULES = {
+    'links': ((MessageEntityUrl, True), (MessageEntityTextUrl, False)),
+    'mentions': ((MessageEntityMention, True), (MessageEntityMentionName, False),
+                 (InputMessageEntityMentionName, False)),
+    'hashtags': ((MessageEntityHashtag, True),),
+    'formatting': tuple((entity_type, False) for entity_type in (
+        MessageEntityBold, MessageEntityItalic, MessageEntityUnderline, MessageEntityStrike,
+        MessageEntityCode, MessageEntityPre, MessageEntitySpoiler, MessageEntityBlockquote
+    )),
+}
+
+
+def _normalize_whitespace(match):
+    return '\n\n' if match.lastgroup == 'newlines' else ' '
+
+
+def _merge_edits(edits: list) -> list:
+    """Sort (start, end, replacement) edits and merge overlapping deletions"""
+    merged = []
+    for start, end, replacement in sorted(edits):
+        if merged and start < merged[-1][1]:
+            prev_start, prev_end, prev_replacement = merged[-1]
+            merged[-1] = (prev_start, max(prev_end, end), prev_replacement)
+        else:
+            merged.append((start, end, replacement))
+    return merged
+
+
+class _Utf16Offsets:
+    """Maps Python string indexes to Telegram's UTF-16 code unit offsets and back"""
+
+    __slots__ = ('_units',)
+
+    def __init__(self, text: str):
+        self._units = None
+        # Only characters outside the BMP (most emoji) take two UTF-16 units
+        if len(text.encode('utf-16-le')) != 2 * len(text):
+            units = [0]
+            total = 0
+            for ch in text:
+                total += 2 if ord(ch) > 0xFFFF else 1
+                units.append(total)
+            self._units = units
+
+    def to_index(self, offset: int) -> int:
+        return offset if self._units is None else bisect_left(self._units, offset)
+
+    def to_utf16(self, index: int) -> int:
+        return index if self._units is None else self._units[index]
+
+
+def utf16_len(text: str) -> int:
+    return len(text.encode('utf-16-le')) // 2
+
+
+class EntityText:
+    """Message text plus its entities, edited together so entity offsets stay valid"""
+
+    __slots__ = ('text', 'spans')
+
+    def __init__(self, text: str, entities: Optional[Iterable] = None):
+        self.text = text or ''
+        # [entity, start, end] in Python string indexes; converted back to UTF-16 in to_entities()
+        offsets = _Utf16Offsets(self.text)
+        self.spans = [
+            [entity, offsets.to_index(entity.offset), offsets.to_index(entity.offset + entity.length)]
+            for entity in entities or ()
+        ]
+
+    @classmethod
+    def from_markdown(cls, text: str) -> 'EntityText':
+        """Parse header/footer markdown into plain text and entities"""
+        plain, entities = markdown.parse(text)
+        return cls(plain, entities)
+
+    @classmethod
+    def join(cls, parts: List['EntityText'], separator: str = '\n\n') -> 'EntityText':
+        result = cls('')
+        pieces = []
+        position = 0
+        for part in parts:
+            if pieces:
+                pieces.append(separator)
+                position += len(separator)
+            pieces.append(part.text)
+            result.spans.extend([entity, start + position, end + position] for entity, start, end in part.spans)
+            position += len(part.text)
+        result.text = ''.join(pieces)
+        return result
+
+    def apply_edits(self, edits: list):
+        """Apply non-overlapping (start, end, replacement) edits and remap every entity span"""
+        if not edits:
+            return
+        edits = sorted(edits)
+        pieces = []
+        last = 0
+        starts, ends, new_starts, new_ends = [], [], [], []
+        shift = 0
+        for start, end, replacement in edits:
+            pieces.append(self.text[last:start])
+            pieces.append(replacement)
+            last = end
+            starts.append(start)
+            ends.append(end)
+            new_starts.append(start + shift)
+            shift += len(replacement) - (end - start)
+            new_ends.append(end + shift)
+        pieces.append(self.text[last:])
+        self.text = ''.join(pieces)
+
+        def remap(position, is_end):
+            # Edits entirely before the position shift it; a position inside an edit snaps to its bounds
+            count = bisect_right(ends, position)
+            if count < len(edits) and starts[count] < position:
+                return new_ends[count] if is_end else new_starts[count]
+            return position + (new_ends[count - 1] - ends[count - 1] if count else 0)
+
+        spans = []
+        for entity, start, end in self.spans:
+            start, end = remap(start, False), remap(end, True)
+            if end > start:
+                spans.append([entity, start, end])
+        self.spans = spans
+
+    def to_entities(self) -> list:
+        """Copies of the surviving entities with UTF-16 offsets for the current text"""
+        offsets = _Utf16Offsets(self.text)
+        entities = []
+        for entity, start, end in self.spans:
+            entity = copy.copy(entity)
+            entity.offset = offsets.to_utf16(start)
+            entity.length = offsets.to_utf16(end) - entity.offset
+            entities.append(entity)
+        return entities
+
+
+class TextCleaner:
+    """Fuses the enabled cleaning rules into as few compiled passes as possible"""
+
+    __slots__ = ('rules', 'clean_empty_lines', 'line_matcher', '_removal_re', '_clean_domains', '_entity_rules')
+
+    def __init__(self, clean_links: bool = False, clean_hashtags: bool = False, clean_formatting: bool = False,
+                 clean_empty_lines: bool = False, line_matcher: Optional[KeywordMatcher] = None):
+        rules = []
+        if clean_links:
+            rules += ['links', 'mentions']
+        if clean_hashtags:
+            rules.append('hashtags')
+        if clean_formatting:
+            rules.append('formatting')
+
+        self.rules = tuple(rules)
+        self.clean_empty_lines = clean_empty_lines
+        self.line_matcher = line_matcher if line_matcher else None
+        self._clean_domains = clean_links
+        self._removal_re = None
+        if rules:
+            first_chars = re.escape(''.join(_RULE_PATTERNS[name][0] for name in rules))
+            alternatives = '|'.join(f'(?P<{name}>{_RULE_PATTERNS[name][1]})' for name in rules)
+            self._removal_re = re.compile(f'(?=[{first_chars}])(?:{alternatives})')
+
+        # entity type -> (rule, remove text?) for clean_entities()
+        self._entity_rules = {
+            entity_type: (name, remove_text)
+            for name in rules for entity_type, remove_text in _ENTITY_RULES[name]
+        }
+
+    def __repr__(self):
+        return (f"TextCleaner(rules={','.join(self.rules) or '-'}, empty_lines={self.clean_empty_lines}, "
+                f"line_words={len(self.line_matcher) if self.line_matcher else 0})")
+
+    def clean(self, text: str) -> Tuple[str, dict]:
+        """Return (cleaned_text, {rule: hits})"""
+        if not text:
+            return text, {}
+
+        hits = {}
+
+        # Pass 1: span removals (links, mentions, hashtags, formatting) in one regex scan, then bare domains
+        if self._removal_re is not None:
+            def remove(match):
+                rule = match.lastgroup
+                hits[rule] = hits.get(rule, 0) + 1
+                return ''
+            text = self._removal_re.sub(remove, text)
+            if self._clean_domains and '.' in text:
+                text, count = _DOMAIN_RE.subn('', text)
+                if count:
+                    hits['links'] = hits.get('links', 0) + count
+
+        # Pass 2: line filters (lines with words, empty lines) in one split/join
+        if self.line_matcher is not None or self.clean_empty_lines:
+            text = '\n'.join(line for line in text.split('\n') if not self._drop_line(line, hits))
+
+        # Pass 3: collapse blank lines and repeated spaces
+        text = _WHITESPACE_RE.sub(_normalize_whitespace, text).strip()
+        return text, hits
+
+    def _drop_line(self, line: str, hits: dict) -> bool:
+        if self.line_matcher is not None and self.line_matcher.search(line):
+            hits['lines_with_words'] = hits.get('lines_with_words', 0) + 1
+            return True
+        if self.clean_empty_lines and not line.strip():
+            hits['empty_lines'] = hits.get('empty_lines', 0) + 1
+            return True
+        return False
+
+    def clean_entities(self, body: EntityText) -> dict:
+        """Entity-aware clean(): removes spans by entity offsets, edits body in place, returns hits"""
+        hits = {}
+        if not body.text:
+            return hits
+
+        # Pass 1: links, mentions, hashtags and formatting straight from the entity list
+        edits = []
+        kept = []
+        for span in body.spans:
+            rule = self._entity_rules.get(type(span[0]))
+            if rule is None:
+                kept.append(span)
+                continue
+            name, remove_text = rule
+            hits[name] = hits.get(name, 0) + 1
+            if remove_text:
+                edits.append((span[1], span[2], ''))
+        body.spans = kept
+        body.apply_edits(_merge_edits(edits))
+
+        # Pass 2: line filters, deleting each dropped line with one adjacent newline
+        if self.line_matcher is not None or self.clean_empty_lines:
+            edits = []
+            position = 0
+            kept_before = False
+            for line in body.text.split('\n'):
+                end = position + len(line)
+                if self._drop_line(line, hits):
+                    if kept_before:
+                        edits.append((position - 1, end, ''))
+                    else:
+                        edits.append((position, min(end + 1, len(body.text)), ''))
+                else:
+                    kept_before = True
+                position = end + 1
+            body.apply_edits(edits)
+
+        # Pass 3: same whitespace normalisation as clean(), expressed as deletions
+        edits = []
+        for match in _WHITESPACE_RE.finditer(body.text):
+            if match.lastgroup == 'newlines':
+                edits.append((match.start() + 1, match.end() - 1, ''))
+            else:
+                edits.append((match.start() + 1, match.end(), ''))
+        body.apply_edits(edits)
+        text = body.text
+        stripped = text.lstrip()
+        edits = [(0, len(text) - len(stripped), '')] if len(stripped) < len(text) else []
+        stripped = text.rstrip()
+        if stripped and len(stripped) < len(text):
+            edits.append((len(stripped), len(text), ''))
+        body.apply_edits(edits)
+        return hits
@@ -0,0 +1,202 @@
+"""
+Text matcher - multi-pattern keyword search (Aho-Corasick)
+Word lists are compiled once and each message is scanned in a single pass
+"""
+
+import re
+from collections import namedtuple
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+KeywordMatch = namedtuple('KeywordMatch', 'term start end')
+
+# Below this many terms, search() uses str.find per term (C speed) instead of walking the automaton
+SMALL_SET_LIMIT = 16
+# Up to this many rules, TextReplacer uses one longest-first regex alternation; above it, the automaton
+REGEX_RULE_LIMIT = 100
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over a fixed set of terms"""
+
+    __slots__ = ('terms', 'whole_words', 'case_sensitive', '_goto', '_fail', '_out', '_dict_link')
+
+    def __init__(self, terms: Iterable[str], whole_words: bool = False, case_sensitive: bool = False):
+        self.whole_words = whole_words
+        self.case_sensitive = case_sensitive
+
+        unique = []
+        seen = set()
+        for term in terms:
+            term = term if case_sensitive else term.lower()
+            if term and term not in seen:
+                seen.add(term)
+                unique.append(term)
+        self.terms = tuple(unique)
+
+        # Node 0 is the root; _out[node] is the index of the term ending at node (or -1)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [-1]
+        self._dict_link = [-1]
+        for index, term in enumerate(self.terms):
+            self._insert(term, index)
+        self._build_links()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __bool__(self):
+        return bool(self.terms)
+
+    def __repr__(self):
+        mode = 'word' if self.whole_words else 'substring'
+        return f"KeywordMatcher({len(self.terms)} terms, {mode})"
+
+    def _insert(self, term: str, index: int):
+        node = 0
+        for ch in term:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(-1)
+                self._dict_link.append(-1)
+            node = nxt
+        self._out[node] = index
+
+    def _build_links(self):
+        """Breadth-first computation of failure and dictionary-suffix links"""
+        goto, fail, out, dict_link = self._goto, self._fail, self._out, self._dict_link
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(ch, 0)
+                fail[child] = target if target != child else 0
+                # Nearest proper suffix that is itself a term
+                suffix = fail[child]
+                dict_link[child] = suffix if out[suffix] >= 0 else dict_link[suffix]
+
+    def _prepare(self, text: str) -> str:
+        return text if self.case_sensitive else text.lower()
+
+    def _boundary_ok(self, text: str, start: int, end: int) -> bool:
+        if start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if end < len(text) and _is_word_char(text[end]):
+            return False
+        return True
+
+    def finditer(self, text: str) -> Iterator[KeywordMatch]:
+        """Yield every (possibly overlapping) match, in order of end position"""
+        if not text or not self.terms:
+            return
+        text = self._prepare(text)
+        goto, fail, out, dict_link, terms = self._goto, self._fail, self._out, self._dict_link, self.terms
+        whole_words = self.whole_words
+        node = 0
+        for pos, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = node if out[node] >= 0 else dict_link[node]
+            while hit > 0:
+                term = terms[out[hit]]
+                end = pos + 1
+                start = end - len(term)
+                if not whole_words or self._boundary_ok(text, start, end):
+                    yield KeywordMatch(term, start, end)
+                hit = dict_link[hit]
+
+    def search(self, text: str) -> Optional[KeywordMatch]:
+        """First match found in a single left-to-right scan (earliest end position), or None"""
+        if not self.whole_words and 0 < len(self.terms) <= SMALL_SET_LIMIT and text:
+            return self._search_small(self._prepare(text))
+        for match in self.finditer(text):
+            return match
+        return None
+
+    def _search_small(self, text: str) -> Optional[KeywordMatch]:
+        best = None
+        for term in self.terms:
+            start = text.find(term)
+            if start >= 0:
+                end = start + len(term)
+                if best is None or end < best.end or (end == best.end and start < best.start):
+                    best = KeywordMatch(term, start, end)
+        return best
+
+    def contains(self, text: str) -> bool:
+        return self.search(text) is not None
+
+
+class TextReplacer:
+    """Applies an old->new table simultaneously in one left-to-right scan (leftmost-longest)"""
+
+    __slots__ = ('table', '_regex', '_matcher')
+
+    def __init__(self, pairs: Iterable[Tuple[str, str]]):
+        table = {}
+        for old_text, new_text in pairs:
+            if old_text and old_text not in table:  # first rule wins for duplicates
+                table[old_text] = new_text
+        self.table = table
+        self._regex = None
+        self._matcher = None
+        if len(table) > REGEX_RULE_LIMIT:
+            self._matcher = KeywordMatcher(table, case_sensitive=True)
+        elif table:
+            # Alternatives are tried in order, so longest-first gives leftmost-longest matches
+            self._regex = re.compile('|'.join(re.escape(old) for old in sorted(table, key=len, reverse=True)))
+
+    def __len__(self):
+        return len(self.table)
+
+    def __bool__(self):
+        return bool(self.table)
+
+    def __repr__(self):
+        return f"TextReplacer({len(self.table)} rules)"
+
+    def spans(self, text: str) -> List[Tuple[int, int, str]]:
+        """Non-overlapping (start, end, replacement) edits, leftmost-longest"""
+        if not text or not self.table:
+            return []
+        table = self.table
+        if self._regex is not None:
+            return [(m.start(), m.end(), table[m.group()]) for m in self._regex.finditer(text)]
+
+        # Automaton yields every overlapping match; keep the leftmost, then longest, non-overlapping ones
+        edits = []
+        last_end = 0
+        for term, start, end in sorted(self._matcher.finditer(text), key=lambda m: (m.start, -m.end)):
+            if start >= last_end:
+                edits.append((start, end, table[term]))
+                last_end = end
+        return edits
+
+    def replace(self, text: str) -> Tuple[str, int]:
+        """Return (new_text, replacements_made)"""
+        edits = self.spans(text)
+        if not edits:
+            return text, 0
+        pieces = []
+        last = 0
+        for start, end, replacement in edits:
+            pieces.append(text[last:start])
+            pieces.append(replacement)
+            last = end
+        pieces.append(text[last:])
+        return ''.join(pieces), len(edits)
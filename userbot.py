@@ -3,41 +3,98 @@ Telegram Userbot - Core forwarding functionality
 """
 
 import asyncio
-import configparser
 import logging
 import os
-from telethon import TelegramClient, events
+from telethon import TelegramClient, events, utils as telethon_utils
 from telethon.errors import (
     FloodWaitError, 
     ChatWriteForbiddenError, 
-    MessageNotModifiedError,
-    RPCError
+    RPCError,
+    PeerIdInvalidError,
+    ChannelPrivateError,
+    ChannelInvalidError,
+    ChatIdInvalidError
 )
-from telethon.tl.types import (
-    MessageMediaPhoto, 
-    MessageMediaDocument
-)
-from utils import ConfigManager, RateLimiter
+from utils import ConfigManager
 from stats_manager import StatsManager
+from message_kind import classify_message
+from config_snapshot import DEFAULT_ROUTE, ConfigSnapshot, ConfigWatcher
+from config_channel import ConfigChannelServer
+from text_cleaner import EntityText
+from message_transform import RenderedMessage, TransformCache
+from fanout import TargetFanOut
+from rate_limiter import TargetRateLimiter
+from peer_resolver import DEFAULT_CACHE_PATH, PeerResolver
+from album_collector import AlbumCollector
+from forward_batcher import ForwardBatcher
+from work_queue import WorkQueue
+from outbox import Outbox
+from flood_scheduler import FloodScheduler
+from pacer import DEFAULT_PACING_PATH, Pacer
+from dedup_index import DedupIndex
+from content_dedup import ContentDedup
+from near_dedup import NearDedup
+from account_pool import AccountPool, SenderAccount, account_path, extra_sessions
 
 # Initialize global stats manager
 stats_manager = StatsManager()
 
+# Most messages fetched per source when catching up after downtime (a larger gap is logged
+# and only its newest messages are caught up)
+CATCH_UP_LIMIT = 5000
+
 class TelegramForwarder:
     """Main class for Telegram message forwarding"""
     
     def __init__(self, config_path='config.ini'):
         self.logger = logging.getLogger(__name__)
         self.config_manager = ConfigManager(config_path)
-        self.rate_limiter = RateLimiter()
+        self.rate_limiter = TargetRateLimiter()
+        stats_manager.rate_limiter = self.rate_limiter
         
         # Initialize Telegram client
         self.client = None
-        self.source_chat = None
-        self.target_chat = None
-        self.forward_options = {}
+        self.config = None
+        # Resolved source chat id -> route snapshot (one lookup per message)
+        self._routes = {}
+        self.config_watcher = None
+        self.config_channel = None
+        self.me_id = None
+        self.transform_cache = TransformCache()
+        self.fanout = None
+        self.peer_resolver = None
+        self.forward_batcher = None
+        self.album_collector = AlbumCollector(self._process_album)
+        # The update handler only enqueues; workers do the (possibly slow) forwarding
+        self.work_queue = WorkQueue(self._process_message, loader=self._load_message,
+                                    on_drop=lambda message: self.outbox.complete(message, 'dropped'))
+        stats_manager.work_queue = self.work_queue
+        # Deliveries are committed here before sending and acknowledged per target afterwards
+        self.outbox = Outbox()
+        # Targets under a FloodWait are parked here instead of sleeping inside the send
+        self.flood_scheduler = FloodScheduler()
+        stats_manager.flood_scheduler = self.flood_scheduler
+        # Messages with parked deliveries: key -> [parked, delivered, kinds, forget]; kinds is None while
+        # the message is still being processed and () once its outcome is in the stats
+        self._parked_outcomes = {}
+        # Send spacing learned per target (AIMD), persisted across restarts
+        self.pacer = Pacer()
+        stats_manager.pacer = self.pacer
+        # Which source messages were already handled: bounded, and kept across restarts
+        self.dedup_index = DedupIndex()
+        # Same post cross-posted to several sources (optional, content_dedup)
+        self.content_dedup = ContentDedup()
+        # Reposts of the same text with small edits (optional, near_dedup)
+        self.near_dedup = NearDedup()
+        # Sessions sharing the target fan-out; the primary one also receives the source updates
+        self.accounts = AccountPool()
+        self._extra_clients = []
         
         self._setup_client()
+        self.peer_resolver = PeerResolver(self.client)
+        self.forward_batcher = ForwardBatcher(self.client, self.rate_limiter, self.pacer)
+        self.accounts.add(SenderAccount('primary', self.client, self.peer_resolver, self.rate_limiter,
+                                        self.pacer, self.forward_batcher, primary=True))
         self._load_config()
     
     def _setup_client(self):
@@ -68,93 +125,138 @@ class TelegramForwarder:
                 self.client = TelegramClient('userbot_session', int(api_id), api_hash)
                 self.logger.info("Using session file for authentication")
             
+            # Additional accounts only send; they log in with their own string sessions
+            sessions = extra_sessions()
+            if sessions:
+                from telethon.sessions import StringSession
+                self._extra_clients = [TelegramClient(StringSession(session), int(api_id), api_hash) for session in sessions]
+                self.logger.info(f"👥 {len(sessions)} extra sending account(s) configured")
+            
         except Exception as e:
             self.logger.error(f"Failed to setup Telegram client: {e}")
             raise
     
     def _load_config(self):
-        """Load configuration settings"""
+        """Load configuration settings into an immutable snapshot"""
         try:
-            # Load chat configurations - support multiple sources and targets
-            source_chat_raw = self.config_manager.get('forwarding', 'source_chat')
-            target_chat_raw = self.config_manager.get('forwarding', 'target_chat')
-
-            # Parse multiple sources 
-            if ',' in source_chat_raw:
-                self.source_chats = [chat.strip() for chat in source_chat_raw.split(',') if chat.strip()]
-            else:
-                self.source_chats = [source_chat_raw.strip()]
-            
-            # Parse multiple targets (comma-separated)
-            if ',' in target_chat_raw:
-                self.target_chats = [chat.strip() for chat in target_chat_raw.split(',') if chat.strip()]
-            else:
-                self.target_chats = [target_chat_raw.strip()]
-            
-            # Keep backward compatibility
-            self.source_chat = self.source_chats[0]
-            self.target_chat = self.target_chats[0]
-            
-            # Load forwarding options including all media filters
-            self.forward_options = {
-                'delay': self.config_manager.getfloat('forwarding', 'forward_delay', fallback=1.0),
-                'max_retries': self.config_manager.getint('forwarding', 'max_retries', fallback=3),
-                'forward_text': self.config_manager.getboolean('forwarding', 'forward_text', fallback=True),
-                'forward_photos': self.config_manager.getboolean('forwarding', 'forward_photos', fallback=True),
-                'forward_videos': self.config_manager.getboolean('forwarding', 'forward_videos', fallback=True),
-                'forward_music': self.config_manager.getboolean('forwarding', 'forward_music', fallback=True),
-                'forward_audio': self.config_manager.getboolean('forwarding', 'forward_audio', fallback=True),
-                'forward_voice': self.config_manager.getboolean('forwarding', 'forward_voice', fallback=True),
-                'forward_video_messages': self.config_manager.getboolean('forwarding', 'forward_video_messages', fallback=True),
-                'forward_files': self.config_manager.getboolean('forwarding', 'forward_files', fallback=True),
-                'forward_links': self.config_manager.getboolean('forwarding', 'forward_links', fallback=True),
-                'forward_gif': self.config_manager.getboolean('forwarding', 'forward_gif', fallback=True),
-                'forward_gifs': self.config_manager.getboolean('forwarding', 'forward_gifs', fallback=True),
-                'forward_contacts': self.config_manager.getboolean('forwarding', 'forward_contacts', fallback=True),
-                'forward_locations': self.config_manager.getboolean('forwarding', 'forward_locations', fallback=True),
-                'forward_polls': self.config_manager.getboolean('forwarding', 'forward_polls', fallback=True),
-                'forward_stickers': self.config_manager.getboolean('forwarding', 'forward_stickers', fallback=True),
-                'forward_round': self.config_manager.getboolean('forwarding', 'forward_round', fallback=True),
-                'forward_games': self.config_manager.getboolean('forwarding', 'forward_games', fallback=True),
-                'forward_mode': self.config_manager.get('forwarding', 'forward_mode', fallback='forward'),
-                'header_enabled': self.config_manager.getboolean('forwarding', 'header_enabled', fallback=False),
-                'footer_enabled': self.config_manager.getboolean('forwarding', 'footer_enabled', fallback=False),
-                'header_text': self.config_manager.get('forwarding', 'header_text', fallback=''),
-                'footer_text': self.config_manager.get('forwarding', 'footer_text', fallback=''),
-                'blacklist_enabled': self.config_manager.getboolean('forwarding', 'blacklist_enabled', fallback=False),
-                'whitelist_enabled': self.config_manager.getboolean('forwarding', 'whitelist_enabled', fallback=False),
-                'blacklist_words': self.config_manager.get('forwarding', 'blacklist_words', fallback=''),
-                'whitelist_words': self.config_manager.get('forwarding', 'whitelist_words', fallback=''),
-                'clean_links': self.config_manager.getboolean('forwarding', 'clean_links', fallback=False),
-                'clean_buttons': self.config_manager.getboolean('forwarding', 'clean_buttons', fallback=False),
-                'clean_hashtags': self.config_manager.getboolean('forwarding', 'clean_hashtags', fallback=False),
-                'clean_formatting': self.config_manager.getboolean('forwarding', 'clean_formatting', fallback=False),
-                'clean_empty_lines': self.config_manager.getboolean('forwarding', 'clean_empty_lines', fallback=False),
-                'clean_lines_with_words': self.config_manager.getboolean('forwarding', 'clean_lines_with_words', fallback=False),
-                'clean_words_list': self.config_manager.get('forwarding', 'clean_words_list', fallback=''),
-                'buttons_enabled': self.config_manager.getboolean('forwarding', 'buttons_enabled', fallback=False),
-                'button1_text': self.config_manager.get('forwarding', 'button1_text', fallback=''),
-                'button1_url': self.config_manager.get('forwarding', 'button1_url', fallback=''),
-                'button2_text': self.config_manager.get('forwarding', 'button2_text', fallback=''),
-                'button2_url': self.config_manager.get('forwarding', 'button2_url', fallback=''),
-                'button3_text': self.config_manager.get('forwarding', 'button3_text', fallback=''),
-                'button3_url': self.config_manager.get('forwarding', 'button3_url', fallback=''),
-                # Text replacer settings
-                'replacer_enabled': self.config_manager.getboolean('text_replacer', 'replacer_enabled', fallback=False),
-                'replacements': self.config_manager.get('text_replacer', 'replacements', fallback=''),
-                # Multi-mode settings
-                'multi_mode_enabled': self.config_manager.getboolean('forwarding', 'multi_mode_enabled', fallback=False)
-            }
-            
-            if not self.source_chat or not self.target_chat:
-                raise ValueError("Please configure source_chat and target_chat in config.ini")
-                
-            self.logger.info(f"Configuration loaded - Source: {self.source_chat}, Target: {self.target_chat}")
-            
+            self._apply_snapshot(ConfigSnapshot.from_config(self.config_manager))
         except Exception as e:
             self.logger.error(f"Failed to load configuration: {e}")
             raise
     
+    def _apply_snapshot(self, snapshot, config_manager=None):
+        """Atomically swap the active configuration snapshot"""
+        if config_manager is not None:
+            self.config_manager = config_manager
+        
+        previous = self.config
+        self.config = snapshot
+        stats_manager.config_version = snapshot.version
+        # Entries of older revisions can never be hit again
+        self.transform_cache.clear()
+        
+        # Resolve newly configured chats ahead of the first send (cached peers are free)
+        if self.peer_resolver is not None and self.me_id is not None and previous is not None:
+            new_chats = set(snapshot.source_chats + snapshot.target_chats) - set(previous.source_chats + previous.target_chats)
+            if new_chats:
+                asyncio.get_running_loop().create_task(self._resolve_chats(sorted(new_chats)))
+        self._index_routes(snapshot)
+        
+        options = snapshot.forward_options
+        # As many messages may be in delivery as may wait in the queue
+        limits = (options.max_concurrent_targets, options.per_target_concurrency, options.queue_size)
+        if self.fanout is None:
+            self.fanout = TargetFanOut(*limits)
+        elif self.fanout.limits() != limits:
+            self.fanout.configure(*limits)
+        for account in self.accounts:
+            account.rate_limiter.configure(options.rate_limits)
+            account.pacer.configure(options.delay, options.pacing)
+            account.forward_batcher.window = options.forward_batch_window
+            account.forward_batcher.slot = self.fanout.slot
+        self.album_collector.window = options.album_window
+        self.content_dedup.window = options.content_dedup_window
+        self.near_dedup.configure(options.near_dedup_threshold, options.near_dedup_window)
+        self.work_queue.configure(options.queue_size, options.queue_workers, options.queue_policy)
+        
+        if previous is None:
+            self.logger.info(f"Configuration loaded (rev {snapshot.version}) - Source: {snapshot.source_chat}, Target: {snapshot.target_chat}")
+        else:
+            self.logger.info(f"♻️ Configuration reloaded: rev {previous.version} -> {snapshot.version}")
+    
+    async def _resolve_chats(self, chats):
+        """Resolve newly configured chats, then map their ids to routes"""
+        await self.peer_resolver.resolve_all(chats)
+        self._index_routes(self.config)
+    
+    def _index_routes(self, snapshot):
+        """Map every resolved source chat id to its route"""
+        routes = {}
+        for route in snapshot.routes:
+            for chat in route.source_chats:
+                chat_id = self.peer_resolver.peer_id(chat) if self.peer_resolver is not None else None
+                if chat_id is None:
+                    try:
+                        chat_id = int(chat)
+                    except ValueError:
+                        # Username not resolved yet; indexed once it is
+                        continue
+                routes[chat_id] = route
+        self._routes = routes
+    
+    def _route_for(self, message):
+        """Route snapshot for a message's source chat, or None if no route covers it"""
+        route = self._routes.get(message.chat_id)
+        if route is None and len(self.config.routes) == 1:
+            # A single route covers every monitored chat, resolved or not
+            return self.config.routes[0]
+        return route
+    
+    def _apply_config_deltas(self, deltas):
+        """Apply config deltas pushed over the config channel, in memory only"""
+        previous_values = [(d.section, d.key, self.config_manager.get_raw(d.section, d.key)) for d in deltas]
+        try:
+            for delta in deltas:
+                self.config_manager.set(delta.section, delta.key, delta.ini_value())
+            snapshot = ConfigSnapshot.from_config(self.config_manager)
+        except Exception:
+            # Roll back so a bad delta never leaves a half-applied config behind
+            for section, key, value in reversed(previous_values):
+                self.config_manager.set(section, key, value)
+            raise
+        
+        self._apply_snapshot(snapshot)
+        if self.config_watcher is not None:
+            # The control bot persisted these values before pushing them; do not reload them again
+            self.config_watcher.mark_applied(self.config_manager)
+        self.logger.info(f"📡 Applied {len(deltas)} pushed config change(s): {', '.join(f'{d.section}.{d.key}' for d in deltas)}")
+        return snapshot.version
+    
+    @property
+    def config_version(self):
+        """Version number of the active configuration snapshot"""
+        return self.config.version if self.config else 0
+    
+    @property
+    def source_chats(self):
+        return self.config.source_chats
+    
+    @property
+    def target_chats(self):
+        return self.config.target_chats
+    
+    @property
+    def source_chat(self):
+        return self.config.source_chat
+    
+    @property
+    def target_chat(self):
+        return self.config.target_chat
+    
+    @property
+    def forward_options(self):
+        return self.config.forward_options
+    
     async def start(self):
         """Start the userbot and authenticate"""
         try:
@@ -162,13 +264,48 @@ class TelegramForwarder:
             
             # Get user info
             me = await self.client.get_me()
+            self.me_id = me.id
             self.logger.info(f"Logged in as: {me.first_name} {me.last_name or ''} (@{me.username or 'N/A'})")
             
+            # Peers resolved by earlier runs of this account need no lookups
+            self.peer_resolver.load(self.me_id)
+            self.pacer.load(self.me_id)
+            self.dedup_index.load()
+            self.content_dedup.load()
+            self.near_dedup.load()
+            
             # Validate chat access
             await self._validate_chats()
+            self._index_routes(self.config)
+            await self._start_extra_accounts()
             
             # Register event handlers
+            pending = await self.outbox.open()
             self._register_handlers()
+            self.work_queue.start()
+            # Limiter, queue, flood and pacing state for the control bot, also while idle
+            stats_manager.start_snapshots()
+            
+            # Deliveries interrupted by the last shutdown, then messages posted while we were down
+            await self._replay_outbox(pending)
+            await self._catch_up()
+            
+            # Reload the config snapshot only when config.ini actually changes
+            self.config_watcher = ConfigWatcher(
+                self.config_manager.config_path,
+                self._apply_snapshot,
+                interval=self.forward_options.config_reload_interval,
+                store_path=self.config_manager.store_path
+            )
+            self.config_watcher.mark_applied(self.config_manager)
+            self.config_watcher.start()
+            
+            # Accept config changes pushed by the control bot
+            self.config_channel = ConfigChannelServer(self._apply_config_deltas)
+            try:
+                await self.config_channel.start()
+            except OSError as e:
+                self.logger.warning(f"Config channel unavailable, relying on file watcher: {e}")
             
             self.logger.info("Userbot started successfully")
             
@@ -179,36 +316,46 @@ class TelegramForwarder:
     async def _validate_chats(self):
         """Validate access to source and target chats"""
         try:
-            # Validate all source chats
-            for i, source_chat in enumerate(self.source_chats):
-                try:
-                    try:
-                        source_entity = await self.client.get_entity(int(source_chat))
-                        self.logger.info(f"Source chat {i+1} validated: {getattr(source_entity, 'title', 'Private Chat')} ({source_chat})")
-                    except ValueError:
-                        # Try as username if not numeric
-                        source_entity = await self.client.get_entity(source_chat)
-                        self.logger.info(f"Source chat {i+1} validated: {getattr(source_entity, 'title', 'Private Chat')} ({source_chat})")
-                except Exception as e:
-                    self.logger.warning(f"Source chat {i+1} ({source_chat}) validation failed, but continuing: {e}")
-            
-            # Validate all target chats
-            for i, target_chat in enumerate(self.target_chats):
-                try:
+            # Resolve every configured chat to an InputPeer once; sends reuse them
+            for label, chats in (("Source", self.source_chats), ("Target", self.target_chats)):
+                for i, chat in enumerate(chats):
                     try:
-                        target_entity = await self.client.get_entity(int(target_chat))
-                        self.logger.info(f"Target chat {i+1} validated: {getattr(target_entity, 'title', 'Private Chat')} ({target_chat})")
-                    except ValueError:
-                        # Try as username if not numeric
-                        target_entity = await self.client.get_entity(target_chat)
-                        self.logger.info(f"Target chat {i+1} validated: {getattr(target_entity, 'title', 'Private Chat')} ({target_chat})")
-                except Exception as e:
-                    self.logger.warning(f"Target chat {i+1} ({target_chat}) validation failed, but continuing: {e}")
+                        peer = await self.peer_resolver.resolve(chat)
+                        entity = await self.client.get_entity(peer)
+                        self.logger.info(f"{label} chat {i+1} validated: {getattr(entity, 'title', 'Private Chat')} ({chat})")
+                    except Exception as e:
+                        self.logger.warning(f"{label} chat {i+1} ({chat}) validation failed, but continuing: {e}")
             
         except Exception as e:
             self.logger.warning(f"Chat validation had issues, but starting anyway: {e}")
             # Don't raise - let the bot try to work and show specific errors when forwarding
     
+    async def _start_extra_accounts(self):
+        """Log in the extra sessions and add them to the account pool"""
+        options = self.forward_options
+        for client in self._extra_clients:
+            try:
+                await client.connect()
+                if not await client.is_user_authorized():
+                    self.logger.warning("Extra session is not authorized, skipping it")
+                    continue
+                me = await client.get_me()
+                name = str(me.id)
+                rate_limiter = TargetRateLimiter(options.rate_limits)
+                pacer = Pacer(options.delay, options.pacing, state_path=account_path(DEFAULT_PACING_PATH, name))
+                peer_resolver = PeerResolver(client, cache_path=account_path(DEFAULT_CACHE_PATH, name))
+                forward_batcher = ForwardBatcher(client, rate_limiter, pacer, options.forward_batch_window,
+                                                 slot=self.fanout.slot)
+                peer_resolver.load(me.id)
+                pacer.load(me.id)
+                # Fills the session's entity cache, so numeric source/target ids resolve for this account
+                await client.get_dialogs()
+                await peer_resolver.resolve_all(self.target_chats)
+                self.accounts.add(SenderAccount(name, client, peer_resolver, rate_limiter, pacer, forward_batcher))
+                self.logger.info(f"👥 Account {me.first_name} ({name}) joined the sending pool")
+            except Exception as e:
+                self.logger.warning(f"Extra account failed to start, continuing without it: {e}")
+    
     def _register_handlers(self):
         """Register event handlers for message monitoring"""
         
@@ -229,7 +376,22 @@ class TelegramForwarder:
                     f"📥 **Monitoring ({len(self.source_chats)} sources):**\n{sources_list}\n"
                     f"📤 **Forwarding to ({len(self.target_chats)} targets):**\n{targets_list}\n"
                     f"⚡ **Response time:** {round((time.time() - start_time) * 1000)}ms\n"
-                    f"🔄 **Forward delay:** {self.forward_options['delay']}s"
+                    f"🔄 **Forward delay:** {self.forward_options.delay}s\n"
+                    f"🧾 **Config revision:** {self.config_version}\n"
+                    f"🛣 **Routes:** {', '.join(f'{route.name} ({len(route.source_chats)}→{len(route.target_chats)})' for route in self.config.routes)}\n"
+                    f"🗂 **Transform cache:** {self.transform_cache.hits} hits / {self.transform_cache.misses} misses\n"
+                    f"🚦 **Rate limits:** {self.rate_limiter.summary()}\n"
+                    f"📬 **Work queue:** {self.work_queue.summary()}\n"
+                    f"📮 **Outbox:** {self.outbox.summary()}\n"
+                    f"🛑 **Flood waits:** {self.flood_scheduler.summary()}\n"
+                    f"🐢 **Pacing:** {self.pacer.summary()}\n"
+                    f"👥 **Accounts:** {self.accounts.summary()}\n"
+                    f"🧮 **Dedup:** {self.dedup_index.summary()}\n"
+                    f"🧬 **Content dedup:** {self.content_dedup.summary()}\n"
+                    f"🪞 **Near dedup:** {self.near_dedup.summary()}\n"
+                    f"📇 **Cached peers:** {len(self.peer_resolver)} ({self.peer_resolver.refreshed} refreshed)\n"
+                    f"📦 **Forward batches:** {self.forward_batcher.batches} "
+                    f"(avg {self.forward_batcher.get_stats()['avg_batch']} messages)"
                 )
                 
                 self.logger.info(f"Ping command received and responded")
@@ -237,9 +399,6 @@ class TelegramForwarder:
             except Exception as e:
                 self.logger.error(f"Error in ping handler: {e}")
         
-        # Initialize processed messages tracker
-        self.processed_messages = set()
-        
         # Message forwarding handler - multiple sources support
         source_chat_ids = []
         for chat in self.source_chats:
@@ -251,277 +410,422 @@ class TelegramForwarder:
         
         @self.client.on(events.NewMessage(chats=source_chat_ids))
         async def handle_new_message(event):
-            
-            message_key = f"{event.chat_id}_{event.message.id}"
-            
-            if message_key in self.processed_messages:
-                self.logger.info(f"🚫 Skipping duplicate: {message_key}")
+            await self._enqueue_message(event.message)
+    
+    async def _enqueue_message(self, message):
+        """Record a new message in the outbox and hand it to the work queue"""
+        message_key = f"{message.chat_id}_{message.id}"
+        
+        if self.dedup_index.seen(message.chat_id, message.id):
+            self.logger.info(f"🚫 Skipping duplicate: {message_key}")
+            return
+        
+        route = self._route_for(message)
+        if route is None:
+            self.logger.warning(f"🛣 No route for source {message.chat_id}, skipping {message_key}")
+            return
+        
+        # Committed before anything is sent, so a restart cannot lose it; concurrent
+        # duplicates that both passed the check above are caught here
+        if not await self.outbox.record(message, route.target_chats):
+            self.logger.info(f"🚫 Already handled: {message_key}")
+            return
+        self.dedup_index.add(message.chat_id, message.id)
+        self.logger.info(f"📥 Queued: {message_key} ({len(self.work_queue)} waiting)")
+        
+        await self.work_queue.put(message)
+    
+    async def _replay_outbox(self, pending):
+        """Re-queue messages whose deliveries were not acknowledged before the last shutdown"""
+        replayed = 0
+        # The spill file replays its own messages; queueing them again would send them twice
+        spilled = self.work_queue.spilled_keys()
+        for (chat_id, message_id), targets in pending.items():
+            if (chat_id, message_id) in spilled:
+                continue
+            try:
+                message = await self._load_message(chat_id, message_id)
+            except Exception as e:
+                self.logger.warning(f"Could not re-fetch {chat_id}_{message_id} for replay: {e}")
+                continue
+            if message is None:
+                # Deleted at the source meanwhile
+                self.outbox.discard(chat_id, message_id, 'missing')
+                continue
+            self.dedup_index.add(chat_id, message_id)
+            await self.work_queue.put(message)
+            replayed += 1
+        if replayed:
+            self.logger.info(f"📮 Replaying {replayed} unacknowledged messages from the outbox")
+    
+    async def _catch_up(self):
+        """Queue messages posted to the sources while the forwarder was not running"""
+        for chat in self.source_chats:
+            try:
+                peer = await self.peer_resolver.resolve(chat)
+                last_id = self.outbox.last_seen.get(telethon_utils.get_peer_id(peer))
+                if last_id is None:
+                    # Never forwarded from this source: do not backfill its history
+                    continue
+                latest = await self.client.get_messages(peer, limit=1)
+            except Exception as e:
+                self.logger.warning(f"Catch-up for {chat} failed: {e}")
+                continue
+            if not latest or latest[0].id <= last_id:
+                continue
+            gap = latest[0].id - last_id
+            if gap > CATCH_UP_LIMIT:
+                self.logger.warning(f"⚠️ About {gap} messages were posted to {chat} during downtime; "
+                                    f"skipping the oldest {gap - CATCH_UP_LIMIT}")
+                last_id = latest[0].id - CATCH_UP_LIMIT
+            self.logger.info(f"📮 Catching up messages {last_id + 1}..{latest[0].id} posted to {chat} during downtime")
+            # Oldest first, paging forward until the newest message
+            caught_up = 0
+            try:
+                async for message in self.client.iter_messages(peer, min_id=last_id, reverse=True):
+                    await self._enqueue_message(message)
+                    caught_up += 1
+            except Exception as e:
+                self.logger.warning(f"Catch-up for {chat} stopped after {caught_up} messages: {e}")
+    
+    async def _load_message(self, chat_id, message_id):
+        """Re-fetch a message spilled to disk by the work queue"""
+        return await self.client.get_messages(chat_id, ids=message_id)
+    
+    async def _process_message(self, message):
+        """Process and forward a new message (runs on a work queue worker)"""
+        try:
+            # Skip if message is from self
+            if self.me_id is None:
+                self.me_id = (await self.client.get_me()).id
+            if message.sender_id == self.me_id:
+                self.outbox.complete(message)
                 return
             
-            self.processed_messages.add(message_key)
-            self.logger.info(f"🔄 Processing: {message_key}")
+            # Every target acknowledged already (a second copy of a replayed message)
+            if not self.outbox.is_pending(message):
+                self.logger.info(f"🚫 Already delivered: {message.chat_id}_{message.id}")
+                return
             
-            await self._process_message(event)
-    
-    async def _process_message(self, event):
-        """Process and forward a new message"""
-        try:
-            message = event.message
+            # Pin the route of the current snapshot so this message sees one consistent config
+            config = self._route_for(message)
+            if config is None:
+                self.logger.info(f"🛣 Source {message.chat_id} is no longer routed, skipping")
+                self.outbox.complete(message)
+                return
+            options = config.forward_options
             
-            # Skip if message is from self
-            if message.sender_id == (await self.client.get_me()).id:
+            # Album parts are coalesced and sent together by _process_album
+            if getattr(message, 'grouped_id', None) and options.album_window > 0:
+                self.album_collector.add(message)
                 return
             
-            # Reload configuration to get latest filter settings including Header/Footer
-            # Force reload from file to get latest changes
-            self.config_manager = ConfigManager('config.ini')
-            self._load_config()
-
+            # Classify once; filtering, copy mode, stats and logging reuse it
+            kind = classify_message(message)
+            
             # Log current filter settings for verification  
-            text_enabled = self.forward_options.get('forward_text', True)
-            photos_enabled = self.forward_options.get('forward_photos', True)
-            forward_mode = self.forward_options.get('forward_mode', 'forward')
-            header_enabled = self.forward_options.get('header_enabled', False)
-            footer_enabled = self.forward_options.get('footer_enabled', False)
-            header_text = self.forward_options.get('header_text', '')
-            footer_text = self.forward_options.get('footer_text', '')
+            text_enabled = options.forward_text
+            photos_enabled = options.forward_photos
+            forward_mode = options.forward_mode
             source_chat_id = str(message.chat_id)
-            self.logger.info(f"📋 معالجة رسالة من {source_chat_id} - النصوص: {text_enabled}, الصور: {photos_enabled}, الوضع: {forward_mode}, أهداف: {len(self.target_chats)}")
-            
-            # Apply rate limiting
-            await self.rate_limiter.wait()
+            self.logger.info(f"📋 معالجة رسالة من {source_chat_id} (rev {config.version}, {config.name}, {kind.name}) - النصوص: {text_enabled}, الصور: {photos_enabled}, الوضع: {forward_mode}, أهداف: {len(config.target_chats)}")
             
             # Check message type and forwarding options
-            if not self._should_forward_message(message):
+            if not self._should_forward_message(message, config, kind):
                 self.logger.debug(f"Skipping message due to filter settings")
+                self.outbox.complete(message)
                 return
             
-            # Forward the message to all target chats
-            successful_forwards = 0
-            failed_forwards = 0
+            # The same post cross-posted to several sources goes out once, before any rate budget is spent
+            scope = self._dedup_scope(config)
+            if options.content_dedup and self.content_dedup.is_duplicate(message, [(message.chat_id, message.id)], scope):
+                self.logger.info(f"🧬 Skipping cross-posted duplicate {message.chat_id}_{message.id}")
+                self.outbox.complete(message, 'duplicate')
+                return
+            if options.near_dedup and self.near_dedup.is_duplicate(self._dedup_text(message.message, options),
+                                                                    [(message.chat_id, message.id)], scope):
+                self.logger.info(f"🪞 Skipping near-duplicate {message.chat_id}_{message.id}")
+                self.outbox.complete(message, 'duplicate')
+                return
             
-            for target_chat in self.target_chats:
-                success = await self._forward_message_to_target(message, target_chat)
-                if success:
-                    successful_forwards += 1
-                else:
-                    failed_forwards += 1
+            targets = self._select_targets(message, config, message.text or getattr(message, 'caption', '') or "", (kind,))
+            if targets is None:
+                return
+            
+            # Forward the message to all target chats concurrently (bounded by the fan-out limits;
+            # batched forwards take their slot per request when the batch is flushed instead);
+            # the worker moves on at once and the outcome is recorded when the deliveries settle
+            batched = forward_mode == 'forward' and options.forward_batch_window > 0
+            await self.fanout.submit(
+                targets,
+                lambda target_chat: self._forward_message_to_target(message, target_chat, config, kind),
+                lambda results: self._on_delivered(message, results, config, (kind,)),
+                limited=not batched
+            )
             
-            self.logger.info(f"Message (ID: {message.id}) - Success: {successful_forwards}/{len(self.target_chats)} targets")
-            if failed_forwards > 0:
-                self.logger.warning(f"Failed forwards: {failed_forwards}/{len(self.target_chats)} targets")
-                
         except Exception as e:
             self.logger.error(f"Error processing message: {e}")
     
-    def _should_forward_message(self, message):
+    async def _process_album(self, messages):
+        """Filter and forward a coalesced album as one grouped send per target"""
+        try:
+            config = self._route_for(messages[0])
+            if config is None:
+                for message in messages:
+                    self.outbox.complete(message)
+                return
+            options = config.forward_options
+            
+            # Word filters apply to the album caption(s); type filters drop individual parts
+            album_text = "\n".join(message.message for message in messages if message.message)
+            if album_text and not self._passes_word_filters(album_text, options):
+                for message in messages:
+                    self.outbox.complete(message)
+                return
+            parts = []
+            for message in messages:
+                kind = classify_message(message)
+                if options.allow_table[kind]:
+                    parts.append((message, kind))
+                else:
+                    self.outbox.complete(message)
+            if not parts:
+                self.logger.debug(f"Skipping album due to filter settings")
+                return
+            
+            album = [message for message, _ in parts]
+            kind = parts[0][1]
+            scope = self._dedup_scope(config)
+            if options.content_dedup and self.content_dedup.is_duplicate(album, [(message.chat_id, message.id) for message in album], scope):
+                self.logger.info(f"🧬 Skipping cross-posted duplicate album {album[0].chat_id}_{album[0].id}")
+                for message in album:
+                    self.outbox.complete(message, 'duplicate')
+                return
+            if options.near_dedup and self.near_dedup.is_duplicate(self._dedup_text(album_text, options),
+                                                                    [(message.chat_id, message.id) for message in album], scope):
+                self.logger.info(f"🪞 Skipping near-duplicate album {album[0].chat_id}_{album[0].id}")
+                for message in album:
+                    self.outbox.complete(message, 'duplicate')
+                return
+            targets = self._select_targets(album, config, album_text, {part_kind for _, part_kind in parts})
+            if targets is None:
+                return
+            self.logger.info(f"🖼 معالجة ألبوم من {album[0].chat_id} (rev {config.version}) - {len(album)}/{len(messages)} أجزاء، أهداف: {len(config.target_chats)}")
+            
+            await self.fanout.submit(
+                targets,
+                lambda target_chat: self._forward_message_to_target(album, target_chat, config, kind),
+                lambda results: self._on_delivered(album, results, config, tuple(part_kind for _, part_kind in parts))
+            )
+            
+        except Exception as e:
+            self.logger.error(f"Error processing album: {e}")
+    
+    def _on_delivered(self, message, results, config, kinds):
+        """Acknowledge each target of a message (or album) and record its outcome once all deliveries settled"""
+        parts = message if isinstance(message, list) else [message]
+        successful_forwards = sum(1 for _, success in results if success)
+        parked_forwards = sum(1 for _, success in results if success is None)
+        failed_forwards = len(results) - successful_forwards - parked_forwards
+        for target_chat, success in results:
+            if success is None:
+                # Parked by the flood scheduler; acknowledged when it is finally sent
+                continue
+            for part in parts:
+                self.outbox.ack(part, target_chat, 'done' if success else 'failed')
+            if not success:
+                self.logger.warning(f"❌ Forward to {target_chat} failed")
+        
+        if successful_forwards == 0 and parked_forwards > 0:
+            # Neither delivered nor failed yet: counted once a parked delivery resumes
+            self._settle_parked(message, kinds, lambda: self._forget_fingerprints(message, config))
+        else:
+            self._record_outcome(kinds, successful_forwards > 0)
+            if successful_forwards == 0:
+                self._forget_fingerprints(message, config)
+            self._settle_parked(message, ())
+        
+        if isinstance(message, list):
+            self.logger.info(f"Album (IDs: {parts[0].id}-{parts[-1].id}, rev {config.version}) - Success: {successful_forwards}/{len(config.target_chats)} targets")
+        else:
+            self.logger.info(f"Message (ID: {message.id}, rev {config.version}, {kinds[0].name}) - Success: {successful_forwards}/{len(config.target_chats)} targets")
+        if parked_forwards > 0:
+            self.logger.info(f"⏸ Parked until FloodWait ends: {parked_forwards}/{len(config.target_chats)} targets")
+        if failed_forwards > 0:
+            self.logger.warning(f"Failed forwards: {failed_forwards}/{len(config.target_chats)} targets")
+    
+    def _should_forward_message(self, message, config=None, kind=None):
         """Check if message should be forwarded based on configuration"""
+        options = (config or self.config).forward_options
         
         # First check blacklist and whitelist filters
         message_text = message.text or getattr(message, 'caption', '') or ""
-        if message_text:
-            try:
-                # Reload config to get latest settings
-                self._load_config()
-                
-                # Check blacklist (if enabled)
-                blacklist_enabled = self.forward_options.get('blacklist_enabled', False)
-                self.logger.info(f"🔍 Blacklist check: enabled={blacklist_enabled}")
+        if message_text and not self._passes_word_filters(message_text, options):
+            return False
+        
+        # Content type filter: one lookup in the precomputed allow-table
+        if kind is None:
+            kind = classify_message(message)
+        return options.allow_table[kind]
+    
+    def _select_targets(self, message, config, text, kinds):
+        """Targets a message (or album) still has to reach; None if the target rules selected none
+
+        Targets the rules leave out are acknowledged as not routed.
+        """
+        parts = message if isinstance(message, list) else [message]
+        selected = config.target_chats
+        router = config.target_router
+        if router is not None:
+            selected = router.select(text, kinds)
+            if not selected:
+                self.logger.info(f"🎯 No target rule matched {parts[0].chat_id}_{parts[0].id}, skipping")
+                for part in parts:
+                    self.outbox.complete(part, 'unrouted')
+                return None
+            for target in config.target_chats:
+                if target not in selected:
+                    for part in parts:
+                        self.outbox.ack(part, target, 'unrouted')
+            self.logger.info(f"🎯 Target rules picked {len(selected)}/{len(config.target_chats)} targets")
+        # Only the targets not yet acknowledged (all of them, unless this is a replay)
+        return self.outbox.pending_targets(parts[0], selected) or None
+    
+    def _passes_word_filters(self, message_text, options):
+        """Blacklist/whitelist check for a message (or album) text"""
+        try:
+            # Check blacklist (if enabled)
+            blacklist_enabled = options.blacklist_enabled
+            self.logger.info(f"🔍 Blacklist check: enabled={blacklist_enabled}")
+            
+            if blacklist_enabled:
+                blacklist_matcher = options.blacklist_matcher
+                self.logger.info(f"🔍 Blacklist words: {len(blacklist_matcher)}")
                 
-                if blacklist_enabled:
-                    blacklist_words = self.forward_options.get('blacklist_words', '').strip()
-                    self.logger.info(f"🔍 Blacklist words: '{blacklist_words}'")
+                if blacklist_matcher:
+                    self.logger.info(f"🔍 Checking message: '{message_text[:50]}...' against blacklist")
                     
-                    if blacklist_words:
-                        blacklist_list = [word.strip().lower() for word in blacklist_words.split(',') if word.strip()]
-                        message_lower = message_text.lower()
-                        self.logger.info(f"🔍 Checking message: '{message_text[:50]}...' against blacklist")
-                        
-                        for word in blacklist_list:
-                            if word in message_lower:
-                                self.logger.info(f"🚫 Message BLOCKED by blacklist: contains '{word}'")
-                                return False
-                        
-                        self.logger.info(f"✅ Message passed blacklist check")
-                
-                # Check whitelist (if enabled)
-                whitelist_enabled = self.forward_options.get('whitelist_enabled', False)
-                self.logger.info(f"🔍 Whitelist check: enabled={whitelist_enabled}")
-                
-                if whitelist_enabled:
-                    whitelist_words = self.forward_options.get('whitelist_words', '').strip()
-                    self.logger.info(f"🔍 Whitelist words: '{whitelist_words}'")
+                    match = blacklist_matcher.search(message_text)
+                    if match:
+                        self.logger.info(f"🚫 Message BLOCKED by blacklist: contains '{match.term}'")
+                        return False
                     
-                    if whitelist_words:
-                        whitelist_list = [word.strip().lower() for word in whitelist_words.split(',') if word.strip()]
-                        message_lower = message_text.lower()
-                        found_allowed_word = False
-                        
-                        for word in whitelist_list:
-                            if word in message_lower:
-                                found_allowed_word = True
-                                self.logger.info(f"✅ Message ALLOWED by whitelist: contains '{word}'")
-                                break
-                        
-                        if not found_allowed_word:
-                            self.logger.info(f"⚪ Message BLOCKED by whitelist: no allowed words found")
-                            return False
-                        
-            except Exception as e:
-                self.logger.error(f"Error checking blacklist/whitelist: {str(e)}")
-        
-        # Check text messages
-        if message.text and not message.media:
-            return self.forward_options.get('forward_text', True)
-        
-        # Check media types
-        if message.media:
-            # Photos
-            if message.photo:
-                return self.forward_options.get('forward_photos', True)
-            
-            # Videos (including GIFs)
-            if message.video:
-                if message.gif:
-                    return self.forward_options.get('forward_gif', True) or \
-                           self.forward_options.get('forward_gifs', True)
-                return self.forward_options.get('forward_videos', True)
-            
-            # Document-based media
-            if message.document:
-                # Stickers
-                if message.sticker:
-                    return self.forward_options.get('forward_stickers', True)
-                
-                # Voice messages
-                if message.voice:
-                    return self.forward_options.get('forward_voice', True)
-                
-                # Video messages (round videos)
-                if message.video_note:
-                    return self.forward_options.get('forward_round', True)
-                
-                # Audio files
-                if message.audio:
-                    # Check if it's music or regular audio
-                    if hasattr(message.audio, 'title') and message.audio.title:
-                        return self.forward_options.get('forward_music', True)
-                    return self.forward_options.get('forward_audio', True)
-                
-                # Video messages (not round)
-                if hasattr(message.document, 'mime_type') and message.document.mime_type:
-                    if message.document.mime_type.startswith('video/'):
-                        return self.forward_options.get('forward_video_messages', True)
-                
-                # Regular files/documents
-                return self.forward_options.get('forward_files', True)
+                    self.logger.info(f"✅ Message passed blacklist check")
             
-            # Contact
-            if message.contact:
-                return self.forward_options.get('forward_contacts', True)
+            # Check whitelist (if enabled)
+            whitelist_enabled = options.whitelist_enabled
+            self.logger.info(f"🔍 Whitelist check: enabled={whitelist_enabled}")
             
-            # Location/Venue
-            if message.geo or message.venue:
-                return self.forward_options.get('forward_locations', True)
-            
-            # Polls
-            if message.poll:
-                return self.forward_options.get('forward_polls', True)
-            
-            # Games
-            if message.game:
-                return self.forward_options.get('forward_games', True)
-        
-        # Check for web links in text
-        if message.text and any(url in message.text.lower() for url in ['http://', 'https://', 'www.', 't.me/']):
-            return self.forward_options.get('forward_links', True)
+            if whitelist_enabled:
+                whitelist_matcher = options.whitelist_matcher
+                self.logger.info(f"🔍 Whitelist words: {len(whitelist_matcher)}")
+                
+                if whitelist_matcher:
+                    match = whitelist_matcher.search(message_text)
+                    if not match:
+                        self.logger.info(f"⚪ Message BLOCKED by whitelist: no allowed words found")
+                        return False
+                    
+                    self.logger.info(f"✅ Message ALLOWED by whitelist: contains '{match.term}'")
+                    
+        except Exception as e:
+            self.logger.error(f"Error checking blacklist/whitelist: {str(e)}")
         
         return True
     
-    async def _forward_message_to_target(self, message, target_chat):
-        """Forward a message to a specific target with retry logic"""
-        max_retries = self.forward_options['max_retries']
+    async def _forward_message_to_target(self, message, target_chat, config=None, kind=None, resumed=False):
+        """Forward a message to a specific target with retry logic
+
+        Returns None if the delivery was parked because the target (or account) is under a FloodWait.
+        """
+        config = config or self.config
+        if kind is None:
+            kind = classify_message(message)
+        options = config.forward_options
+        max_retries = options.max_retries
+        
+        # Dormant target, or earlier deliveries still parked: queue behind them to keep order
+        if not resumed and self.flood_scheduler.should_park(target_chat):
+            self._park_delivery(message, target_chat, config, kind)
+            return None
         
         for attempt in range(max_retries):
+            # The target's account on the hash ring, or the next one while it is flood-limited
+            account = self.accounts.account_for(target_chat)
+            if account is None:
+                # Every account is flood-limited for this target: park until the first one recovers
+                wait = self.accounts.dormant_for(target_chat)
+                if self.flood_scheduler.dormant_for(target_chat) < wait:
+                    self.flood_scheduler.mark_dormant(target_chat, wait, account=self.accounts.account_wide_wait() > 0)
+                self._park_delivery(message, target_chat, config, kind, front=resumed)
+                return None
+            
+            resolving = True
             try:
-                # Try different formats for target chat
-                target_entities_to_try = [
-                    target_chat,
-                    int(target_chat),
-                    int(target_chat.replace('-100', '')) if str(target_chat).startswith('-100') else target_chat
-                ]
-                
-                forwarded = False
-                forward_mode = self.forward_options.get('forward_mode', 'forward')
+                # Cached InputPeer: no lookup round trips on the send path
+                target_peer = await account.peer_resolver.resolve(target_chat)
+                resolving = False
+                # Secondary accounts send their own copy of the message (ids and media are per session)
+                outgoing = await account.fetch(message)
+                                
+                forward_mode = options.forward_mode
                 self.logger.info(f"🚀 Forward mode: {forward_mode}")
                 
-                for target_entity in target_entities_to_try:
+                if forward_mode == 'forward' and options.forward_batch_window > 0 and not isinstance(message, list):
+                    # Micro-batched: shares one forward_messages request (and rate-limit token) with
+                    # other messages from the same source to this target
+                    self.logger.info(f"📦 Using batched forward mode to {target_chat}")
                     try:
-                        if forward_mode == 'copy':
-                            # Copy mode: Send message as new without showing source
-                            self.logger.info(f"📋 Using copy mode to {target_chat}")
-                            await self._copy_message(message, target_entity)
-                        else:
-                            # Forward mode: Traditional forward with source info
-                            self.logger.info(f"➡️ Using forward mode to {target_chat}")
-                            await self.client.forward_messages(
-                                entity=target_entity,
-                                messages=message
-                            )
-                        
-                        forwarded = True
-                        break
-                    except ValueError as ve:
-                        self.logger.debug(f"Failed with entity {target_entity}: {ve}")
-                        continue
-                
-                if not forwarded:
-                    raise ValueError(f"Could not forward to any target entity format")
+                        forwarded = await account.forward_batcher.forward(outgoing, target_chat, target_peer)
+                    except FloodWaitError:
+                        # The batcher already backed off and marked the account once for the whole request
+                        return await self._forward_message_to_target(message, target_chat, config, kind, resumed=resumed)
+                    if not forwarded:
+                        raise ValueError(f"Telegram did not forward message {message.id}")
+                    account.sent += 1
+                    return True
                 
-                # Smart delay: reduce delay for text, keep for media
-                delay = self.forward_options['delay']
-                if message.text and not message.media:
-                    # Text messages can be faster
-                    delay = max(0.1, delay * 0.3)
-                elif message.media:
-                    # Media needs more careful handling
-                    delay = delay * 1.5
-                
-                if delay > 0:
-                    await asyncio.sleep(delay)
+                # Spend this target's (and the account's) budget; only this delivery waits
+                await account.rate_limiter.acquire(target_chat, kind.has_media)
+                # Then the learned spacing for this target
+                await account.pacer.wait(target_chat)
+                                
+                if forward_mode == 'copy':
+                    # Copy mode: Send message as new without showing source
+                    self.logger.info(f"📋 Using copy mode to {target_chat}")
+                    await self._copy_message(outgoing, target_peer, config, kind, client=account.client)
+                else:
+                    # Forward mode: Traditional forward with source info
+                    self.logger.info(f"➡️ Using forward mode to {target_chat}")
+                    await account.client.forward_messages(
+                        entity=target_peer,
+                        messages=outgoing
+                    )
                 
+                account.pacer.on_success(target_chat)
+                account.sent += 1
                 return True
                 
             except FloodWaitError as e:
-                # Smart flood wait handling
-                if e.seconds <= 10:
-                    # Short waits: wait the full time
-                    wait_time = e.seconds
-                elif e.seconds <= 60:
-                    # Medium waits: wait 80% of the time
-                    wait_time = int(e.seconds * 0.8)
-                else:
-                    # Long waits: cap at 5 minutes and retry more frequently
-                    wait_time = min(300, int(e.seconds * 0.5))
-                
-                self.logger.warning(f"🛑 Rate limited by Telegram, waiting {wait_time} seconds (original: {e.seconds})")
-                await asyncio.sleep(wait_time)
-                
-                # Add progressive delay reduction after flood wait
-                if hasattr(self, '_consecutive_floods'):
-                    self._consecutive_floods += 1
-                else:
-                    self._consecutive_floods = 1
-                    
-                if self._consecutive_floods > 3:
-                    # Temporarily increase delay to avoid repeated floods
-                    self.forward_options['delay'] = min(5, self.forward_options['delay'] * 1.5)
-                    self.logger.info(f"⚡ Temporarily increased delay to {self.forward_options['delay']} seconds")
-                
+                # This account waits out Telegram's deadline (for every target if peer resolution was
+                # throttled); the next account on the ring takes over, or the delivery is parked and
+                # resumed in order if none can - either way this worker moves on
+                account.pacer.on_flood(target_chat, account=resolving)
+                self.accounts.mark_flooded(account, target_chat, e.seconds, account_wide=resolving)
+                return await self._forward_message_to_target(message, target_chat, config, kind, resumed=resumed)
+                                
             except ChatWriteForbiddenError:
                 self.logger.error("Cannot write to target chat - check permissions")
                 return False
                 
+            except (PeerIdInvalidError, ChannelPrivateError, ChannelInvalidError, ChatIdInvalidError) as e:
+                # The cached peer went stale (left/rejoined, access hash changed): resolve it again
+                self.logger.warning(f"Peer for {target_chat} rejected ({e.__class__.__name__}), refreshing")
+                account.peer_resolver.invalidate(target_chat)
+                if attempt < max_retries - 1:
+                    continue
+                return False
+                
             except RPCError as e:
                 self.logger.error(f"Telegram API error: {e}")
                 if attempt < max_retries - 1:
@@ -536,82 +840,117 @@ class TelegramForwarder:
                     continue
                 return False
 
+    def _park_delivery(self, message, target_chat, config, kind, front=False):
+        """Hand a delivery to the flood scheduler; it is acknowledged in the outbox once sent"""
+        async def resume():
+            success = await self._forward_message_to_target(message, target_chat, config, kind, resumed=True)
+            if success is None:
+                return
+            for part in (message if isinstance(message, list) else [message]):
+                self.outbox.ack(part, target_chat, 'done' if success else 'failed')
+            outcome = self._parked_outcomes.get(self._outcome_key(message))
+            if outcome is not None:
+                outcome[0] -= 1
+                outcome[1] = outcome[1] or success
+                self._settle_parked(message)
+        
+        if not front:
+            # A re-parked resumed delivery (front=True) is already counted
+            key = self._outcome_key(message)
+            self._parked_outcomes.setdefault(key, [0, False, None, None])[0] += 1
+        self.flood_scheduler.park(target_chat, resume, front=front)
+    
+    @staticmethod
+    def _outcome_key(message):
+        """Stats key of a message or album (its first part)"""
+        first = message[0] if isinstance(message, list) else message
+        return first.chat_id, first.id
+    
+    def _record_outcome(self, kinds, success):
+        """One processed-message entry per kind (album parts are counted one by one)"""
+        for kind in kinds:
+            stats_manager.record_message_processed(success=success, message_type=kind.name.lower(), has_media=kind.has_media)
+    
+    def _settle_parked(self, message, kinds=None, forget=None):
+        """Count a message with parked deliveries as soon as its outcome is known
+        
+        Delivered once any parked delivery succeeds, failed once none is left; kinds (and forget,
+        called if it failed) are passed when processing of the message finished.
+        """
+        key = self._outcome_key(message)
+        outcome = self._parked_outcomes.get(key)
+        if outcome is None:
+            return
+        if kinds is not None:
+            outcome[2] = kinds
+            outcome[3] = forget
+        if outcome[2] and (outcome[1] or outcome[0] == 0):
+            self._record_outcome(outcome[2], outcome[1])
+            if not outcome[1] and outcome[3] is not None:
+                outcome[3]()
+            outcome[2] = ()
+        if outcome[0] == 0 and outcome[2] is not None:
+            del self._parked_outcomes[key]
+    
     async def _forward_message(self, message):
         """Forward a message to all targets - backward compatibility method"""
         successful_forwards = 0
+        config = self._route_for(message) or self.config
         
-        for target_chat in self.target_chats:
-            success = await self._forward_message_to_target(message, target_chat)
+        for target_chat in config.target_chats:
+            success = await self._forward_message_to_target(message, target_chat, config)
             if success:
                 successful_forwards += 1
         
         return successful_forwards > 0
 
-    async def _copy_message(self, message, target_entity):
-        """Copy message content without showing source"""
+    async def _copy_message(self, message, target_chat, config=None, kind=None, client=None):
+        """Copy message content without showing source (target_chat is a resolved peer)"""
+        config = config or self.config
+        client = client or self.client
+        if isinstance(message, list):
+            return await self._copy_album(message, target_chat, config, client)
+        if kind is None:
+            kind = classify_message(message)
         # Initialize variables
         final_text = ""
-        target_chat = None
-        
+                
         try:
-            # Get original text (from text or caption), clean it, then add header and footer
-            original_text = message.text or getattr(message, 'caption', '') or ""
-            self.logger.info(f"🔧 Before cleaning: '{original_text[:50]}...' (length: {len(original_text)})")
-            cleaned_text = self._clean_message_text(original_text)
-            self.logger.info(f"🔧 After cleaning: '{cleaned_text[:50]}...' (length: {len(cleaned_text)})")
-            final_text = self._add_header_footer(cleaned_text)
-            
-            # Try multiple ways to get the target entity
-            target_formats = [
-                target_entity,
-                int(target_entity),
-                int(str(target_entity).replace('-100', '')) if str(target_entity).startswith('-100') else target_entity
-            ]
-            
-            for target_format in target_formats:
-                try:
-                    target_chat = await self.client.get_entity(target_format)
-                    self.logger.info(f"✅ Found target entity: {target_format}")
-                    break
-                except Exception as e:
-                    self.logger.debug(f"Failed with format {target_format}: {e}")
-                    continue
-            
-            if not target_chat:
-                raise ValueError(f"Could not find target entity with any format")
+            # Transform once per (message, config revision); the other targets reuse the result
+            rendered = self.transform_cache.get_or_render(
+                message, config.version, lambda: self._render_message(message, config)
+            )
+            final_text = rendered.text
+            formatting_entities = rendered.formatting_entities
             
             # Log message type for debugging
-            media_type = "None"
-            if message.media:
-                if hasattr(message.media, '__class__'):
-                    media_type = message.media.__class__.__name__
-            self.logger.info(f"🔍 Copy mode - Message type: text={bool(message.text)}, media={bool(message.media)} ({media_type}), web_preview={bool(getattr(message, 'web_preview', None))}")
+            self.logger.info(f"🔍 Copy mode - Message type: {kind.name}")
             
             # Handle different message types for copy mode
-            # Check if it's actual media (not just web preview)
-            has_actual_media = message.media and not (hasattr(message.media, '__class__') and 'WebPage' in str(message.media.__class__))
+            # Actual media only (web previews are sent as text)
+            has_actual_media = kind.has_media
             
-            # Get inline buttons
-            buttons = self._create_inline_buttons()
-            self.logger.info(f"🔍 Buttons status: {buttons}")
+            buttons = rendered.buttons
             
             if has_actual_media:
                 # Media message - send with caption if available
                 self.logger.info("📎 Sending as media message (copy mode)")
                 # Send media with caption and buttons
-                await self.client.send_file(
+                await client.send_file(
                     target_chat, 
-                    message.media, 
+                    message.media,  
                     caption=final_text if final_text.strip() else None,
+                    formatting_entities=formatting_entities if final_text.strip() else None,
                     buttons=buttons
                 )
             elif message.text or getattr(message, 'caption', ''):
                 # Text message (including messages with links and link previews)
                 self.logger.info("📝 Sending as text message (copy mode)")
-                await self.client.send_message(
+                await client.send_message(
                     target_chat, 
-                    final_text, 
+                    final_text,  
                     link_preview=False,
+                    formatting_entities=formatting_entities,
                     buttons=buttons
                 )
             else:
@@ -624,14 +963,61 @@ class TelegramForwarder:
             self.logger.error(f"Copy failed: {e}")
             raise e
 
-    def _add_header_footer(self, original_text):
+    async def _copy_album(self, messages, target_chat, config=None, client=None):
+        """Copy an album with one grouped send_file; caption and header/footer applied once"""
+        config = config or self.config
+        client = client or self.client
+        
+        # The caption sits on one part; render that part once per config revision
+        caption_message = next((message for message in messages if message.message), messages[0])
+        rendered = self.transform_cache.get_or_render(
+            caption_message, config.version, lambda: self._render_message(caption_message, config)
+        )
+        
+        captions = [rendered.text] + [''] * (len(messages) - 1)
+        formatting_entities = None
+        if rendered.formatting_entities is not None:
+            formatting_entities = [rendered.formatting_entities] + [[] for _ in messages[1:]]
+        if rendered.buttons:
+            # Telegram does not accept reply markup on media groups
+            self.logger.info("🔘 Inline buttons are not supported on albums, sending without them")
+        
+        self.logger.info(f"🖼 Sending album of {len(messages)} parts (copy mode)")
+        await client.send_file(
+            target_chat,
+            [message.media for message in messages],
+            caption=captions,
+            formatting_entities=formatting_entities
+        )
+
+    def _render_message(self, message, config=None):
+        """Build the copy-mode payload: cleaned text with header/footer, entities and buttons"""
+        config = config or self.config
+        
+        # Get original text (from text or caption), clean it, then add header and footer
+        formatting_entities = None
+        if config.forward_options.entity_cleaning:
+            final_text, formatting_entities = self._build_entity_text(message, config)
+        if formatting_entities is None:
+            original_text = message.text or getattr(message, 'caption', '') or ""
+            self.logger.info(f"🔧 Before cleaning: '{original_text[:50]}...' (length: {len(original_text)})")
+            cleaned_text = self._clean_message_text(original_text, config)
+            self.logger.info(f"🔧 After cleaning: '{cleaned_text[:50]}...' (length: {len(cleaned_text)})")
+            final_text = self._add_header_footer(cleaned_text, config)
+        
+        buttons = self._create_inline_buttons(config)
+        self.logger.info(f"🔍 Buttons status: {buttons}")
+        return RenderedMessage(final_text, formatting_entities, buttons)
+
+    def _add_header_footer(self, original_text, config=None):
         """Add header and footer to message text"""
+        options = (config or self.config).forward_options
         try:
             # Get current configuration using the existing loaded config
-            header_enabled = self.forward_options.get('header_enabled', False)
-            footer_enabled = self.forward_options.get('footer_enabled', False)
-            header_text = self.forward_options.get('header_text', '').strip()
-            footer_text = self.forward_options.get('footer_text', '').strip()
+            header_enabled = options.header_enabled
+            footer_enabled = options.footer_enabled
+            header_text = options.header_text
+            footer_text = options.footer_text
             
             # Build final message
             parts = []
@@ -655,11 +1041,52 @@ class TelegramForwarder:
             self.logger.error(f"Error adding header/footer: {e}")
             return original_text
 
-    def _create_inline_buttons(self):
+    def _build_entity_text(self, message, config=None):
+        """Replace, clean and add header/footer on the raw text and its entities (entity_cleaning mode)
+
+        Returns (text, entities); entities is None if the entity path failed and plain cleaning should run.
+        """
+        options = (config or self.config).forward_options
+        try:
+            body = EntityText(message.message or '', message.entities)
+            
+            # Apply text replacements first, keeping entity offsets in step
+            if options.replacer_enabled and options.text_replacer:
+                edits = options.text_replacer.spans(body.text)
+                if edits:
+                    body.apply_edits(edits)
+                    stats_manager.record_replacement_made(len(edits))
+                    self.logger.info(f"🔄 Text replacements made: {len(edits)}")
+            
+            hits = options.text_cleaner.clean_entities(body)
+            links_cleaned = hits.get('links', 0) + hits.get('mentions', 0)
+            if links_cleaned:
+                stats_manager.record_link_cleaned(links_cleaned)
+            if hits:
+                self.logger.info(f"🧽 Entity cleaning hits: {hits}")
+            
+            # Header and footer markdown becomes entities too, since parse_mode is bypassed
+            parts = []
+            if options.header_enabled and options.header_text:
+                parts.append(EntityText.from_markdown(options.header_text))
+            if body.text:
+                parts.append(body)
+            if options.footer_enabled and options.footer_text:
+                parts.append(EntityText.from_markdown(options.footer_text))
+            
+            final = EntityText.join(parts)
+            return final.text, final.to_entities()
+            
+        except Exception as e:
+            self.logger.error(f"Error in entity cleaning, falling back to text cleaning: {e}")
+            return "", None
+
+    def _create_inline_buttons(self, config=None):
         """Create inline keyboard buttons based on configuration"""
+        options = (config or self.config).forward_options
         try:
             # Get button settings from current config
-            buttons_enabled = self.forward_options.get('buttons_enabled', False)
+            buttons_enabled = options.buttons_enabled
             
             if not buttons_enabled:
                 return None
@@ -667,17 +1094,8 @@ class TelegramForwarder:
             # Import Button for inline keyboards
             from telethon import Button
             
-            # Create simple button list for Telethon
-            buttons = []
-            
-            # Check for up to 3 buttons
-            for i in range(1, 4):
-                button_text = self.forward_options.get(f'button{i}_text', '').strip()
-                button_url = self.forward_options.get(f'button{i}_url', '').strip()
-                
-                if button_text and button_url:
-                    # Create button for each row
-                    buttons.append(Button.url(button_text, button_url))
+            # Create simple button list for Telethon (pairs are parsed at load time)
+            buttons = [Button.url(button_text, button_url) for button_text, button_url in options.buttons]
             
             if buttons:
                 self.logger.info(f"🔘 Created {len(buttons)} inline buttons")
@@ -692,47 +1110,27 @@ class TelegramForwarder:
             self.logger.error(f"Error creating inline buttons: {e}")
             return None
 
-    def _replace_text_content(self, text):
+    def _replace_text_content(self, text, config=None):
         """Replace text content based on configuration"""
+        options = (config or self.config).forward_options
         if not text:
             return text
             
         try:
             # Check if text replacer is enabled
-            replacer_enabled = self.forward_options.get('replacer_enabled', False)
+            replacer_enabled = options.replacer_enabled
             if not replacer_enabled:
                 return text
                 
-            original_text = text
-            replacements_str = self.forward_options.get('replacements', '')
+            original_length = len(text)
             
-            if not replacements_str.strip():
-                return text
-                
-            # Parse replacements (format: old1->new1,old2->new2,old3->)
-            replacements = []
-            for replacement in replacements_str.split(','):
-                if '->' in replacement:
-                    old_text, new_text = replacement.split('->', 1)
-                    old_text = old_text.strip()
-                    new_text = new_text.strip()
-                    if old_text:  # Only add if old_text is not empty
-                        replacements.append((old_text, new_text))
-            
-            if not replacements:
-                return text
-                
-            # Apply replacements
-            replacements_made = []
-            for old_text, new_text in replacements:
-                if old_text in text:
-                    text = text.replace(old_text, new_text)
-                    replacements_made.append(f"'{old_text}' -> '{new_text}'")
-                    stats_manager.record_replacement_made()
+            # All rules applied simultaneously in one scan (compiled once per config revision)
+            text, replacements_made = options.text_replacer.replace(text)
             
             if replacements_made:
-                self.logger.info(f"🔄 Text replacements made: {', '.join(replacements_made)}")
-                self.logger.info(f"📝 Text length: {len(original_text)} -> {len(text)} chars")
+                stats_manager.record_replacement_made(replacements_made)
+                self.logger.info(f"🔄 Text replacements made: {replacements_made}")
+                self.logger.info(f"📝 Text length: {original_length} -> {len(text)} chars")
             
             return text
             
@@ -740,84 +1138,51 @@ class TelegramForwarder:
             self.logger.error(f"Error replacing text: {e}")
             return text
 
-    def _clean_message_text(self, text):
+    @staticmethod
+    def _dedup_scope(config):
+        """Dedup scope of a route: posts only count as duplicates within the same route's targets"""
+        return '' if config.name == DEFAULT_ROUTE else config.name
+
+    def _forget_fingerprints(self, message, config):
+        """Let a later copy of a post through again: none of its deliveries went out"""
+        options = config.forward_options
+        keys = [(part.chat_id, part.id) for part in (message if isinstance(message, list) else [message])]
+        scope = self._dedup_scope(config)
+        if options.content_dedup:
+            self.content_dedup.forget(message, keys, scope)
+        if options.near_dedup:
+            self.near_dedup.forget(keys, scope)
+
+    def _dedup_text(self, text, options):
+        """The text _clean_message_text would produce, without recording stats or logging"""
+        if not text:
+            return text
+        if options.replacer_enabled:
+            text, _ = options.text_replacer.replace(text)
+        return options.text_cleaner.clean(text)[0]
+
+    def _clean_message_text(self, text, config=None):
         """Clean message text based on configuration settings"""
+        options = (config or self.config).forward_options
         if not text:
             return text
         
         try:
             # Apply text replacements first
-            text = self._replace_text_content(text)
-            
-            # Get cleaning settings from current config
-            clean_links = self.forward_options.get('clean_links', False)
-            clean_hashtags = self.forward_options.get('clean_hashtags', False)
-            clean_formatting = self.forward_options.get('clean_formatting', False)
-            clean_empty_lines = self.forward_options.get('clean_empty_lines', False)
-            clean_lines_with_words = self.forward_options.get('clean_lines_with_words', False)
-            clean_words_list = self.forward_options.get('clean_words_list', '').strip()
+            text = self._replace_text_content(text, config)
             
             # Log cleaning settings for debugging
-            self.logger.info(f"🧹 Cleaning settings: links={clean_links}, hashtags={clean_hashtags}, formatting={clean_formatting}")
+            self.logger.info(f"🧹 Cleaning with {options.text_cleaner}")
             self.logger.info(f"📝 Original text: '{text[:100]}...' (length: {len(text)})")
             
-            cleaned_text = text
-            
-            # Clean links and usernames
-            if clean_links:
-                import re
-                # Remove HTTP(S) links
-                cleaned_text = re.sub(r'https?://[^\s]+', '', cleaned_text)
-                # Remove telegram links (all forms, case insensitive)
-                cleaned_text = re.sub(r'[Tt]\.me/[\w\d_]+', '', cleaned_text)
-                # Remove www links
-                cleaned_text = re.sub(r'www\.[^\s]+', '', cleaned_text)
-                # Remove domain links with simple and compound extensions (like .com.ye, .co.uk)
-                cleaned_text = re.sub(r'[\w\d-]+\.(com|org|net|info|co|io|me|ly|tv|fm|cc|tk|ml|ga|cf|ye|sa|ae|eg|jo|iq|sy|lb|ma|dz|tn|ly|sd|kw|qa|bh|om|ps)\.[a-z]{2,3}[^\s]*', '', cleaned_text)
-                # Remove domain links with single extensions
-                cleaned_text = re.sub(r'[\w\d-]+\.(com|org|net|info|co|io|me|ly|tv|fm|cc|tk|ml|ga|cf|ye|sa|ae|eg|jo|iq|sy|lb|ma|dz|tn|ly|sd|kw|qa|bh|om|ps)[^\s]*', '', cleaned_text)
-                # Remove @usernames
-                cleaned_text = re.sub(r'@[\w\d_]+', '', cleaned_text)
-                self.logger.info(f"🧽 Links cleaned from text")
-            
-            # Clean hashtags
-            if clean_hashtags:
-                import re
-                cleaned_text = re.sub(r'#[\w\d_\u0600-\u06FF]+', '', cleaned_text)
-            
-            # Clean formatting (remove markdown/HTML)
-            if clean_formatting:
-                import re
-                # Remove markdown formatting
-                cleaned_text = re.sub(r'[*_`]', '', cleaned_text)
-                # Remove HTML tags
-                cleaned_text = re.sub(r'<[^>]+>', '', cleaned_text)
-            
-            # Clean lines with specific words
-            if clean_lines_with_words and clean_words_list:
-                clean_words = [word.strip().lower() for word in clean_words_list.split(',') if word.strip()]
-                if clean_words:
-                    lines = cleaned_text.split('\n')
-                    filtered_lines = []
-                    for line in lines:
-                        line_lower = line.lower()
-                        should_remove = any(word in line_lower for word in clean_words)
-                        if not should_remove:
-                            filtered_lines.append(line)
-                    cleaned_text = '\n'.join(filtered_lines)
-            
-            # Clean empty lines
-            if clean_empty_lines:
-                lines = cleaned_text.split('\n')
-                # Remove empty lines and lines with only whitespace
-                non_empty_lines = [line for line in lines if line.strip()]
-                cleaned_text = '\n'.join(non_empty_lines)
-            
-            # Clean up extra spaces and newlines
-            import re
-            cleaned_text = re.sub(r'\n\s*\n\s*\n+', '\n\n', cleaned_text)  # Remove excessive newlines
-            cleaned_text = re.sub(r' +', ' ', cleaned_text)  # Remove excessive spaces
-            cleaned_text = cleaned_text.strip()
+            # All enabled rules run through the engine compiled for this config revision
+            cleaned_text, hits = options.text_cleaner.clean(text)
+            
+            links_cleaned = hits.get('links', 0) + hits.get('mentions', 0)
+            if links_cleaned:
+                stats_manager.record_link_cleaned(links_cleaned)
+            if hits:
+                self.logger.info(f"🧽 Cleaning hits: {hits}")
             
             return cleaned_text
             
@@ -835,6 +1200,28 @@ class TelegramForwarder:
     
     async def stop(self):
         """Stop the userbot gracefully"""
+        if self.config_watcher:
+            self.config_watcher.stop()
+        
+        self.album_collector.cancel()
+        await self.work_queue.stop()
+        if self.fanout is not None:
+            await self.fanout.cancel()
+        self.flood_scheduler.cancel()
+        stats_manager.stop_snapshots()
+        for account in self.accounts:
+            account.pacer.close()
+            if not account.primary and account.client.is_connected():
+                await account.client.disconnect()
+        self.dedup_index.close()
+        self.content_dedup.close()
+        self.near_dedup.close()
+        # Unacknowledged deliveries stay pending and are replayed on the next start
+        await self.outbox.close()
+        
+        if self.config_channel:
+            await self.config_channel.stop()
+        
         if self.client and self.client.is_connected():
             await self.client.disconnect()
             self.logger.info("Userbot disconnected")
@@ -2,30 +2,89 @@
 Utility classes and functions for the Telegram userbot
 """
 
-import asyncio
 import configparser
+import json
 import logging
+import os
 import time
-from typing import Any, Optional
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+from config_store import STORE_ENV_VAR, get_store, write_ini_atomic
 
 class ConfigManager:
-    """Configuration manager for handling config.ini files"""
+    """Configuration manager for handling config.ini files (or the SQLite config store)"""
     
-    def __init__(self, config_path: str):
+    def __init__(self, config_path: str, store_path: Optional[str] = None):
         self.config_path = config_path
+        self.store_path = store_path if store_path is not None else os.getenv(STORE_ENV_VAR) or None
+        self.store = None
+        self.revision = 0
         self.config = configparser.ConfigParser()
         self.logger = logging.getLogger(__name__)
         self._load_config()
     
     def _load_config(self):
-        """Load configuration from file"""
+        """Load configuration from file or from the SQLite store"""
         try:
-            self.config.read(self.config_path)
-            self.logger.info(f"Configuration loaded from {self.config_path}")
+            if self.store_path:
+                self.store = get_store(self.store_path)
+                # First run against an empty store: seed it from config.ini
+                if self.store.is_empty() and os.path.exists(self.config_path):
+                    self.store.import_ini(self.config_path)
+                self.revision = self.store.revision()
+                self.config.read_dict(self.store.load_all())
+                self.logger.info(f"Configuration loaded from {self.store_path} (rev {self.revision})")
+            else:
+                self.config.read(self.config_path)
+                self.logger.info(f"Configuration loaded from {self.config_path}")
         except Exception as e:
             self.logger.error(f"Failed to load configuration: {e}")
             raise
     
+    @staticmethod
+    def source_signature(config_path: str, store_path: Optional[str] = None):
+        """Cheap change marker: store revision, or config file (mtime, size)"""
+        if store_path:
+            return ('revision', get_store(store_path).revision())
+        try:
+            st = os.stat(config_path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+    
+    def has_changed_since(self, revision: int) -> bool:
+        """Whether the store has newer writes than revision (always False for INI files)"""
+        return self.store.has_changed_since(revision) if self.store else False
+    
+    def persist(self, section: str, key: str, value: Optional[str]) -> int:
+        """Set a value and write it durably; returns the new revision"""
+        return self.persist_many([(section, key, value)])
+    
+    def persist_many(self, items: Iterable[Tuple[str, str, Optional[str]]]) -> int:
+        """Set several values and write them durably in one transaction"""
+        items = list(items)
+        for section, key, value in items:
+            self.set(section, key, value)
+        
+        if self.store:
+            # One row write per key instead of a full-file rewrite
+            self.revision = self.store.set_many(items)
+        else:
+            # Re-read the file so concurrent edits are kept, then replace it atomically
+            parser = configparser.ConfigParser()
+            parser.read(self.config_path)
+            for section, key, value in items:
+                if value is None:
+                    if parser.has_section(section):
+                        parser.remove_option(section, key)
+                    continue
+                if not parser.has_section(section):
+                    parser.add_section(section)
+                parser.set(section, key, value)
+            write_ini_atomic(parser, self.config_path)
+            self.revision += 1
+        return self.revision
+    
     def get(self, section: str, key: str, fallback: Any = None) -> str:
         """Get configuration value"""
         try:
@@ -61,44 +120,70 @@ class ConfigManager:
             if fallback is not None:
                 return fallback
             raise
+    
+    def set(self, section: str, key: str, value: Optional[str]):
+        """Set a configuration value in memory (None removes the key)"""
+        if value is None:
+            if self.config.has_section(section):
+                self.config.remove_option(section, key)
+            return
+        if not self.config.has_section(section):
+            self.config.add_section(section)
+        self.config.set(section, key, value)
+    
+    def get_raw(self, section: str, key: str) -> Optional[str]:
+        """Get the stored string value, or None if the key is not set"""
+        if self.config.has_option(section, key):
+            return self.config.get(section, key, raw=True)
+        return None
 
-class RateLimiter:
-    """Rate limiter to prevent hitting Telegram API limits"""
-    
-    def __init__(self, min_interval: float = 1.0, burst_limit: int = 20):
-        self.min_interval = min_interval
-        self.burst_limit = burst_limit
-        self.last_request_time = 0
-        self.request_count = 0
-        self.window_start = time.time()
+class JsonState:
+    """A JSON state file: atomic writes (tmp + os.replace), a dirty flag and a save interval"""
+    
+    def __init__(self, path: str, label: str, interval: float = 30.0, indent: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.path = path
+        self.label = label
+        self.interval = interval
+        self.indent = indent
+        self.clock = clock
+        self.dirty = False
+        self.saved_at = clock()
         self.logger = logging.getLogger(__name__)
     
-    async def wait(self):
-        """Wait if necessary to respect rate limits"""
-        current_time = time.time()
-        
-        # Reset window if needed (1 minute window)
-        if current_time - self.window_start >= 60:
-            self.request_count = 0
-            self.window_start = current_time
-        
-        # Check burst limit
-        if self.request_count >= self.burst_limit:
-            wait_time = 60 - (current_time - self.window_start)
-            if wait_time > 0:
-                self.logger.info(f"Rate limit reached, waiting {wait_time:.1f} seconds...")
-                await asyncio.sleep(wait_time)
-                self.request_count = 0
-                self.window_start = time.time()
-        
-        # Check minimum interval
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < self.min_interval:
-            wait_time = self.min_interval - time_since_last
-            await asyncio.sleep(wait_time)
-        
-        self.last_request_time = time.time()
-        self.request_count += 1
+    def load(self) -> Optional[dict]:
+        """The saved data; None if there is none or it cannot be read"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable {self.label} {self.path}: {e}")
+            return None
+        if not isinstance(data, dict):
+            self.logger.warning(f"Ignoring invalid {self.label} {self.path}")
+            return None
+        return data
+    
+    def save(self, data: dict) -> bool:
+        """Write data atomically; a failed write is logged and retried with the next save"""
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=self.indent)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.logger.warning(f"Could not save {self.label}: {e}")
+            return False
+        self.dirty = False
+        self.saved_at = self.clock()
+        return True
+    
+    def changed(self) -> bool:
+        """Mark the state changed; True once the save interval has passed (time to save)"""
+        self.dirty = True
+        return self.clock() - self.saved_at >= self.interval
 
 class MessageStats:
     """Simple statistics tracker for forwarded messages"""
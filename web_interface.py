@@ -12,7 +12,6 @@ import threading
 from flask import Flask, render_template, request, jsonify, redirect, url_for
 from utils import ConfigManager
 from userbot import TelegramForwarder
-import configparser
 
 app = Flask(__name__)
 bot_instance = None
@@ -105,24 +104,17 @@ def update_config():
         forward_stickers = request.form.get('forward_stickers') == 'on'
         forward_documents = request.form.get('forward_documents') == 'on'
         
-        # Update config file
-        config = configparser.ConfigParser()
-        config.read('config.ini')
-        
-        if not config.has_section('forwarding'):
-            config.add_section('forwarding')
-            
-        config.set('forwarding', 'source_chat', source_chat)
-        config.set('forwarding', 'target_chat', target_chat)
-        config.set('forwarding', 'forward_delay', str(forward_delay))
-        config.set('forwarding', 'forward_media', str(forward_media).lower())
-        config.set('forwarding', 'forward_text', str(forward_text).lower())
-        config.set('forwarding', 'forward_stickers', str(forward_stickers).lower())
-        config.set('forwarding', 'forward_documents', str(forward_documents).lower())
-        config.set('forwarding', 'max_retries', '3')
-        
-        with open('config.ini', 'w') as configfile:
-            config.write(configfile)
+        # Update config (one transaction in the config store, or an atomic INI replace)
+        ConfigManager('config.ini').persist_many([
+            ('forwarding', 'source_chat', source_chat),
+            ('forwarding', 'target_chat', target_chat),
+            ('forwarding', 'forward_delay', str(forward_delay)),
+            ('forwarding', 'forward_media', str(forward_media).lower()),
+            ('forwarding', 'forward_text', str(forward_text).lower()),
+            ('forwarding', 'forward_stickers', str(forward_stickers).lower()),
+            ('forwarding', 'forward_documents', str(forward_documents).lower()),
+            ('forwarding', 'max_retries', '3'),
+        ])
             
         return jsonify({"success": True, "message": "Configuration updated successfully!"})
         
@@ -0,0 +1,304 @@
+"""
+Work queue - bounded queue and worker pool between the update handler and forwarding
+The Telethon handler only enqueues; workers absorb rate-limit waits, retries and FloodWait sleeps.
+When the queue is full the configured policy decides: block the producer, drop the oldest
+queued media, or spill message references to disk and re-fetch them once there is room
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+QUEUE_POLICIES = ('block', 'drop_oldest_media', 'spill')
+
+DEFAULT_SPILL_PATH = os.getenv('USERBOT_QUEUE_SPILL', 'queue_spill.jsonl')
+
+# Wait times kept for the average/maximum shown in metrics
+WAIT_SAMPLES = 200
+
+
+class _QueueItem:
+    __slots__ = ('message', 'enqueued', 'has_media')
+
+    def __init__(self, message, enqueued: float, has_media: bool):
+        self.message = message
+        self.enqueued = enqueued
+        self.has_media = has_media
+
+
+class WorkQueue:
+    """Bounded FIFO of messages drained by a pool of async workers"""
+
+    def __init__(self, handler: Callable[[object], Awaitable], maxsize: int = 1000, workers: int = 4,
+                 policy: str = 'block', loader: Optional[Callable[[int, int], Awaitable]] = None,
+                 spill_path: str = DEFAULT_SPILL_PATH, clock: Callable[[], float] = time.monotonic,
+                 on_drop: Optional[Callable[[object], None]] = None):
+        self.handler = handler
+        self.maxsize = maxsize
+        self.workers = workers
+        self.policy = policy
+        self.loader = loader
+        # Called with each message the drop_oldest_media policy gives up on
+        self.on_drop = on_drop
+        self.spill_path = spill_path
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+        self._items = deque()
+        self._changed = asyncio.Condition()
+        self._workers = set()
+        self._busy = 0
+        self._spill_offset = 0
+        self._spill_backlog = 0
+        self._refilling = False
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.blocked = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return f"WorkQueue(maxsize={self.maxsize}, workers={self.workers}, policy={self.policy})"
+
+    def configure(self, maxsize: int, workers: int, policy: str):
+        """Apply new limits; the pool grows at once and shrinks as workers finish their item"""
+        self.maxsize = maxsize
+        self.workers = workers
+        self.policy = policy
+        if self._workers:
+            self._spawn_workers()
+            asyncio.get_running_loop().create_task(self._notify())
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    def start(self):
+        """Start the workers; message references spilled by an earlier run are replayed first"""
+        self._spill_backlog = self._count_spilled()
+        if self._spill_backlog:
+            self.logger.info(f"📥 Replaying {self._spill_backlog} spilled messages from {self.spill_path}")
+        self._spawn_workers()
+
+    def _spawn_workers(self):
+        while len(self._workers) < self.workers:
+            task = asyncio.get_running_loop().create_task(self._worker())
+            self._workers.add(task)
+            task.add_done_callback(self._workers.discard)
+
+    async def stop(self):
+        """Stop the workers; with the spill policy, queued messages are kept for the next run"""
+        for task in list(self._workers):
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self.policy == 'spill' and (self._items or self._spill_offset):
+            self._rewrite_spill(list(self._items))
+            if self._items:
+                self.logger.info(f"💾 Spilled {len(self._items)} queued messages for the next run")
+        self._items.clear()
+
+    def _rewrite_spill(self, items):
+        """Queued items first, then the unread rest of the spill file; already replayed lines are dropped"""
+        tmp_path = f"{self.spill_path}.tmp"
+        try:
+            remaining = ''
+            if self._spill_backlog:
+                with open(self.spill_path, 'r', encoding='utf-8') as f:
+                    f.seek(self._spill_offset)
+                    remaining = f.read()
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for item in items:
+                    message = item.message
+                    f.write(json.dumps({'chat_id': message.chat_id, 'id': message.id}) + "\n")
+                f.write(remaining)
+            os.replace(tmp_path, self.spill_path)
+        except OSError as e:
+            self.logger.error(f"Could not spill {len(items)} messages to {self.spill_path}: {e}")
+            return
+        self._spill_offset = 0
+        self._spill_backlog += len(items)
+        self.spilled += len(items)
+
+    def spilled_keys(self) -> set:
+        """(chat_id, id) of every message still waiting in the spill file"""
+        keys = set()
+        try:
+            with open(self.spill_path, 'r', encoding='utf-8') as f:
+                f.seek(self._spill_offset)
+                for line in f:
+                    if line.strip():
+                        ref = json.loads(line)
+                        keys.add((ref['chat_id'], ref['id']))
+        except (OSError, ValueError, KeyError):
+            pass
+        return keys
+
+    async def put(self, message):
+        """Enqueue a message; applies the backpressure policy when the queue is full"""
+        item = _QueueItem(message, self.clock(), bool(getattr(message, 'media', None)))
+        async with self._changed:
+            # Spilled messages are older than anything new, so keep FIFO order through the file
+            if self.policy == 'spill' and (self._spill_backlog or len(self._items) >= self.maxsize):
+                self._spill_items([item])
+                self.enqueued += 1
+                return
+
+            if len(self._items) >= self.maxsize and self.policy == 'drop_oldest_media':
+                self._drop_oldest_media()
+
+            if len(self._items) >= self.maxsize:
+                self.blocked += 1
+                self.logger.warning(f"⏸ Work queue full ({len(self._items)}/{self.maxsize}), waiting for a worker")
+                await self._changed.wait_for(lambda: len(self._items) < self.maxsize)
+
+            self._append(item)
+
+    def _append(self, item: _QueueItem):
+        self._items.append(item)
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, len(self._items))
+        self._changed.notify_all()
+
+    def _drop_oldest_media(self):
+        for index, queued in enumerate(self._items):
+            if queued.has_media:
+                del self._items[index]
+                self.dropped += 1
+                message = queued.message
+                self.logger.warning(f"🗑 Work queue full, dropped queued media {getattr(message, 'chat_id', '?')}_{getattr(message, 'id', '?')}")
+                if self.on_drop is not None:
+                    self.on_drop(message)
+                return
+
+    def _spill_items(self, items):
+        try:
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                for item in items:
+                    message = item.message
+                    f.write(json.dumps({'chat_id': message.chat_id, 'id': message.id}) + "\n")
+        except OSError as e:
+            self.logger.error(f"Could not spill {len(items)} messages to {self.spill_path}: {e}")
+            return
+        self._spill_backlog += len(items)
+        self.spilled += len(items)
+
+    def _count_spilled(self) -> int:
+        try:
+            with open(self.spill_path, 'r', encoding='utf-8') as f:
+                return sum(1 for line in f if line.strip())
+        except OSError:
+            return 0
+
+    def _read_spilled(self, limit: int) -> list:
+        """Next `limit` spilled references; the file is removed once fully consumed"""
+        refs = []
+        try:
+            with open(self.spill_path, 'r', encoding='utf-8') as f:
+                f.seek(self._spill_offset)
+                while len(refs) < limit:
+                    line = f.readline()
+                    if not line:
+                        break
+                    if line.strip():
+                        refs.append(json.loads(line))
+                self._spill_offset = f.tell()
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Could not read spilled messages from {self.spill_path}: {e}")
+            self._spill_backlog = 0
+
+        self._spill_backlog = max(0, self._spill_backlog - len(refs))
+        if not self._spill_backlog:
+            self._spill_offset = 0
+            try:
+                os.remove(self.spill_path)
+            except OSError:
+                pass
+        return refs
+
+    async def _refill(self):
+        """Move spilled messages back into memory while there is room"""
+        if self._refilling or self.loader is None:
+            return
+        self._refilling = True
+        try:
+            while self._spill_backlog and len(self._items) < self.maxsize:
+                for ref in self._read_spilled(self.maxsize - len(self._items)):
+                    try:
+                        message = await self.loader(ref['chat_id'], ref['id'])
+                    except Exception as e:
+                        self.logger.error(f"Could not re-fetch spilled message {ref}: {e}")
+                        self.failed += 1
+                        continue
+                    if message is not None:
+                        async with self._changed:
+                            self._items.append(_QueueItem(message, self.clock(), bool(message.media)))
+                            self.max_depth = max(self.max_depth, len(self._items))
+                            self._changed.notify_all()
+        finally:
+            self._refilling = False
+
+    def _has_work(self) -> bool:
+        if self._items or len(self._workers) > self.workers:
+            return True
+        return bool(self._spill_backlog) and self.loader is not None and not self._refilling
+
+    async def _worker(self):
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(self._has_work)
+                if len(self._workers) > self.workers:
+                    # Pool shrunk by a config change; leave the set now so only the excess exits
+                    self._workers.discard(asyncio.current_task())
+                    return
+                item = self._items.popleft() if self._items else None
+                self._changed.notify_all()
+
+            if item is None:
+                await self._refill()
+                continue
+
+            self._waits.append(self.clock() - item.enqueued)
+            self._busy += 1
+            try:
+                await self.handler(item.message)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                self.logger.error(f"Worker failed on queued message: {e}")
+            finally:
+                self._busy -= 1
+
+    def get_state(self) -> dict:
+        """Queue depth, worker usage, policy counters and wait times"""
+        waits = self._waits
+        return {
+            'depth': len(self._items),
+            'maxsize': self.maxsize,
+            'max_depth': self.max_depth,
+            'spill_backlog': self._spill_backlog,
+            'workers': self.workers,
+            'busy_workers': self._busy,
+            'policy': self.policy,
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'spilled': self.spilled,
+            'blocked': self.blocked,
+            'avg_wait': round(sum(waits) / len(waits), 3) if waits else 0.0,
+            'max_wait': round(max(waits), 3) if waits else 0.0,
+        }
+
+    def summary(self) -> str:
+        state = self.get_state()
+        return (f"{state['depth']}/{state['maxsize']} queued, {state['busy_workers']}/{state['workers']} workers busy, "
+                f"wait avg {state['avg_wait']}s max {state['max_wait']}s; dropped {state['dropped']}, spilled {state['spilled']}")